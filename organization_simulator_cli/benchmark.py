@@ -0,0 +1,292 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .cmd_parser import CommandParser
+from .constants import IMPORT_BATCH_SIZE
+from .database import db, set_database_path
+from .db_funcs import insert_employees_in_batches
+from .journal import take_snapshot
+from .log import flush_logs, shutdown_logging
+from .metrics import Metric, metrics
+from .roles import Employee, Role
+
+# Share of every role in a synthetic company
+ROLE_DISTRIBUTION = {
+    Role.FRONTENDER: 0.30,
+    Role.BACKENDER: 0.35,
+    Role.TEAM_LEADER: 0.08,
+    Role.RECRUITER: 0.12,
+    Role.ACCOUNTANT: 0.15,
+}
+
+NAMES = ('Vadim', 'Danil', 'Anna', 'Maria', 'Ivan', 'Olga', 'Pavel', 'Elena',
+         'Sergey', 'Daria', 'Nikita', 'Irina', 'Artem', 'Sofia', 'Maxim',
+         'Polina', 'Egor', 'Alina', 'Roman', 'Vera')
+SURNAMES = ('Karavashkin', 'Platonov', 'Ivanov', 'Smirnov', 'Kuznetsov',
+            'Popov', 'Vasiliev', 'Petrov', 'Sokolov', 'Mikhailov', 'Novikov',
+            'Fedorov', 'Morozov', 'Volkov', 'Alekseev', 'Lebedev', 'Semenov',
+            'Egorov', 'Pavlov', 'Kozlov')
+COMMENT_WORDS = ('reliable', 'proactive', 'mentor', 'remote', 'onboarding',
+                 'deadline', 'promotion', 'python', 'react', 'sql', 'hiring',
+                 'review', 'vacation', 'relocation', 'certified', 'overtime',
+                 'feedback', 'leadership', 'budget', 'audit')
+
+# Everyone but the first employee reports to one of the employees
+# before them, which gives a tree about log(size) / log(SPAN) levels deep
+SPAN = 6
+
+# Name, command template and number of runs relative to --repeat. The
+# template is filled with a random existing {id}, the run number {n}, half
+# the company {middle} and the {added} id of an employee added by add.
+BENCHMARKS: Tuple[Tuple[str, str, float], ...] = (
+    ('list_page', 'list --limit=50', 1),
+    ('list_sorted_page', 'list --sort=surname --limit=50', 1),
+    ('list_deep_offset', 'list --sort=age --limit=50 --offset={middle}', 1),
+    ('list_role', 'list -t --sort=name --limit=50', 1),
+    ('list_where', 'list --where=age>=40 --where=name~an --limit=50', 1),
+    ('list_stream_all', 'list --format=stream', 0.2),
+    ('list_csv_all', 'list --format=csv', 0.2),
+    ('add', 'add Bench{n} Mark{n} 30 +1{n:010d} 0000-0000-0000-0000 '
+            'backender', 1),
+    ('remove', 'remove {added}', 1),
+    ('undo', 'undo', 0.5),
+    ('redo', 'redo', 0.5),
+    ('journal', 'journal', 1),
+    ('journal_snapshot', 'journal snapshot', 0.1),
+    ('journal_replay', 'journal replay replayed-{n}.db', 0.1),
+    ('calculate', 'calculate {id}', 1),
+    ('payroll', 'payroll', 0.5),
+    ('pay', 'pay {id} --period=1999-12', 1),
+    ('pay_all', 'pay --all --period=2{n:03d}-01', 0.2),
+    ('payroll_history', 'payroll history', 1),
+    ('payroll_ytd', 'payroll ytd --year=2000', 1),
+    ('payroll_ytd_employee', 'payroll ytd {id} --year=2000', 1),
+    ('team_top', 'team 1', 0.5),
+    ('team', 'team {id}', 1),
+    ('chain', 'chain {id}', 1),
+    ('assign', 'assign {middle} 1', 1),
+    ('find', 'find karavashkn', 1),
+    ('find_two_words', 'find vadm karavashkin', 1),
+    ('read_comment', 'read_comment {id}', 1),
+    ('search_comments', 'search_comments mentor sql', 1),
+    ('logs_tail', 'logs 20', 1),
+    ('logs_level', 'logs --level=success 20', 1),
+)
+
+
+def generate_employees(size: int, rng: random.Random) -> Iterator[Employee]:
+    """
+    Yield employees with unique identities and the role distribution of
+    ROLE_DISTRIBUTION.
+    """
+
+    roles = list(ROLE_DISTRIBUTION)
+    weights = list(ROLE_DISTRIBUTION.values())
+
+    for number in range(size):
+        yield Employee(rng.choice(NAMES),
+                       rng.choice(SURNAMES),
+                       rng.randint(18, 65),
+                       f'+7{9000000000 + number}',
+                       '-'.join(f'{rng.randrange(10000):04d}' for _ in range(4)),
+                       rng.choices(roles, weights)[0])
+
+
+def generate_company(size: int, seed: int = 0) -> None:
+    """
+    Fill the current database with size employees, their comments and
+    a reporting tree, and snapshot it.
+    """
+
+    rng = random.Random(seed)
+    insert_employees_in_batches(generate_employees(size, rng), IMPORT_BATCH_SIZE)
+
+    # Most employees have a short comment
+    with db.transaction() as con:
+        con.executemany(
+            'UPDATE comments SET body = ? WHERE employee_id = ?',
+            ((' '.join(rng.sample(COMMENT_WORDS, rng.randint(3, 8))),
+              employee_id)
+             for employee_id in range(1, size + 1)
+             if rng.random() < 0.8))
+
+        con.executemany(
+            'INSERT INTO reporting_lines (employee_id, manager_id) VALUES (?, ?)',
+            ((employee_id, (employee_id - 2) // SPAN + 1)
+             for employee_id in range(2, size + 1)))
+
+    # Comments and reporting lines are not journaled, so the journal is
+    # replayed from here on
+    take_snapshot()
+
+
+def run_benchmarks(size: int, repeat: int, seed: int = 0,
+                   only: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Time every benchmark command through CommandParser.parse with the
+    output discarded.
+    """
+
+    rng = random.Random(seed)
+    added: List[int] = []
+    results = {}
+
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        for name, template, share in BENCHMARKS:
+            if only and name not in only:
+                continue
+
+            metric = Metric()
+            for number in range(max(1, round(repeat * share))):
+                if name == 'add':
+                    added.append(size + len(added) + 1)
+                if name == 'remove' and not added:
+                    break
+
+                command = template.format(
+                    id=rng.randint(1, size), n=number, middle=size // 2,
+                    added=added.pop() if name == 'remove' else None)
+
+                start = time.perf_counter()
+                with redirect_stdout(devnull):
+                    CommandParser.parse(command)
+                metric.add(time.perf_counter() - start)
+
+            if metric.calls:
+                results[name] = {'command': template, **metric.summary()}
+
+            # Records logged by a command are written in the background
+            flush_logs()
+
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any],
+            threshold: float, min_delta_ms: float) -> List[str]:
+    """
+    Get the benchmarks whose median got slower than the baseline by more
+    than threshold (a fraction) and min_delta_ms.
+    """
+
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        base = baseline['benchmarks'].get(name)
+        if base is None:
+            continue
+
+        delta = result['p50_ms'] - base['p50_ms']
+        if delta > min_delta_ms and delta > base['p50_ms'] * threshold:
+            regressions.append(
+                f'{name}: p50 {base["p50_ms"]:.2f} ms -> '
+                f'{result["p50_ms"]:.2f} ms (+{delta / base["p50_ms"]:.0%})')
+    return regressions
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    print(f'\n{results["size"]:,} employees generated in '
+          f'{results["generate_seconds"]:.2f}s', file=sys.stderr)
+    print(f'{"benchmark":<20} {"runs":>5} {"p50 ms":>10} {"p95 ms":>10} '
+          f'{"mean ms":>10}', file=sys.stderr)
+    for name, result in results['benchmarks'].items():
+        print(f'{name:<20} {result["calls"]:>5} {result["p50_ms"]:>10.2f} '
+              f'{result["p95_ms"]:>10.2f} {result["mean_ms"]:>10.2f}',
+              file=sys.stderr)
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic company in a temporary database '
+                    'and time the commands against it.')
+    parser.add_argument('--size', type=int, default=10_000,
+                        help='number of employees (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='runs of every command (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the generator (default: %(default)s)')
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        help='run only these benchmarks')
+    parser.add_argument('--output', metavar='FILE',
+                        help='write the results as JSON to FILE '
+                             '(default: stdout)')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown of a median against the '
+                             'baseline, as a fraction (default: %(default)s)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.1,
+                        help='ignore slowdowns smaller than this many '
+                             'milliseconds (default: %(default)s)')
+    parser.add_argument('--breakdown', action='store_true',
+                        help='also collect the per-query and per-renderer '
+                             'statistics of the stats command')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_arguments(argv)
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+    output = os.path.abspath(args.output) if args.output else None
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='orgsim-bench-') as directory:
+        # The database and the logs are created relative to the directory
+        os.chdir(directory)
+        try:
+            set_database_path(os.path.join(directory, 'company.db'))
+
+            start = time.perf_counter()
+            generate_company(args.size, args.seed)
+            generate_seconds = time.perf_counter() - start
+
+            metrics.enabled = args.breakdown
+            benchmarks = run_benchmarks(args.size, args.repeat, args.seed,
+                                        args.only)
+        finally:
+            db.close()
+            shutdown_logging()
+            os.chdir(cwd)
+
+    results = {'created_at': datetime.now().isoformat(),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'size': args.size,
+               'repeat': args.repeat,
+               'seed': args.seed,
+               'generate_seconds': round(generate_seconds, 3),
+               'benchmarks': benchmarks}
+    if args.breakdown:
+        results['operations'] = metrics.snapshot()
+
+    if output is None:
+        print(json.dumps(results, indent=4))
+    else:
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=4)
+    print_report(results)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold,
+                              args.min_delta_ms)
+        if regressions:
+            print('\nRegressions against the baseline:', file=sys.stderr)
+            for regression in regressions:
+                print(f'  {regression}', file=sys.stderr)
+            sys.exit(1)
+        print('\nNo regressions against the baseline', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+from collections import OrderedDict
+from typing import Any, Optional
+
+from .constants import EMPLOYEE_CACHE_SIZE
+from .roles import EmployeeRecord
+
+# Imported by the command parser at startup, so sqlite3 is not imported
+# here and connections are only used through their methods.
+
+
+class EmployeeCache:
+    """
+    LRU cache of employee records keyed by id.
+
+    Writes made through db_funcs invalidate their rows directly. Commits
+    of other processes are detected with PRAGMA data_version, which only
+    changes when another connection modified the database file. Checking
+    it costs about as much as fetching a row, so it is checked once per
+    command: CommandParser calls expire() and the next lookup validates.
+    Only a hit needs the check, a miss reads the version along with the
+    row and passes it to put().
+    """
+
+    def __init__(self, max_size: int = EMPLOYEE_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._rows: OrderedDict = OrderedDict()
+        self._connection: Any = None
+        self._data_version: Optional[int] = None
+        self._validated = False
+
+    def get(self, con: Any, employee_id: int) -> Optional[EmployeeRecord]:
+        """
+        Get a cached row, or None if it has to be fetched.
+        """
+
+        row = self._rows.get(employee_id)
+        if row is not None and (not self._validated or con is not self._connection):
+            self.__validate(con)
+            row = self._rows.get(employee_id)
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._rows.move_to_end(employee_id)
+        return row
+
+    def put(self, con: Any, row: EmployeeRecord, data_version: int) -> None:
+        """
+        Remember a row fetched when PRAGMA data_version was data_version,
+        evicting the least recently used one when the cache is full.
+        """
+
+        # Rows read inside a transaction may still be rolled back
+        if con.in_transaction or self.max_size <= 0:
+            return
+
+        self.__set_version(con, data_version)
+        self._rows[row.id] = row
+        self._rows.move_to_end(row.id)
+        if len(self._rows) > self.max_size:
+            self._rows.popitem(last=False)
+
+    def invalidate(self, employee_id: int) -> None:
+        self._rows.pop(employee_id, None)
+
+    def clear(self) -> None:
+        self._rows.clear()
+
+    def expire(self) -> None:
+        """
+        Check for changes of other processes on the next lookup.
+        """
+
+        self._validated = False
+
+    def __validate(self, con: Any) -> None:
+        """
+        Drop everything if another connection has committed since the
+        last check. Versions of different connections are not comparable,
+        so a new connection starts with an empty cache too.
+        """
+
+        self.__set_version(con, con.execute('PRAGMA data_version').fetchone()[0])
+
+    def __set_version(self, con: Any, data_version: int) -> None:
+        if con is not self._connection or data_version != self._data_version:
+            self._rows.clear()
+            self._connection = con
+            self._data_version = data_version
+        self._validated = True
+
+
+employee_cache = EmployeeCache()
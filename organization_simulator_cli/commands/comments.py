@@ -0,0 +1,110 @@
+from ..cmd_parser import CommandParser, Command
+from ..constants import SEARCH_LIMIT
+from ..exceptions import *
+from ..db_funcs import *
+from ..lookup import take_employee
+from ..emp_comments import read_comment, set_comment, clear_comment, search_comments
+
+
+@CommandParser.register_command('read_comment')
+class ReadCommentCommand(Command):
+    """
+    Command to read the comment for a specific employee.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the read_comment command.
+        """
+
+        employee, rest = take_employee(args)
+        if rest:
+            raise_wrong_number_of_arguments_error()
+
+        print(f'\nComment Content: \n\n{read_comment(employee.id)}\n')
+
+
+@CommandParser.register_command('search_comments')
+class SearchCommentsCommand(Command):
+    """
+    Command to search employees by the text of their comments.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the search_comments command.
+        """
+
+        limit = SEARCH_LIMIT
+        words = []
+        for arg in args:
+            if arg.lower().startswith('--limit='):
+                if not arg[8:].isdigit():
+                    raise_incorrect_flag_error()
+                limit = int(arg[8:])
+            else:
+                words.append(arg)
+
+        if not words:
+            raise_wrong_number_of_arguments_error()
+
+        results = search_comments(' '.join(words), limit)
+        if not results:
+            print('\nNo comments found.\n')
+            return
+
+        import prettytable
+
+        table = prettytable.PrettyTable()
+        table.field_names = ['ID', 'Name', 'Surname', 'Comment']
+        table.align['Comment'] = 'l'
+        for row in results:
+            table.add_row([*row[:3], ' '.join(row[3].split())])
+        print('\n' + table.get_string() + '\n')
+
+
+@CommandParser.register_command('clear_comment')
+class ClearCommentCommand(Command):
+    """
+    Command to clear the comment for a specific employee.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the clear_comment command.
+        """
+
+        employee, rest = take_employee(args)
+        if rest:
+            raise_wrong_number_of_arguments_error()
+
+        clear_comment(employee.id)
+        print('\nComment has been successfully cleared!\n')
+
+
+@CommandParser.register_command('set_comment')
+class SetCommentCommand(Command):
+    """
+    Command to set or change the comment for a specific employee.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the set_comment command.
+        """
+
+        employee, rest = take_employee(args)
+
+        if rest:
+            comment = ' '.join(rest)
+        elif CommandParser.reading_stdin:
+            # The next line of the script is a command, not the comment
+            raise_comment_not_given_error()
+        else:
+            comment = input('\nEnter a comment: \n\n')
+        set_comment(employee.id, comment)
+        print('\nComment has been successfully changed!\n')
@@ -0,0 +1,360 @@
+import os
+import csv
+import gzip
+import json
+import time
+from collections import Counter
+from typing import Dict, Any, IO, Iterable, Iterator, TextIO
+
+from ..cmd_parser import CommandParser, Command, resolve_path
+from ..constants import (ROLES_FLAGS, IMPORT_BATCH_SIZE, IMPORT_FORMATS,
+                         IMPORT_FIELDS, EXPORT_CHUNK_SIZE, SEARCH_LIMIT)
+from ..exporters import EXPORT_FORMATS, EXPORT_WRITERS
+from ..log import logger
+from ..metrics import metrics, timed
+from ..roles import Employee, Role
+from ..queries import EmployeeQuery
+from ..renderers import *
+from ..exceptions import *
+from ..db_funcs import *
+from ..lookup import take_employee, find_employees
+
+
+@CommandParser.register_command('list')
+class ListCommand(Command):
+    """
+    Command to list employees with optional sorting and filtering.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the list command.
+        """
+
+        query = EmployeeQuery()
+        output_format = 'table'
+
+        for param in args:
+            flag = param.lower()
+            if flag.startswith('--sort='):
+                query.order_by(flag[7:])
+            elif flag.startswith('--where='):
+                # The value keeps its case, as in export
+                query.where(param[8:])
+            elif flag.startswith('--limit='):
+                query.limit(ListCommand.__parse_number(flag[8:]))
+            elif flag.startswith('--offset='):
+                query.offset(ListCommand.__parse_number(flag[9:]))
+            elif flag.startswith('--format='):
+                output_format = flag[9:]
+                if output_format not in LIST_FORMATS:
+                    raise_incorrect_flag_error()
+            elif flag.startswith('-'):
+                role_flag = flag[1:]
+                if role_flag not in ROLES_FLAGS:
+                    raise_incorrect_flag_error()
+                query.with_roles([Role.from_flag(role_flag)])
+            else:
+                raise_incorrect_flag_error()
+
+        match output_format:
+            case 'table':
+                print_employees_table(fetch_employees(query))
+            case 'stream':
+                stream_employees_table(iter_employees(query),
+                                       fetch_employee_column_widths(query))
+            case 'tsv':
+                write_employees_delimited(iter_employees(query), '\t')
+            case 'csv':
+                write_employees_delimited(iter_employees(query), ',')
+            case 'jsonl':
+                write_employees_jsonl(iter_employees(query))
+
+    @staticmethod
+    def __parse_number(value: str) -> int:
+        """
+        Parse the numeric value of a flag.
+        """
+
+        if not value.isdigit():
+            raise_incorrect_flag_error()
+        return int(value)
+
+
+@CommandParser.register_command('add')
+class AddCommand(Command):
+    """
+    Command to add a new employee to the database.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the add command.
+        """
+
+        if len(args) != 6:
+            raise_wrong_number_of_arguments_error()
+
+        employee = AddCommand.build_employee(*args)
+
+        if not insert_into_db(employee):
+            return
+        logger.success(
+            'Employee has been successfully added to the database!')
+        print(
+            '\nEmployee has been successfully added to the database!\n')
+
+    @staticmethod
+    def build_employee(name: str,
+                       surname: str,
+                       age: str,
+                       phone_number: str,
+                       bank_card_number: str,
+                       role: str) -> Employee:
+        """
+        Validate raw employee fields and build an Employee object.
+        """
+
+        role_str = role.upper()
+
+        if not hasattr(Role, role_str):
+            raise_incorrect_arguments_error()
+
+        return Employee(
+            name,
+            surname,
+            int(age),
+            phone_number,
+            bank_card_number,
+            getattr(Role, role_str))
+
+
+@CommandParser.register_command('import')
+class ImportCommand(Command):
+    """
+    Command to import employees in bulk from a CSV or JSONL file.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the import command.
+        """
+
+        if not args:
+            raise_wrong_number_of_arguments_error()
+
+        path = args[0]
+        batch_size = IMPORT_BATCH_SIZE
+        file_format = os.path.splitext(path)[1][1:].lower()
+
+        for param in args[1:]:
+            if param.lower().startswith('--batch='):
+                if not param[8:].isdigit() or int(param[8:]) < 1:
+                    raise_incorrect_flag_error()
+                batch_size = int(param[8:])
+            elif param.lower().startswith('--format='):
+                file_format = param[9:].lower()
+            else:
+                raise_incorrect_flag_error()
+
+        if file_format not in IMPORT_FORMATS:
+            raise_incorrect_arguments_error()
+
+        counters = Counter()
+        start = time.perf_counter()
+
+        def show_progress(inserted: int) -> None:
+            counters['inserted'] += inserted
+            print(f'\rProcessed {counters["read"]:,} rows...',
+                  end='', flush=True)
+
+        with open(resolve_path(path), newline='', encoding='utf-8') as file:
+            rows = ImportCommand.__read_rows(file, file_format)
+            employees = ImportCommand.__validate_rows(rows, counters)
+            insert_employees_in_batches(employees, batch_size, show_progress)
+
+        elapsed = time.perf_counter() - start
+        duplicates = counters['read'] - counters['invalid'] - counters['inserted']
+        logger.success(
+            f'Imported {counters["inserted"]} employees from {path}!')
+        print(f'\r\nRows read: {counters["read"]:,}'
+              f'\nInserted: {counters["inserted"]:,}'
+              f'\nSkipped (duplicates): {duplicates:,}'
+              f'\nSkipped (invalid): {counters["invalid"]:,}'
+              f'\nElapsed: {elapsed:.2f}s '
+              f'({counters["read"] / max(elapsed, 1e-9):,.0f} rows/sec)\n')
+
+    @staticmethod
+    @timed('io.read_import')
+    def __read_rows(file: TextIO, file_format: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the rows of an HR export one by one.
+        """
+
+        if file_format == 'csv':
+            yield from csv.DictReader(file)
+            return
+
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+    @staticmethod
+    def __validate_rows(rows: Iterable[Dict[str, Any]],
+                        counters: Counter) -> Iterator[Employee]:
+        """
+        Validate the rows the same way the add command does, skipping
+        (and logging) the invalid ones.
+        """
+
+        for row in rows:
+            counters['read'] += 1
+            try:
+                yield AddCommand.build_employee(
+                    *(str(row[field]) for field in IMPORT_FIELDS))
+            except (KeyError, TypeError, ValueError, IncorrectArgumentsError):
+                counters['invalid'] += 1
+                logger.warning(
+                    f'Skipped invalid row #{counters["read"]} during import')
+
+
+@CommandParser.register_command('export')
+class ExportCommand(Command):
+    """
+    Command to export employees to a CSV, JSONL or columnar file.
+    """
+
+    # Formats guessed from the file extension (after an optional .gz)
+    EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl',
+                  '.col': 'columnar'}
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the export command.
+        """
+
+        if not args:
+            raise_wrong_number_of_arguments_error()
+
+        path = args[0]
+        query = EmployeeQuery()
+        compress = path.lower().endswith('.gz')
+        file_format = ExportCommand.EXTENSIONS.get(
+            os.path.splitext(path[:-3] if compress else path)[1].lower())
+        with_comments = with_salary = False
+
+        for param in args[1:]:
+            flag = param.lower()
+            if flag.startswith('--format='):
+                file_format = flag[9:]
+            elif flag == '--comments':
+                with_comments = True
+            elif flag == '--salary':
+                with_salary = True
+            elif flag == '--gzip':
+                compress = True
+            elif flag.startswith('--sort='):
+                query.order_by(flag[7:])
+            elif flag.startswith('--where='):
+                query.where(param[8:])
+            elif flag.startswith('-') and flag[1:] in ROLES_FLAGS:
+                query.with_roles([Role.from_flag(flag[1:])])
+            else:
+                raise_incorrect_flag_error()
+
+        if file_format not in EXPORT_FORMATS:
+            raise_incorrect_arguments_error()
+
+        start = time.perf_counter()
+        chunks = iter_export_chunks(query, with_comments, with_salary,
+                                    EXPORT_CHUNK_SIZE)
+        with metrics.timer('io.export'), \
+                ExportCommand.__open(resolve_path(path), file_format,
+                                     compress) as out:
+            rows = EXPORT_WRITERS[file_format](
+                chunks, export_columns(with_comments, with_salary), out)
+
+        elapsed = time.perf_counter() - start
+        logger.success(f'Exported {rows} employees to {path}!')
+        print(f'\nExported {rows:,} employees to {path} in {elapsed:.2f}s '
+              f'({rows / max(elapsed, 1e-9):,.0f} rows/sec)\n')
+
+    @staticmethod
+    def __open(path: str, file_format: str, compress: bool) -> IO:
+        """
+        Open the output file, binary for the columnar format.
+        """
+
+        if file_format == 'columnar':
+            return gzip.open(path, 'wb') if compress else open(path, 'wb')
+        if compress:
+            return gzip.open(path, 'wt', encoding='utf-8', newline='')
+        return open(path, 'w', encoding='utf-8', newline='')
+
+
+@CommandParser.register_command('remove')
+class RemoveCommand(Command):
+    """
+    Command to remove an employee from the database.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the remove command.
+        """
+
+        employee, rest = take_employee(args)
+        if rest:
+            raise_wrong_number_of_arguments_error()
+
+        # Checked by the delete itself, which is atomic across processes
+        if not remove_employee_by_id(employee.id):
+            raise_incorrect_employee_id_error()
+
+        logger.success('Employee has been successfully removed!')
+        print('\nEmployee has been successfully removed!\n')
+
+
+@CommandParser.register_command('find')
+class FindCommand(Command):
+    """
+    Command to find employees by name, tolerating typos.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the find command.
+        """
+
+        limit = SEARCH_LIMIT
+        words = []
+        for arg in args:
+            if arg.lower().startswith('--limit='):
+                if not arg[8:].isdigit():
+                    raise_incorrect_flag_error()
+                limit = int(arg[8:])
+            else:
+                words.append(arg)
+
+        if not words:
+            raise_wrong_number_of_arguments_error()
+
+        results = find_employees(' '.join(words), limit)
+        if not results:
+            print('\nNo employees found.\n')
+            return
+
+        import prettytable
+
+        table = prettytable.PrettyTable()
+        table.field_names = ['ID', 'Name', 'Surname', 'Major', 'Match']
+        for employee, score in results:
+            table.add_row([employee.id, employee.name, employee.surname,
+                           employee.major, f'{score:.0%}'])
+        print('\n' + table.get_string() + '\n')
@@ -0,0 +1,82 @@
+import os
+
+from ..cmd_parser import CommandParser, Command
+from ..exceptions import *
+
+
+@CommandParser.register_command('help')
+class HelpCommand(Command):
+    """
+    Command to display a list of available commands.
+    """
+
+    @staticmethod
+    def execute(*args) -> None:
+        """
+        Executes the help command.
+        """
+
+        if args:
+            raise_wrong_number_of_arguments_error()
+
+        print('\nList of available commands:\n')
+        # The descriptions are kept in the registry, so that the modules
+        # of the commands are not imported
+        for cmd_name, (_, command_desc) in CommandParser.LAZY_COMMANDS.items():
+            print(f"- {cmd_name} - {command_desc}")
+        print()
+
+
+@CommandParser.register_command('clear')
+class ClearCommand(Command):
+    """
+    Command to clear the console screen.
+    """
+
+    @staticmethod
+    def execute(*args) -> None:
+        """
+        Executes the clear command.
+        """
+
+        if args:
+            raise_wrong_number_of_arguments_error()
+        os.system('cls' if os.name == 'nt' else 'clear')
+
+
+@CommandParser.register_command('man')
+class ManCommand(Command):
+    """
+    Command to display the manual for a specific command.
+    """
+
+    @staticmethod
+    def execute(*args) -> None:
+        """
+        Executes the man command.
+        """
+
+        if len(args) != 1:
+            raise_wrong_number_of_arguments_error()
+
+        manual = ManCommand.__read_cmd_manual(args[0].lower())
+        if manual:
+            print(manual)
+
+    @staticmethod
+    def __read_cmd_manual(cmd: str) -> str | None:
+        """
+        Read the manual content for a specific command.
+        """
+
+        if cmd not in CommandParser.LAZY_COMMANDS:
+            raise_command_not_found_error()
+
+        with open(f'organization_simulator_cli/manuals/{cmd}.txt', 'r') as file:
+            result = file.read()
+            return result
+
+
+@CommandParser.register_command('game')
+class GameCommand(Command):
+    pass
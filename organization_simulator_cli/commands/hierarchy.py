@@ -0,0 +1,105 @@
+from ..cmd_parser import CommandParser, Command
+from ..log import logger
+from ..renderers import print_employees_table
+from ..exceptions import *
+from ..db_funcs import *
+from ..lookup import take_employee
+
+
+def _describe(employee: EmployeeRecord) -> str:
+    return f'{employee.name} {employee.surname} ({employee.major}, ID {employee.id})'
+
+
+@CommandParser.register_command('assign')
+class AssignCommand(Command):
+    """
+    Command to set the manager an employee reports to.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the assign command.
+        """
+
+        employee, rest = take_employee(args)
+        if not rest:
+            raise_wrong_number_of_arguments_error()
+
+        if len(rest) == 1 and rest[0].lower() == '--none':
+            assign_manager(employee.id, None)
+            logger.success(f'{_describe(employee)} no longer reports to anyone!')
+            print(f'\n{_describe(employee)} no longer reports to anyone\n')
+            return
+
+        manager, rest = take_employee(rest)
+        if rest:
+            raise_wrong_number_of_arguments_error()
+
+        assign_manager(employee.id, manager.id)
+        logger.success(f'{_describe(employee)} now reports to {_describe(manager)}!')
+        print(f'\n{_describe(employee)} now reports to {_describe(manager)}\n')
+
+
+@CommandParser.register_command('team')
+class TeamCommand(Command):
+    """
+    Command to show the headcount and payroll under a manager.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the team command.
+        """
+
+        manager, rest = take_employee(args)
+        max_depth = 1
+
+        for param in map(str.lower, rest):
+            if param.startswith('--depth=') and param[8:].isdigit():
+                max_depth = int(param[8:])
+            elif param == '--all':
+                max_depth = None
+            else:
+                raise_incorrect_flag_error()
+
+        direct, headcount, payroll, levels = fetch_team_summary(manager.id)
+        print(f'\nTeam of {_describe(manager)}'
+              f'\nDirect reports: {direct:,}'
+              f'\nTotal headcount: {headcount:,}'
+              f'\nLevels below: {levels}'
+              f'\nMonthly payroll: ${payroll:,}')
+
+        if headcount == 0:
+            print()
+            return
+        print_employees_table(fetch_reports(manager.id, max_depth))
+
+
+@CommandParser.register_command('chain')
+class ChainCommand(Command):
+    """
+    Command to show the management chain above an employee.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the chain command.
+        """
+
+        employee, rest = take_employee(args)
+        if rest:
+            raise_wrong_number_of_arguments_error()
+
+        chain = fetch_management_chain(employee.id)
+
+        print(f'\n{_describe(employee)}')
+        if not chain:
+            print('Reports to nobody\n')
+            return
+
+        for level, manager in enumerate(chain):
+            print(f'{"    " * level}└── reports to {_describe(manager)}')
+        print()
@@ -0,0 +1,138 @@
+import time
+
+from ..cmd_parser import CommandParser, Command, resolve_path
+from ..constants import JOURNAL_SHOWN
+from ..log import logger
+from ..exceptions import *
+from ..journal import (JournalEntry, undo, redo, fetch_journal, take_snapshot,
+                       replay_journal)
+
+
+def _describe(entry: JournalEntry) -> str:
+    match entry.action:
+        case 'insert':
+            return (f'adding of {entry.data[0]} {entry.data[1]} '
+                    f'(ID {entry.employee_id})')
+        case 'delete':
+            return (f'removal of {entry.data[0]} {entry.data[1]} '
+                    f'(ID {entry.employee_id})')
+        case 'manager':
+            return f'manager change of employee ID {entry.employee_id}'
+        case 'payment':
+            return (f'payment of {entry.data[2]} to employee ID '
+                    f'{entry.employee_id}')
+        case _:
+            return f'comment change of employee ID {entry.employee_id}'
+
+
+@CommandParser.register_command('undo')
+class UndoCommand(Command):
+    """
+    Command to undo the latest change of employees or comments.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the undo command.
+        """
+
+        if args:
+            raise_wrong_number_of_arguments_error()
+
+        entry = undo()
+        logger.success(f'Undone the {_describe(entry)}!')
+        print(f'\nUndone the {_describe(entry)}\n')
+
+
+@CommandParser.register_command('redo')
+class RedoCommand(Command):
+    """
+    Command to make the latest undone change again.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the redo command.
+        """
+
+        if args:
+            raise_wrong_number_of_arguments_error()
+
+        entry = redo()
+        logger.success(f'Redone the {_describe(entry)}!')
+        print(f'\nRedone the {_describe(entry)}\n')
+
+
+@CommandParser.register_command('journal')
+class JournalCommand(Command):
+    """
+    Command to show the journal of changes, snapshot it or replay it.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the journal command.
+        """
+
+        action = args[0].lower() if args else None
+
+        match action:
+            case None:
+                JournalCommand.__show_entries(JOURNAL_SHOWN)
+            case _ if action.isdigit() and len(args) == 1:
+                JournalCommand.__show_entries(int(action))
+            case 'snapshot' if len(args) == 1:
+                start = time.perf_counter()
+                entry_id, path = take_snapshot()
+                logger.success(f'Snapshot {path} has been taken!')
+                print(f'\nSnapshot of the journal up to entry #{entry_id} has '
+                      f'been written to {path} in '
+                      f'{time.perf_counter() - start:.2f}s\n')
+            case 'replay' if len(args) in (2, 3):
+                JournalCommand.__replay(*args[1:])
+            case 'snapshot' | 'replay':
+                raise_wrong_number_of_arguments_error()
+            case _:
+                raise_incorrect_arguments_error()
+
+    @staticmethod
+    def __show_entries(limit: int) -> None:
+        entries = fetch_journal(limit)
+        if not entries:
+            print('\nThe journal is empty.\n')
+            return
+
+        import prettytable
+
+        table = prettytable.PrettyTable()
+        table.field_names = ['#', 'Time', 'Kind', 'Change', 'Reverts']
+        table.align['Change'] = 'l'
+        for entry in entries:
+            change = _describe(entry)
+            table.add_row([entry.id, entry.made_at, entry.kind,
+                           change[0].upper() + change[1:], entry.reverts or ''])
+        print('\n' + table.get_string() + '\n')
+
+    @staticmethod
+    def __replay(path: str, *flags: str) -> None:
+        """
+        Rebuild the database in a new file, up to the entry given with
+        --until= or up to the latest one.
+        """
+
+        until = None
+        for flag in flags:
+            if not flag.lower().startswith('--until=') or not flag[8:].isdigit():
+                raise_incorrect_flag_error()
+            until = int(flag[8:])
+
+        start = time.perf_counter()
+        snapshot_id, replayed = replay_journal(resolve_path(path), until)
+        elapsed = time.perf_counter() - start
+        logger.success(f'The database has been replayed into {path}!')
+        print(f'\nReplayed {replayed:,} changes after the snapshot of entry '
+              f'#{snapshot_id} into {path} in {elapsed:.2f}s '
+              f'({replayed / max(elapsed, 1e-9):,.0f} changes/sec)\n')
@@ -0,0 +1,103 @@
+from datetime import datetime
+
+from ..cmd_parser import CommandParser, Command
+from ..constants import VALID_LEVELS
+from ..log import flush_logs, clear_logs
+from ..log_reader import LevelIndex, LogQuery, last_logs, search_logs
+from ..exceptions import *
+
+
+@CommandParser.register_command('logs')
+class LogsCommand(Command):
+    """
+    Command to manage the application logs.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the logs command.
+        """
+
+        if not args:
+            raise_wrong_number_of_arguments_error()
+
+        # Make sure every pending record has been written to the log file
+        flush_logs()
+
+        args = tuple(arg.lower() for arg in args)
+
+        if args == ('clear',):
+            LogsCommand.__clear_logs()
+            return
+
+        last_lines = None
+        query = LogQuery()
+
+        for arg in args:
+            if arg.isdigit() and last_lines is None:
+                last_lines = int(arg)
+            elif arg.startswith('--level='):
+                query.level = arg[8:].upper()
+                if query.level not in VALID_LEVELS:
+                    raise_incorrect_log_level_error()
+            elif arg.startswith('--since='):
+                query.since = LogsCommand.__parse_time(arg[8:])
+            elif arg.startswith('--until='):
+                query.until = LogsCommand.__parse_time(arg[8:])
+            else:
+                raise_incorrect_arguments_error()
+
+        if last_lines is None and query.level is None and not query.has_time_range:
+            raise_incorrect_arguments_error()
+
+        LogsCommand.__show_logs(query, last_lines)
+
+    @staticmethod
+    def __show_logs(query: LogQuery, last_lines: int | None) -> None:
+        """
+        Show the (last n) lines of the current and the archived logs that
+        match the query.
+        """
+
+        print()
+        if last_lines is None:
+            lines = search_logs(query)
+        else:
+            lines = last_logs(query, last_lines)
+
+        logs_exist = False
+        for line in lines:
+            print(line.strip())
+            logs_exist = True
+
+        if not logs_exist:
+            if query.level is not None:
+                print(f'No logs found with level "{query.level}"')
+            elif query.has_time_range:
+                print('No logs found in this time range')
+            else:
+                print('No logs yet.')
+        print()
+
+    @staticmethod
+    def __clear_logs() -> None:
+        """
+        Clear the application logs.
+        """
+
+        clear_logs()
+        LevelIndex().clear()
+        print('\nLogs have been successfully cleared!\n')
+
+    @staticmethod
+    def __parse_time(value: str) -> datetime:
+        """
+        Parse an ISO date or date and time, local time by default.
+        """
+
+        try:
+            time = datetime.fromisoformat(value.upper())
+        except ValueError:
+            raise_incorrect_arguments_error()
+        return time if time.tzinfo else time.astimezone()
@@ -0,0 +1,289 @@
+import re
+import csv
+from datetime import date
+from typing import Dict, List
+
+from ..cmd_parser import CommandParser, Command, resolve_path
+from ..constants import ROLES_FLAGS
+from ..log import logger
+from ..metrics import metrics
+from ..roles import Accountant, EmployeeRecord, Role
+from ..exceptions import *
+from ..db_funcs import *
+from ..lookup import take_employee
+
+# Payments are made for a month written as YYYY-MM
+PERIOD_PATTERN = re.compile(r'\d{4}-(0[1-9]|1[0-2])')
+
+
+def _parse_roles(flag: str, roles: List[Role]) -> bool:
+    """
+    Add the role of a role flag (-b) to the roles. Returns False if the
+    argument is not a role flag.
+    """
+
+    if not flag.startswith('-') or flag[1:] not in ROLES_FLAGS:
+        return False
+    role = Role.from_flag(flag[1:])
+    if role not in roles:
+        roles.append(role)
+    return True
+
+
+@CommandParser.register_command('calculate')
+class CalculateCommand(Command):
+    """
+    Command to calculate the salary for a specific employee.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the calculate command.
+        """
+
+        result, rest = take_employee(args)
+        if rest:
+            raise_wrong_number_of_arguments_error()
+
+        print(
+            f'\nEmployee: {result.name} {result.surname}'
+            f'\nSalary: ${Accountant.calculate_salary(result):,}\n')
+
+
+@CommandParser.register_command('payroll')
+class PayrollCommand(Command):
+    """
+    Command to calculate the salaries for the whole company in one pass.
+    """
+
+    PERCENTILES = (50, 90, 99)
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the payroll command.
+        """
+
+        roles = []
+        output_path = None
+
+        if args and args[0].lower() in ('history', 'ytd'):
+            PayrollCommand.__report(args[0].lower(), args[1:])
+            return
+
+        for param in args:
+            if param.lower().startswith('--output='):
+                output_path = param[9:]
+                if not output_path:
+                    raise_incorrect_flag_error()
+            elif not _parse_roles(param.lower(), roles):
+                raise_incorrect_flag_error()
+
+        headcount = {role: count
+                     for role, count in fetch_headcount_by_role(roles)}
+        PayrollCommand.__print_summary(headcount)
+
+        if output_path is not None:
+            with metrics.timer('io.write_payroll'), \
+                    open(resolve_path(output_path), 'w', newline='',
+                         encoding='utf-8') as file:
+                writer = csv.writer(file, lineterminator='\n')
+                writer.writerow(('id', 'name', 'surname', 'major', 'salary'))
+                writer.writerows(iter_payroll(roles))
+            logger.success(f'Payroll has been written to {output_path}!')
+            print(f'Payroll has been written to {output_path}\n')
+
+    @staticmethod
+    def __print_summary(headcount: Dict[Role, int]) -> None:
+        """
+        Print per-role aggregates, totals and salary percentiles. Salaries
+        only depend on the role, so everything is derived from headcounts.
+        """
+
+        import prettytable
+
+        salaries = {role: Accountant.salary_for_role(role)
+                    for role in headcount}
+        employees = sum(headcount.values())
+
+        table = prettytable.PrettyTable()
+        table.field_names = ['Role', 'Employees', 'Salary', 'Total']
+        for role in sorted(headcount, key=str):
+            table.add_row([role,
+                           f'{headcount[role]:,}',
+                           f'${salaries[role]:,}',
+                           f'${headcount[role] * salaries[role]:,}'])
+
+        total = sum(headcount[role] * salaries[role] for role in headcount)
+        print('\n' + table.get_string())
+        print(f'\nEmployees: {employees:,}'
+              f'\nTotal: ${total:,}'
+              f'\nAverage: ${total // max(employees, 1):,}')
+
+        if employees:
+            percentiles = PayrollCommand.__percentiles(headcount, salaries)
+            print('Percentiles: ' + ' | '.join(
+                f'p{p} ${salary:,}' for p, salary in percentiles))
+        print()
+
+    @staticmethod
+    def __percentiles(headcount: Dict[Role, int],
+                      salaries: Dict[Role, int]) -> List[tuple]:
+        """
+        Nearest-rank percentiles over the salary distribution.
+        """
+
+        result = []
+        for percentile in PayrollCommand.PERCENTILES:
+            rank = max(1, -(-percentile * sum(headcount.values()) // 100))
+            seen = 0
+            for role in sorted(headcount, key=salaries.get):
+                seen += headcount[role]
+                if seen >= rank:
+                    result.append((percentile, salaries[role]))
+                    break
+        return result
+
+    @staticmethod
+    def __report(report: str, args: List[str]) -> None:
+        """
+        Show the payments history or the year-to-date totals of the company
+        or of one employee. Everything but the payments of one employee is
+        read from the running totals.
+        """
+
+        # Year to date is the current year unless another one is given
+        year = date.today().year if report == 'ytd' else None
+        words = []
+        for param in args:
+            if param.lower().startswith('--year='):
+                if not param[7:].isdigit() or len(param[7:]) != 4:
+                    raise_incorrect_flag_error()
+                year = int(param[7:])
+            else:
+                words.append(param)
+
+        employee = None
+        if words:
+            employee, rest = take_employee(words)
+            if rest:
+                raise_wrong_number_of_arguments_error()
+
+        import prettytable
+
+        table = prettytable.PrettyTable()
+        if employee is not None:
+            rows = [(period, f'${amount:,}', paid_at) for period, amount, paid_at
+                    in fetch_employee_payments(employee.id, year)]
+            table.field_names = ['Period', 'Amount', 'Paid at']
+            totals = [(payments, total) for paid_year, payments, total
+                      in fetch_employee_payment_totals(employee.id)
+                      if year is None or paid_year == year]
+            title = f'Payments to {employee.name} {employee.surname}'
+        elif report == 'history':
+            rows = [(period, f'{payments:,}', f'${total:,}') for period, payments, total
+                    in fetch_payments_by_period(year)]
+            table.field_names = ['Period', 'Payments', 'Total']
+            totals = [(payments, total) for _, payments, total
+                      in fetch_payments_by_role(year)]
+            title = 'Payments history'
+        else:
+            rows = [(role, f'{payments:,}', f'${total:,}') for role, payments, total
+                    in fetch_payments_by_role(year)]
+            table.field_names = ['Role', 'Payments', 'Total']
+            totals = [(payments, total) for _, payments, total
+                      in fetch_payments_by_role(year)]
+            title = 'Payments year to date'
+
+        if year is not None:
+            title += f' in {year}'
+        if not rows:
+            print(f'\n{title}: nothing has been paid yet\n')
+            return
+
+        table.add_rows(rows)
+        print(f'\n{title}\n' + table.get_string())
+        print(f'\nPayments: {sum(payments for payments, _ in totals):,}'
+              f'\nTotal: ${sum(total for _, total in totals):,}\n')
+
+
+@CommandParser.register_command('pay')
+class PayCommand(Command):
+    """
+    Command to pay the monthly salary to an employee or to everyone.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the pay command.
+        """
+
+        period = date.today().strftime('%Y-%m')
+        everyone = False
+        roles = []
+        words = []
+
+        for param in args:
+            flag = param.lower()
+            if flag.startswith('--period='):
+                period = flag[9:]
+                if not PERIOD_PATTERN.fullmatch(period):
+                    raise_incorrect_flag_error()
+            elif flag == '--all':
+                everyone = True
+            elif not _parse_roles(flag, roles):
+                words.append(param)
+
+        if everyone:
+            if words:
+                raise_wrong_number_of_arguments_error()
+            PayCommand.__pay_everyone(period, roles)
+            return
+
+        # Role flags only select whom --all pays
+        if roles:
+            raise_incorrect_flag_error()
+        employee, rest = take_employee(words)
+        if rest:
+            raise_wrong_number_of_arguments_error()
+        PayCommand.__pay_employee(employee, period)
+
+    @staticmethod
+    def __pay_employee(employee: EmployeeRecord, period: str) -> None:
+        name = f'{employee.name} {employee.surname}'
+        if not Accountant.pay_salary(employee, period):
+            msg = f'{name} has already been paid for {period}!'
+            print(f'\n{msg}\n')
+            logger.warning(msg)
+            return
+
+        salary = Accountant.calculate_salary(employee)
+        logger.success(f'{name} has been paid ${salary:,} for {period}!')
+        print(f'\n{name} has been paid ${salary:,} for {period}\n')
+
+    @staticmethod
+    def __pay_everyone(period: str, roles: List[Role]) -> None:
+        """
+        Pay everyone not paid for the period yet in one transaction and
+        print what has been paid per role.
+        """
+
+        paid = pay_all(period, roles)
+        if not paid:
+            print(f'\nEveryone has already been paid for {period}\n')
+            return
+
+        import prettytable
+
+        table = prettytable.PrettyTable()
+        table.field_names = ['Role', 'Payments', 'Total']
+        for role, payments, total in paid:
+            table.add_row([role, f'{payments:,}', f'${total:,}'])
+
+        payments = sum(payments for _, payments, _ in paid)
+        total = sum(total for _, _, total in paid)
+        logger.success(f'Paid ${total:,} to {payments} employees for {period}!')
+        print('\n' + table.get_string())
+        print(f'\nPaid ${total:,} to {payments:,} employees for {period}\n')
@@ -0,0 +1,74 @@
+from ..cmd_parser import CommandParser, Command, resolve_path
+from ..metrics import metrics, PERCENTILES, STATS_FILE
+from ..exceptions import *
+
+
+@CommandParser.register_command('stats')
+class StatsCommand(Command):
+    """
+    Command to show how long commands and their steps take.
+    """
+
+    @staticmethod
+    def execute(*args: str) -> None:
+        """
+        Executes the stats command.
+        """
+
+        if len(args) > 2:
+            raise_wrong_number_of_arguments_error()
+
+        action = args[0].lower() if args else None
+        if action != 'export' and len(args) > 1:
+            raise_wrong_number_of_arguments_error()
+
+        match action:
+            case None:
+                StatsCommand.__show_stats()
+            case 'on':
+                metrics.enabled = True
+                print('\nStatistics collection has been enabled\n')
+            case 'off':
+                metrics.enabled = False
+                print('\nStatistics collection has been disabled\n')
+            case 'reset':
+                metrics.reset()
+                print('\nStatistics have been reset\n')
+            case 'export':
+                path = args[1] if len(args) == 2 else STATS_FILE
+                if metrics.export(resolve_path(path)):
+                    print(f'\nStatistics have been written to {path}\n')
+                else:
+                    print('\nNo statistics have been collected yet\n')
+            case _:
+                raise_incorrect_arguments_error()
+
+    @staticmethod
+    def __show_stats() -> None:
+        """
+        Print a table with the statistics of every timed operation.
+        """
+
+        snapshot = metrics.snapshot()
+        if not snapshot:
+            state = 'enabled' if metrics.enabled else \
+                'disabled, enable it with: stats on'
+            print(f'\nNo statistics have been collected yet '
+                  f'(collection is {state})\n')
+            return
+
+        import prettytable
+
+        table = prettytable.PrettyTable()
+        table.field_names = ['Operation', 'Calls', 'Errors', 'Rows',
+                             *(f'p{p} ms' for p in PERCENTILES), 'Total ms']
+        table.align['Operation'] = 'l'
+        for name, summary in snapshot.items():
+            table.add_row([name,
+                           f'{summary["calls"]:,}',
+                           f'{summary["errors"]:,}',
+                           f'{summary["rows"]:,}',
+                           *(f'{summary[f"p{p}_ms"]:.2f}' for p in PERCENTILES),
+                           f'{summary["total_ms"]:,.2f}'])
+
+        print('\n' + table.get_string() + '\n')
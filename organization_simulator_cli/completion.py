@@ -0,0 +1,243 @@
+from array import array
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from .constants import SORT_PARAMS, ROLES_FLAGS, COMPLETION_LIMIT
+from .exporters import EXPORT_FORMATS
+from .renderers import LIST_FORMATS
+
+ROLE_OPTIONS = tuple(f'-{flag}' for flag in ROLES_FLAGS)
+
+# Options completed after a command, with the values of an option
+# written out in full (--sort=name rather than --sort=)
+COMMAND_OPTIONS: Dict[str, Sequence[str]] = {
+    'list': (*(f'--sort={param}' for param in SORT_PARAMS),
+             *(f'--format={name}' for name in LIST_FORMATS),
+             '--where=', '--limit=', '--offset=', *ROLE_OPTIONS),
+    'export': (*(f'--format={name}' for name in EXPORT_FORMATS),
+               *(f'--sort={param}' for param in SORT_PARAMS),
+               '--where=', '--comments', '--salary', '--gzip', *ROLE_OPTIONS),
+    'payroll': ('history', 'ytd', '--output=', '--year=', *ROLE_OPTIONS),
+    'pay': ('--all', '--period=', *ROLE_OPTIONS),
+    'team': ('--depth=', '--all'),
+    'import': ('--format=csv', '--format=jsonl', '--batch='),
+    'search_comments': ('--limit=',),
+    'find': ('--limit=',),
+    'journal': ('snapshot', 'replay', '--until='),
+}
+
+# Commands taking employees, with the number of employee arguments
+EMPLOYEE_ARGUMENTS: Dict[str, int] = {
+    'remove': 1,
+    'calculate': 1,
+    'pay': 1,
+    'read_comment': 1,
+    'set_comment': 1,
+    'clear_comment': 1,
+    'team': 1,
+    'chain': 1,
+    'assign': 2,
+    'find': 1,
+}
+
+
+class PrefixTrie:
+    """
+    Prefix tree of words matched case-insensitively. Nodes are plain dicts
+    keyed by character, the '' key of a node holds the word ending there.
+    """
+
+    __slots__ = ('_root',)
+
+    def __init__(self, words: Iterable[str] = ()) -> None:
+        self._root: Dict[str, Any] = {}
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str) -> None:
+        node = self._root
+        for char in word.lower():
+            node = node.setdefault(char, {})
+        node[''] = word
+
+    def __contains__(self, word: str) -> bool:
+        node = self.__find(word)
+        return node is not None and '' in node
+
+    def with_prefix(self, prefix: str, limit: int = COMPLETION_LIMIT) -> List[str]:
+        """
+        Get up to limit words starting with the prefix in alphabetical order.
+        """
+
+        node = self.__find(prefix)
+        if node is None:
+            return []
+
+        words = []
+        stack = [node]
+        while stack and len(words) < limit:
+            node = stack.pop()
+            if '' in node:
+                words.append(node[''])
+            stack.extend(node[char] for char in sorted(node, reverse=True) if char)
+        return words
+
+    def __find(self, prefix: str) -> Optional[Dict[str, Any]]:
+        node = self._root
+        for char in prefix.lower():
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+
+class EmployeeIndex:
+    """
+    In-memory index of employee IDs and names for completion.
+
+    It is only refreshed when the database has changed: PRAGMA data_version
+    reveals commits of other connections and total_changes the writes of
+    our own. New employees are appended, anything else (a removal) makes
+    the index reload from scratch.
+    """
+
+    def __init__(self) -> None:
+        self._connection: Any = None
+        self._version: Optional[tuple] = None
+        self._ids = array('q')
+        # First names and surnames, and 'name surname' pairs in lower case
+        self._words = PrefixTrie()
+        self._full_names: List[str] = []
+        self._pairs: set = set()
+
+    def refresh(self, con: Any) -> None:
+        version = (con.execute('PRAGMA data_version').fetchone()[0],
+                   con.total_changes)
+        if con is self._connection and version == self._version:
+            return
+
+        rows = None
+        if con is self._connection:
+            count = con.execute('SELECT COUNT(*) FROM employees').fetchone()[0]
+            last_id = self._ids[-1] if self._ids else 0
+            rows = con.execute(""" SELECT id, name, surname FROM employees
+                                   WHERE id > ? ORDER BY id """, (last_id,)).fetchall()
+
+        if rows is not None and len(self._ids) + len(rows) == count:
+            self._ids.extend(employee_id for employee_id, _, _ in rows)
+            for _, name, surname in rows:
+                pair = f'{name} {surname}'.lower()
+                if pair not in self._pairs:
+                    self._pairs.add(pair)
+                    insort(self._full_names, pair)
+                    self._words.add(name)
+                    self._words.add(surname)
+        else:
+            self.__load(con)
+
+        self._connection = con
+        self._version = version
+
+    def __load(self, con: Any) -> None:
+        self._ids = array('q', [employee_id for employee_id, in con.execute(
+            'SELECT id FROM employees ORDER BY id')])
+        # Distinct pairs are read from the identity index
+        pairs = con.execute(""" SELECT name, surname FROM employees
+                                GROUP BY name, surname """).fetchall()
+        self._words = PrefixTrie({word for pair in pairs for word in pair})
+        self._pairs = {f'{name} {surname}'.lower() for name, surname in pairs}
+        self._full_names = sorted(self._pairs)
+
+    def ids(self, prefix: str, limit: int = COMPLETION_LIMIT) -> List[str]:
+        """
+        Get the IDs starting with the digits of the prefix: the IDs equal to
+        it, then the ones one digit longer and so on.
+        """
+
+        # IDs start with 1 and are never written with leading zeros
+        if not prefix.isdigit() or prefix[0] == '0' or not self._ids:
+            return []
+
+        matches = []
+        low, high = int(prefix), int(prefix) + 1
+        while low <= self._ids[-1] and len(matches) < limit:
+            start = bisect_left(self._ids, low)
+            end = bisect_left(self._ids, high, start)
+            matches.extend(map(str, self._ids[start:min(end, start + limit - len(matches))]))
+            low, high = low * 10, high * 10
+        return matches
+
+    def names(self, prefix: str, limit: int = COMPLETION_LIMIT) -> List[str]:
+        return self._words.with_prefix(prefix, limit)
+
+    def surnames(self, name: str, prefix: str,
+                 limit: int = COMPLETION_LIMIT) -> List[str]:
+        """
+        Get the surnames of the employees with the name starting with the
+        prefix.
+        """
+
+        key = f'{name} {prefix}'.lower()
+        start = bisect_left(self._full_names, key)
+        matches = []
+        for pair in self._full_names[start:start + limit]:
+            if not pair.startswith(key):
+                break
+            matches.append(pair[len(name) + 1:].capitalize())
+        return matches
+
+
+class CmdCompleter:
+    """
+    Readline completer of command names, their options and, for commands
+    taking an employee, employee IDs and names.
+    """
+
+    def __init__(self, commands: List[str], connect: Any = None) -> None:
+        self.commands = PrefixTrie(commands)
+        self.options = {command: PrefixTrie(options)
+                        for command, options in COMMAND_OPTIONS.items()}
+        self.options['man'] = self.commands
+        self.employees = EmployeeIndex()
+        # Returns the database connection, called only when IDs are needed
+        self.connect = connect
+        self.matches: List[str] = []
+
+    def complete(self, text: str, state: int) -> str | None:
+        if state == 0:
+            import readline
+
+            line = readline.get_line_buffer()[:readline.get_begidx()]
+            # A finished word is followed by a space, an option waiting
+            # for its value is not
+            self.matches = [match if match.endswith('=') else match + ' '
+                            for match in self.get_matches(line.split(), text)]
+
+        if state < len(self.matches):
+            return self.matches[state]
+        return None
+
+    def get_matches(self, words: List[str], text: str) -> List[str]:
+        """
+        Get the completions of text typed after the words.
+        """
+
+        if not words:
+            return self.commands.with_prefix(text)
+
+        command, args = words[0].lower(), words[1:]
+        if text.startswith('-') or command not in EMPLOYEE_ARGUMENTS:
+            options = self.options.get(command)
+            return options.with_prefix(text) if options is not None else []
+
+        # An employee is given by an ID or by a name and a surname
+        given = sum(1 if arg.isdigit() else 0.5 for arg in args)
+        if given >= EMPLOYEE_ARGUMENTS[command] or self.connect is None:
+            return []
+
+        self.employees.refresh(self.connect())
+        if text.isdigit():
+            return self.employees.ids(text)
+        if args and not args[-1].isdigit() and not args[-1].startswith('-'):
+            return self.employees.surnames(args[-1], text)
+        return self.employees.names(text)
@@ -3,6 +3,24 @@ BASE_SALARY = 555
 SORT_PARAMS = ('id', 'name', 'surname', 'age')
 ROLES_FLAGS = ('f', 'b', 't', 'r', 'a')
 VALID_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'SUCCESS']
+IMPORT_BATCH_SIZE = 1000
+IMPORT_FORMATS = ('csv', 'jsonl', 'ndjson')
+IMPORT_FIELDS = ('name', 'surname', 'age', 'phone_number',
+                 'bank_card_number', 'major')
+SEARCH_LIMIT = 20
+EMPLOYEE_CACHE_SIZE = 1024
+EXPORT_CHUNK_SIZE = 5000
+COMPLETION_LIMIT = 100
+FIND_CANDIDATES = 200
+FIND_MIN_SIMILARITY = 0.2
+FIND_MIN_EDIT_SIMILARITY = 0.5
+FIND_EDIT_CANDIDATES = 20
+AMBIGUOUS_SHOWN = 5
+JOURNAL_SHOWN = 20
+SNAPSHOT_DIR = 'snapshots'
+SNAPSHOT_INTERVAL = 10000
+SNAPSHOT_CHECK_SECONDS = 30
+SNAPSHOTS_KEPT = 3
 
 
 class SalaryCoefficients:
@@ -0,0 +1,283 @@
+import io
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import subprocess
+import socketserver
+from contextlib import redirect_stdout, redirect_stderr
+from typing import Any, Dict, List, Optional
+
+# This module is also the thin client used by run.py before anything else
+# is imported, so it only depends on the standard library at import time.
+
+DEFAULT_SOCKET = os.environ.get('ORGSIM_SOCKET', '.orgsim.sock')
+START_TIMEOUT = 10.0
+# Seconds a client has to send its request, and a line of stdin a command
+# asked it for (typed by a person, so much longer)
+REQUEST_TIMEOUT = 5.0
+INPUT_TIMEOUT = 300.0
+# Characters of output collected before they are sent to the client
+OUTPUT_CHUNK = 65536
+
+
+def _connect(socket_path: str) -> Optional[socket.socket]:
+    """
+    Connect to the daemon. Returns None if no daemon is listening on the
+    socket.
+    """
+
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        client.close()
+        return None
+    return client
+
+
+def _send(connection: socket.socket, message: Dict[str, Any]) -> None:
+    connection.sendall(json.dumps(message).encode() + b'\n')
+
+
+def _request(socket_path: str, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Send one request to the daemon and wait for the reply. Returns None
+    if no daemon is listening on the socket.
+    """
+
+    client = _connect(socket_path)
+    if client is None:
+        return None
+
+    with client, client.makefile('rb') as reply:
+        _send(client, request)
+        return json.loads(reply.readline())
+
+
+def forward_to_daemon(argv: List[str],
+                      socket_path: str = DEFAULT_SOCKET) -> Optional[int]:
+    """
+    Run a one-shot command in the daemon and print its output. Returns the
+    exit status, or None if no daemon is running.
+
+    The command runs for the working directory of this process. Its output
+    comes in chunks as it is written, and every line it reads from stdin
+    is read from ours: the daemon sends the output so far and asks for the
+    line.
+    """
+
+    client = _connect(socket_path)
+    if client is None:
+        return None
+
+    with client, client.makefile('rb') as replies:
+        _send(client, {'command': ' '.join(argv), 'cwd': os.getcwd()})
+        while True:
+            reply = json.loads(replies.readline())
+            sys.stdout.write(reply['stdout'])
+            sys.stderr.write(reply['stderr'])
+            if 'status' in reply:
+                return reply['status']
+
+            if reply.get('input'):
+                sys.stdout.flush()
+                _send(client, {'line': sys.stdin.readline()})
+
+
+def is_running(socket_path: str = DEFAULT_SOCKET) -> bool:
+    return _request(socket_path, {'control': 'ping'}) is not None
+
+
+class _ClientOutput(io.TextIOBase):
+    """
+    Stdout or stderr of a forwarded command, sent to the client in chunks
+    of OUTPUT_CHUNK characters, so a long listing is streamed instead of
+    collected whole in the daemon.
+    """
+
+    def __init__(self, handler: '_CommandHandler') -> None:
+        self.handler = handler
+        self._buffer = io.StringIO()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self._buffer.write(text)
+        if self._buffer.tell() >= OUTPUT_CHUNK:
+            self.handler.send_output()
+        return len(text)
+
+    def take(self) -> str:
+        """
+        Get what has been written since the last call and empty the buffer.
+        """
+
+        value = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return value
+
+
+class _ClientInput(io.TextIOBase):
+    """
+    Stdin of a forwarded command, whose lines are read by the client.
+    """
+
+    def __init__(self, handler: '_CommandHandler') -> None:
+        self.handler = handler
+
+    def readable(self) -> bool:
+        return True
+
+    def readline(self, size: int = -1) -> str:
+        return self.handler.read_line()
+
+
+class _CommandHandler(socketserver.StreamRequestHandler):
+    """
+    Executes one command per connection with its output sent back.
+    """
+
+    # Clients are served one at a time, so one that never sends its
+    # request must not block the others forever
+    timeout = REQUEST_TIMEOUT
+
+    def handle(self) -> None:
+        from .cmd_parser import CommandParser
+        from .main import run_command
+
+        try:
+            request = json.loads(self.rfile.readline())
+        except TimeoutError:
+            return
+        # Writing a long output to a slow client may take any time
+        self.connection.settimeout(None)
+        control = request.get('control')
+
+        if control == 'stop':
+            # shutdown() waits for serve_forever, so it needs another thread
+            threading.Thread(target=self.server.shutdown).start()
+        if control is not None:
+            _send(self.connection, {'status': 0, 'pid': os.getpid()})
+            return
+
+        self.stdout, self.stderr = _ClientOutput(self), _ClientOutput(self)
+        # Commands are run one at a time, so the process-wide stdin and
+        # working directory of the commands can be swapped for the client's
+        stdin, sys.stdin = sys.stdin, _ClientInput(self)
+        CommandParser.working_directory = request.get('cwd')
+        try:
+            with redirect_stdout(self.stdout), redirect_stderr(self.stderr):
+                succeeded = run_command(request['command'])
+        finally:
+            sys.stdin = stdin
+            CommandParser.working_directory = None
+
+        try:
+            self.send_output(status=0 if succeeded else 1)
+        except OSError:
+            # The client has gone away, and the command has failed writing
+            # to it already
+            pass
+
+    def send_output(self, **message: Any) -> None:
+        """
+        Send the output written so far to the client, along with the rest
+        of the message.
+        """
+
+        _send(self.connection, {'stdout': self.stdout.take(),
+                                'stderr': self.stderr.take(), **message})
+
+    def read_line(self) -> str:
+        """
+        Send the output so far to the client and get the next line of its
+        stdin, or '' at its end.
+        """
+
+        self.send_output(input=True)
+        # A timeout fails the command like any other error reading stdin
+        self.connection.settimeout(INPUT_TIMEOUT)
+        try:
+            message = self.rfile.readline()
+        finally:
+            self.connection.settimeout(None)
+        return json.loads(message)['line'] if message else ''
+
+
+def serve(socket_path: str = DEFAULT_SOCKET) -> None:
+    """
+    Run the daemon in the foreground until it is stopped.
+    """
+
+    from .cmd_parser import CommandParser
+    from .database import db
+    from .journal import BackgroundSnapshots
+    from .log import shutdown_logging
+    from .metrics import metrics
+
+    if not hasattr(socket, 'AF_UNIX'):
+        raise OSError('Unix domain sockets are not supported on this system')
+
+    if os.path.exists(socket_path):
+        if is_running(socket_path):
+            raise OSError(f'A daemon is already running on {socket_path}')
+        os.remove(socket_path)
+
+    # Warm everything up once: command modules, logging and the database
+    for command_name in CommandParser.LAZY_COMMANDS:
+        CommandParser.get_command(command_name)
+    db.connection
+
+    snapshots = BackgroundSnapshots().start()
+    with socketserver.UnixStreamServer(socket_path, _CommandHandler) as server:
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(socket_path)
+            snapshots.stop()
+            db.close()
+            metrics.export()
+            shutdown_logging()
+
+
+def start(socket_path: str = DEFAULT_SOCKET) -> int:
+    """
+    Start the daemon as a detached background process and wait until it
+    accepts connections. Returns its pid.
+    """
+
+    if is_running(socket_path):
+        raise OSError(f'A daemon is already running on {socket_path}')
+
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'organization_simulator_cli.main',
+         '--daemon', 'run', '--socket', socket_path],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True)
+
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise OSError('The daemon exited during startup')
+        if is_running(socket_path):
+            return process.pid
+        time.sleep(0.05)
+    raise TimeoutError('The daemon did not start in time')
+
+
+def stop(socket_path: str = DEFAULT_SOCKET) -> bool:
+    """
+    Ask the daemon to exit. Returns False if it was not running.
+    """
+
+    return _request(socket_path, {'control': 'stop'}) is not None
@@ -0,0 +1,189 @@
+import os
+import sqlite3 as sql
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: writers only wait for each other through BUSY_TIMEOUT
+    fcntl = None
+
+from .migrations import migrate
+
+DB_PATH = 'company.db'
+
+# Size of the per-connection prepared statement cache
+CACHED_STATEMENTS = 256
+
+# Seconds SQLite waits for a lock held by another process. Writers of
+# this program queue on the writer lock file first, so this only matters
+# for other programs writing to the database.
+BUSY_TIMEOUT = 2.0
+
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA mmap_size = 134217728',
+    'PRAGMA foreign_keys = ON',
+)
+
+
+class Database:
+    """
+    Process-wide manager of long-lived SQLite connections.
+
+    Every thread lazily gets its own connection, which is opened once,
+    tuned with PRAGMAS and then reused by all the functions in db_funcs.
+    The first connection also brings the schema up to date.
+
+    Write transactions of all the processes using the database queue on
+    an exclusive lock of <path>-lock. SQLite's own busy handler polls with
+    sleeps of up to 100ms, so a waiting writer would keep sleeping long
+    after a short transaction has committed. The kernel hands the lock
+    over as soon as it is released.
+    """
+
+    def __init__(self, path: str = DB_PATH) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sql.Connection] = []
+        self._lock_files: List[int] = []
+        self._migrated = False
+
+    @property
+    def connection(self) -> sql.Connection:
+        """
+        Get the connection bound to the current thread.
+        """
+
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = self._connect()
+            self._local.con = con
+            self._local.depth = 0
+            self._local.writer_lock = None
+        return con
+
+    def _connect(self) -> sql.Connection:
+        """
+        Open and tune a new connection to the database file.
+        """
+
+        # Transactions are managed explicitly by Database.transaction
+        con = sql.connect(self.path,
+                          timeout=BUSY_TIMEOUT,
+                          isolation_level=None,
+                          cached_statements=CACHED_STATEMENTS,
+                          check_same_thread=False)
+        for pragma in PRAGMAS:
+            con.execute(pragma)
+
+        if not self._migrated:
+            migrate(con)
+            self._migrated = True
+
+        with self._lock:
+            self._connections.append(con)
+        return con
+
+    @contextmanager
+    def transaction(self) -> Iterator[sql.Connection]:
+        """
+        Run the enclosed block in a transaction.
+
+        Nested blocks become savepoints of the outermost transaction, so
+        a caller can group several db_funcs calls into a single commit.
+        The outermost block takes the write lock up front (BEGIN
+        IMMEDIATE): a deferred transaction that reads first could not be
+        upgraded to a writer once another process has committed.
+        """
+
+        con = self.connection
+        depth = self._local.depth
+        savepoint = f'sp_{depth}'
+
+        if depth == 0:
+            self._lock_writers()
+            try:
+                con.execute('BEGIN IMMEDIATE')
+            except BaseException:
+                self._unlock_writers()
+                raise
+        else:
+            con.execute(f'SAVEPOINT {savepoint}')
+        self._local.depth = depth + 1
+        try:
+            yield con
+        except BaseException:
+            self._local.depth = depth
+            if depth == 0:
+                try:
+                    con.execute('ROLLBACK')
+                finally:
+                    self._unlock_writers()
+            else:
+                con.execute(f'ROLLBACK TO {savepoint}')
+                con.execute(f'RELEASE {savepoint}')
+            raise
+        else:
+            self._local.depth = depth
+            if depth == 0:
+                try:
+                    con.execute('COMMIT')
+                finally:
+                    self._unlock_writers()
+            else:
+                con.execute(f'RELEASE {savepoint}')
+
+    def _lock_writers(self) -> None:
+        """
+        Wait for the writer lock. Every thread opens the lock file itself,
+        as threads sharing one open file would all hold the lock at once.
+        """
+
+        if fcntl is None:
+            return
+
+        lock_file: Optional[int] = self._local.writer_lock
+        if lock_file is None:
+            lock_file = os.open(f'{self.path}-lock', os.O_RDWR | os.O_CREAT, 0o644)
+            self._local.writer_lock = lock_file
+            with self._lock:
+                self._lock_files.append(lock_file)
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+    def _unlock_writers(self) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._local.writer_lock, fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        """
+        Close every connection opened by this manager.
+        """
+
+        with self._lock:
+            for con in self._connections:
+                con.close()
+            self._connections.clear()
+            for lock_file in self._lock_files:
+                os.close(lock_file)
+            self._lock_files.clear()
+        self._local = threading.local()
+
+
+db = Database()
+
+
+def set_database_path(path: str) -> None:
+    """
+    Point the shared connection manager at another database file.
+    """
+
+    db.close()
+    db.path = path
+    db._migrated = False
@@ -1,121 +1,641 @@
 import sqlite3 as sql
-import prettytable
-from typing import List, Tuple, Any, Optional
-
-from loguru import logger
-from .roles import Employee, Role
-from .emp_comments import create_comment, delete_comment
-from .constants import SORT_PARAMS
-
-
-def insert_into_db(employee: Employee) -> None:
-    if check_employee_exists(employee):
-        msg = 'This employee already exists in the database!'
-        print(msg)
-        logger.warning(msg)
-        return
-
-    with sql.connect('company.db') as con:
-        cur = con.cursor()
-        cur.execute(
-            """ INSERT INTO employees VALUES (?, ?, ?, ?, ?, ?) """,
-            (employee.name,
-             employee.surname,
-             employee.age,
-             employee.phone_number,
-             employee.bank_card_number,
-             employee.major.value.upper()))
-
-    create_comment(
-        get_employee_id_from_obj(employee),
-        employee.name,
-        employee.surname)
-
-
-def get_employee_id_from_obj(employee: Employee) -> int:
-    with sql.connect('company.db') as con:
-        cur = con.cursor()
-        cur.execute(""" SELECT rowid FROM employees
-                        WHERE name = ?
-                        AND surname = ?
-                        AND age = ? """,
-                    (employee.name, employee.surname, employee.age))
-        employee_id = cur.fetchone()[0]
-        return employee_id
-
-
-def fetch_all_employees() -> List[Tuple[Any, ...]]:
-    with sql.connect('company.db') as con:
-        cur = con.cursor()
-        cur.execute('SELECT rowid, * FROM employees ')
-        return cur.fetchall()
-
-
-def print_employees_table(
-        employees: List[Tuple[Any, ...]], sort: Optional[str] = None) -> None:
-
-    if sort is None or sort not in SORT_PARAMS:
-        sort = 'id'
-
-    table = prettytable.PrettyTable()
-    table.field_names = [
-        'ID',
-        'Name',
-        'Surname',
-        'Age',
-        'Phone Number',
-        'Bank Card Number',
-        'Major'
-    ]
-
-    employees.sort(key=lambda x: x[SORT_PARAMS.index(sort)])
-
-    for employee in employees:
-        table.add_row([*employee])
-
-    print('\n' + table.get_string() + '\n')
-
-
-def check_employee_exists(employee: Employee) -> bool:
-    with sql.connect('company.db') as con:
-        cur = con.cursor()
-        cur.execute("""
-                SELECT COUNT(*) FROM employees
+from itertools import islice
+from typing import List, Dict, Tuple, Any, Optional, Iterable, Iterator, Callable, Sequence
+
+from .log import logger
+from .roles import Employee, EmployeeRecord, Role, Accountant, ROLES_BY_CODE
+from .emp_comments import create_comment, create_comments_after, delete_comment
+from .exceptions import raise_incorrect_employee_id_error, raise_reporting_cycle_error
+from .queries import EmployeeQuery, EMPLOYEE_COLUMNS
+from .database import db
+from .cache import employee_cache
+from .journal import (record, record_inserted_after, record_paid_after,
+                      employee_state)
+from .metrics import timed
+
+
+@timed('db.insert_into_db')
+def insert_into_db(employee: Employee) -> bool:
+    """
+    Insert an employee with an empty comment. Returns False if the same
+    employee already exists.
+    """
+
+    # The unique identity index decides, so two processes adding the same
+    # employee at once cannot both succeed
+    with db.transaction() as con:
+        cur = con.execute(
+            """ INSERT INTO employees (name, surname, age, phone_number,
+                                         bank_card_number, major)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (name, surname, age, phone_number) DO NOTHING """,
+            employee_to_row(employee))
+        if cur.rowcount == 0:
+            msg = 'This employee already exists in the database!'
+            print(msg)
+            logger.warning(msg)
+            return False
+        create_comment(cur.lastrowid)
+        record(con, 'insert', cur.lastrowid,
+               [*employee_to_row(employee), '', None, []])
+
+    employee_cache.invalidate(cur.lastrowid)
+    return True
+
+
+def employee_to_row(employee: Employee) -> Tuple[Any, ...]:
+    return (employee.name,
+            employee.surname,
+            employee.age,
+            employee.phone_number,
+            employee.bank_card_number,
+            employee.major.code)
+
+
+@timed('db.insert_employees_in_batches')
+def insert_employees_in_batches(
+        employees: Iterable[Employee],
+        batch_size: int,
+        on_batch: Optional[Callable[[int], None]] = None) -> int:
+    """
+    Insert employees in batches of executemany calls inside a single
+    transaction, skipping the ones that already exist in the database.
+    Returns the number of inserted employees.
+    """
+
+    inserted = 0
+    with db.transaction() as con:
+        con.execute(""" CREATE TEMP TABLE IF NOT EXISTS import_batch (
+                            name TEXT,
+                            surname TEXT,
+                            age INTEGER,
+                            phone_number TEXT,
+                            bank_card_number TEXT,
+                            major INTEGER) """)
+        con.execute(""" DELETE FROM import_batch """)
+        first_id = con.execute(
+            """ SELECT COALESCE(MAX(id), 0) FROM employees """).fetchone()[0]
+
+        for batch in _chunked(employees, batch_size):
+            con.executemany(
+                """ INSERT INTO import_batch VALUES (?, ?, ?, ?, ?, ?) """,
+                map(employee_to_row, batch))
+            # Deduplicate against existing rows and within the batch itself
+            cur = con.execute("""
+                    INSERT INTO employees (name, surname, age, phone_number,
+                                           bank_card_number, major)
+                    SELECT b.name, b.surname, b.age, b.phone_number,
+                           b.bank_card_number, b.major
+                    FROM import_batch AS b
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM employees AS e
+                        WHERE e.name = b.name AND e.surname = b.surname
+                        AND e.age = b.age AND e.phone_number = b.phone_number)
+                    GROUP BY b.name, b.surname, b.age, b.phone_number """)
+            con.execute(""" DELETE FROM import_batch """)
+            inserted += cur.rowcount
+            if on_batch is not None:
+                on_batch(cur.rowcount)
+
+        create_comments_after(first_id)
+        record_inserted_after(con, first_id)
+
+    employee_cache.clear()
+    return inserted
+
+
+def _chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def employee_record(cursor: sql.Cursor, row: Tuple[Any, ...]) -> EmployeeRecord:
+    """
+    Row factory turning a row of SELECT * FROM employees into a record.
+    """
+
+    # Called for every fetched row, so the NamedTuple constructor and
+    # Role.from_code are bypassed
+    _id, name, surname, age, phone_number, bank_card_number, code = row
+    return _new_tuple(EmployeeRecord,
+                      (_id, name, surname, age, phone_number,
+                       bank_card_number, _role_by_code(code)))
+
+
+_new_tuple = tuple.__new__
+_role_by_code = ROLES_BY_CODE.get
+
+
+def _select_employees(sql_query: str, params: Iterable[Any] = ()) -> sql.Cursor:
+    """
+    Execute a SELECT * FROM employees query returning EmployeeRecords.
+    """
+
+    cur = db.connection.cursor()
+    cur.row_factory = employee_record
+    return cur.execute(sql_query, params)
+
+
+@timed('db.fetch_all_employees')
+def fetch_all_employees() -> List[EmployeeRecord]:
+    cur = _select_employees('SELECT * FROM employees ')
+    return cur.fetchall()
+
+
+@timed('db.fetch_employees')
+def fetch_employees(query: EmployeeQuery) -> List[EmployeeRecord]:
+    """
+    Fetch only the page of employees described by the query.
+    """
+
+    cur = _select_employees(*query.build())
+    return cur.fetchall()
+
+
+@timed('db.iter_employees')
+def iter_employees(query: EmployeeQuery) -> Iterator[EmployeeRecord]:
+    """
+    Stream the employees described by the query straight from the cursor.
+    """
+
+    return _select_employees(*query.build())
+
+
+@timed('db.fetch_employee_column_widths')
+def fetch_employee_column_widths(query: EmployeeQuery) -> Tuple[int, ...]:
+    """
+    Get the maximum text length of every column in the query result.
+    """
+
+    sql_query, params = query.build()
+    lengths = ', '.join(
+        f'MAX(LENGTH({role_name_sql() if column == "major" else column}))'
+        for column in EMPLOYEE_COLUMNS)
+    cur = db.connection.execute(
+        f'SELECT {lengths} FROM ({sql_query})', params)
+    return cur.fetchone()
+
+
+@timed('db.fetch_employee_by_id')
+def fetch_employee_by_id(__id: int) -> Optional[EmployeeRecord]:
+    con = db.connection
+    employee = employee_cache.get(con, __id)
+    if employee is None:
+        # The version the cache is validated with comes in the same query
+        row = con.execute(""" SELECT employees.*, data_version
+                              FROM employees, pragma_data_version
+                              WHERE id = ? """, (__id,)).fetchone()
+        if row is not None:
+            employee = employee_record(None, row[:-1])
+            employee_cache.put(con, employee, row[-1])
+    return employee
+
+
+@timed('db.fetch_employees_named')
+def fetch_employees_named(words: Sequence[str], limit: int) -> List[EmployeeRecord]:
+    """
+    Fetch up to limit employees whose name or surname is the single word,
+    or whose name and surname are the two words, ignoring case.
+    """
+
+    # Names are stored capitalized (see Employee)
+    words = [word.capitalize() for word in words]
+    if len(words) == 2:
+        return fetch_employees_with_names([tuple(words)], limit)
+
+    if len(words[0]) >= 3:
+        # Surnames are not indexed, the trigram index narrows them down
+        cur = db.connection.execute(
+            """ SELECT name, surname FROM employee_names
+                WHERE id IN (SELECT rowid FROM employee_names_fts
+                             WHERE employee_names_fts MATCH ?)
+                AND (name = ? OR surname = ?)
+                ORDER BY name, surname """,
+            ('"{}"'.format(words[0].replace('"', '""')), *words * 2))
+    else:
+        cur = db.connection.execute(
+            """ SELECT name, surname FROM employee_names
+                WHERE name = ? OR surname = ?
+                ORDER BY name, surname """, (*words * 2,))
+    return fetch_employees_with_names(cur.fetchall(), limit)
+
+
+@timed('db.fetch_employees_with_names')
+def fetch_employees_with_names(names: Iterable[Tuple[str, str]],
+                               limit: int) -> List[EmployeeRecord]:
+    """
+    Fetch up to limit employees with the (name, surname) pairs, in the
+    order of the pairs.
+    """
+
+    employees = []
+    for name, surname in names:
+        if len(employees) >= limit:
+            break
+        employees += _select_employees(
+            """ SELECT * FROM employees
                 WHERE name = ? AND surname = ?
-                AND age = ? AND phone_number = ? """,
-                    (employee.name,
-                     employee.surname,
-                     employee.age,
-                     employee.phone_number))
-        count = cur.fetchone()[0]
-
-    return count > 0
-
-
-def fetch_employee_by_id(__id: int) -> Tuple[Any, ...]:
-    with sql.connect('company.db') as con:
-        cur = con.cursor()
-        cur.execute(
-            """ SELECT rowid, * FROM employees WHERE rowid = ? """, (__id,))
-        return cur.fetchone()
-
-
-def remove_employee_by_id(__id: int) -> None:
-    with sql.connect('company.db') as con:
-        cur = con.cursor()
-        cur.execute(
-            """ SELECT name, surname FROM employees WHERE rowid = ? """, (__id,))
-        name, surname = cur.fetchone()
-        cur.execute(""" DELETE FROM employees WHERE rowid = ? """, (__id,))
-
-    delete_comment(__id, name, surname)
-
-
-def fetch_employees_by_role(__employee_role: Role) -> List[Tuple[Any, ...]]:
-    with sql.connect('company.db') as con:
-        cur = con.cursor()
-        cur.execute("""
-                SELECT rowid, * FROM employees
-                WHERE major = ? """,
-                    (__employee_role.value.upper(),))
-        return cur.fetchall()
+                LIMIT ? """, (name, surname, limit - len(employees)))
+    return employees
+
+
+@timed('db.fetch_similar_names')
+def fetch_similar_names(match: str, limit: int) -> List[Tuple[str, str]]:
+    """
+    Fetch up to limit distinct (name, surname) pairs matching an FTS5
+    query over the trigram index of names, best matches first.
+    """
+
+    cur = db.connection.execute(
+        """ SELECT n.name, n.surname FROM employee_names_fts
+            JOIN employee_names AS n ON n.id = employee_names_fts.rowid
+            WHERE employee_names_fts MATCH ?
+            ORDER BY rank LIMIT ? """, (match, limit))
+    return cur.fetchall()
+
+
+@timed('db.fetch_names_by_initials')
+def fetch_names_by_initials(initial: str, lengths: Iterable[int],
+                            limit: int) -> List[Tuple[str, str]]:
+    """
+    Fetch up to limit distinct (name, surname) pairs whose name or surname
+    starts with the letter (in any case) and has one of the lengths, in
+    the order of the lengths. Every length is a lookup of the initial and
+    length indexes, so nothing is scanned.
+    """
+
+    if not initial.isalpha():
+        return []
+
+    names: Dict[Tuple[str, str], None] = {}
+    for length in lengths:
+        for column in ('name', 'surname'):
+            if len(names) >= limit:
+                return list(names)
+            cur = db.connection.execute(
+                f""" SELECT name, surname FROM employee_names
+                     WHERE lower(substr({column}, 1, 1)) = ?
+                     AND length({column}) = ? LIMIT ? """,
+                (initial.lower(), length, limit - len(names)))
+            names.update(dict.fromkeys(cur.fetchall()))
+    return list(names)
+
+
+@timed('db.remove_employee_by_id')
+def remove_employee_by_id(__id: int) -> bool:
+    """
+    Remove an employee together with the comment. Returns False if there
+    is no such employee (for example, another process removed it first).
+    """
+
+    with db.transaction() as con:
+        # Everything needed to bring the employee back is journaled
+        state = employee_state(con, __id)
+        if state is None:
+            return False
+        delete_comment(__id)
+        con.execute(""" DELETE FROM employees WHERE id = ? """, (__id,))
+        record(con, 'delete', __id, state)
+
+    employee_cache.invalidate(__id)
+    return True
+
+
+@timed('db.fetch_employees_by_role')
+def fetch_employees_by_role(__employee_role: Role) -> List[EmployeeRecord]:
+    cur = _select_employees("""
+            SELECT * FROM employees
+            WHERE major = ? """,
+                            (__employee_role.code,))
+    return cur.fetchall()
+
+
+def _role_case_sql(value_of: Callable[[Role], str], default: str) -> str:
+    branches = ' '.join(f'WHEN {role.code} THEN {value_of(role)}'
+                        for role in Role)
+    return f'CASE major {branches} ELSE {default} END'
+
+
+def salary_case_sql() -> str:
+    """
+    Build a CASE expression mapping the major column to the monthly salary.
+    """
+
+    return _role_case_sql(
+        lambda role: str(Accountant.salary_for_role(role)), '0')
+
+
+def role_name_sql() -> str:
+    """
+    Build a CASE expression decoding the major column to the role name.
+    """
+
+    return _role_case_sql(lambda role: f"'{role.name}'", 'NULL')
+
+
+def _roles_condition(roles: List[Role]) -> Tuple[str, List[int]]:
+    # Employees without a known role are neither counted nor paid
+    if not roles:
+        return 'WHERE major IS NOT NULL', []
+    placeholders = ', '.join('?' * len(roles))
+    return (f'WHERE major IN ({placeholders})',
+            [role.code for role in roles])
+
+
+@timed('db.fetch_headcount_by_role')
+def fetch_headcount_by_role(roles: List[Role]) -> List[Tuple[Role, int]]:
+    """
+    Count employees per role in a single pass over the major index.
+    """
+
+    condition, params = _roles_condition(roles)
+    cur = db.connection.execute(
+        f""" SELECT major, COUNT(*) FROM employees {condition}
+             GROUP BY major """, params)
+    return [(Role.from_code(code), count) for code, count in cur]
+
+
+@timed('db.iter_payroll')
+def iter_payroll(roles: List[Role]) -> Iterator[Tuple[Any, ...]]:
+    """
+    Stream (id, name, surname, major, salary) rows with the salary
+    computed by SQLite.
+    """
+
+    condition, params = _roles_condition(roles)
+    return db.connection.execute(
+        f""" SELECT id, name, surname, {role_name_sql()}, {salary_case_sql()}
+             FROM employees {condition}
+             ORDER BY id """, params)
+
+
+def export_columns(with_comments: bool, with_salary: bool) -> Tuple[str, ...]:
+    return (EMPLOYEE_COLUMNS
+            + (('comment',) if with_comments else ())
+            + (('salary',) if with_salary else ()))
+
+
+@timed('db.iter_export_chunks')
+def iter_export_chunks(query: EmployeeQuery, with_comments: bool,
+                       with_salary: bool,
+                       chunk_size: int) -> Iterator[List[Tuple[Any, ...]]]:
+    """
+    Stream the employees of the query, optionally with their comments and
+    salaries, as lists of at most chunk_size plain rows fetched with
+    fetchmany, so only one chunk is held in memory at a time.
+    """
+
+    # The role is decoded to its name and the salary is computed by SQLite
+    # from Accountant.salary_for_role, like in the payroll
+    columns = [role_name_sql() if column == 'major' else column
+               for column in EMPLOYEE_COLUMNS]
+    joins = ''
+    if with_comments:
+        columns.append("COALESCE(comments.body, '')")
+        joins = 'LEFT JOIN comments ON comments.employee_id = employees.id'
+    if with_salary:
+        columns.append(salary_case_sql())
+
+    cur = db.connection.execute(*query.build(', '.join(columns), joins))
+    while chunk := cur.fetchmany(chunk_size):
+        yield chunk
+
+
+@timed('db.assign_manager')
+def assign_manager(employee_id: int, manager_id: Optional[int]) -> None:
+    """
+    Make an employee report to a manager, or to nobody if manager_id is
+    None. The reports of the employee move along with them.
+    """
+
+    with db.transaction() as con:
+        row = con.execute(""" SELECT manager_id FROM reporting_lines
+                              WHERE employee_id = ? """, (employee_id,)).fetchone()
+        old_manager_id = None if row is None else row[0]
+
+        if manager_id is None:
+            con.execute(""" DELETE FROM reporting_lines WHERE employee_id = ? """,
+                        (employee_id,))
+        else:
+            # Checked inside the write transaction, so a concurrent assign
+            # cannot close a cycle in between
+            cycle = con.execute(""" SELECT 1 FROM employee_closure
+                                    WHERE ancestor_id = ? AND descendant_id = ? """,
+                                (employee_id, manager_id)).fetchone()
+            if cycle is not None or employee_id == manager_id:
+                raise_reporting_cycle_error()
+
+            try:
+                con.execute(""" INSERT INTO reporting_lines (employee_id, manager_id)
+                                VALUES (?, ?)
+                                ON CONFLICT (employee_id)
+                                DO UPDATE SET manager_id = excluded.manager_id """,
+                            (employee_id, manager_id))
+            except sql.IntegrityError:
+                # One of the employees does not exist (or has just been removed)
+                raise_incorrect_employee_id_error()
+
+        if old_manager_id != manager_id:
+            record(con, 'manager', employee_id, [old_manager_id, manager_id])
+
+
+@timed('db.fetch_manager_id')
+def fetch_manager_id(employee_id: int) -> Optional[int]:
+    cur = db.connection.execute(
+        """ SELECT manager_id FROM reporting_lines WHERE employee_id = ? """,
+        (employee_id,))
+    row = cur.fetchone()
+    return row[0] if row is not None else None
+
+
+@timed('db.fetch_team_summary')
+def fetch_team_summary(manager_id: int) -> Tuple[int, int, int, int]:
+    """
+    Get the (direct reports, headcount, monthly payroll, depth) of everyone
+    under the manager, counted in one pass over the closure table.
+    """
+
+    cur = db.connection.execute(
+        f""" SELECT COUNT(*) FILTER (WHERE c.depth = 1),
+                    COUNT(*),
+                    COALESCE(SUM({salary_case_sql()}), 0),
+                    COALESCE(MAX(c.depth), 0)
+             FROM employee_closure AS c
+             JOIN employees ON employees.id = c.descendant_id
+             WHERE c.ancestor_id = ? """, (manager_id,))
+    return cur.fetchone()
+
+
+@timed('db.fetch_reports')
+def fetch_reports(manager_id: int, max_depth: Optional[int] = 1) -> List[EmployeeRecord]:
+    """
+    Fetch the employees under the manager down to max_depth levels (all of
+    them if None), level by level.
+    """
+
+    params = [manager_id]
+    condition = ''
+    if max_depth is not None:
+        # Keeps the lookup a range scan of the (ancestor_id, depth) key
+        condition = 'AND c.depth <= ?'
+        params.append(max_depth)
+
+    cur = _select_employees(
+        f""" SELECT employees.* FROM employee_closure AS c
+             JOIN employees ON employees.id = c.descendant_id
+             WHERE c.ancestor_id = ? {condition}
+             ORDER BY c.depth, employees.surname, employees.name """,
+        params)
+    return cur.fetchall()
+
+
+@timed('db.fetch_management_chain')
+def fetch_management_chain(employee_id: int) -> List[EmployeeRecord]:
+    """
+    Fetch the managers above the employee, the direct manager first.
+    """
+
+    cur = _select_employees(
+        """ SELECT employees.* FROM employee_closure AS c
+            JOIN employees ON employees.id = c.ancestor_id
+            WHERE c.descendant_id = ?
+            ORDER BY c.depth """, (employee_id,))
+    return cur.fetchall()
+
+
+@timed('db.record_payment')
+def record_payment(employee_id: int, role: Role, period: str, amount: int) -> bool:
+    """
+    Append a salary payment to the ledger. Returns False if the employee
+    has already been paid for the period.
+    """
+
+    with db.transaction() as con:
+        try:
+            cur = con.execute(
+                """ INSERT INTO payments (employee_id, role, period, amount)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (employee_id, period) DO NOTHING """,
+                (employee_id, role.code, period, amount))
+        except sql.IntegrityError:
+            # The employee has just been removed by another process
+            raise_incorrect_employee_id_error()
+        if cur.rowcount > 0:
+            record_paid_after(con, cur.lastrowid - 1)
+    return cur.rowcount > 0
+
+
+def _period_totals(con: sql.Connection, period: str) -> Dict[int, Tuple[int, int]]:
+    cur = con.execute(""" SELECT role, payments, total FROM payment_totals_by_period
+                          WHERE period = ? """, (period,))
+    return {role: (payments, total) for role, payments, total in cur}
+
+
+@timed('db.pay_all')
+def pay_all(period: str, roles: List[Role]) -> List[Tuple[Role, int, int]]:
+    """
+    Pay everyone (of the roles) not paid for the period yet in a single
+    INSERT ... SELECT and transaction. Returns (role, payments, total) of
+    the new payments, read as the change of the period totals.
+    """
+
+    condition, params = _roles_condition(roles)
+    with db.transaction() as con:
+        before = _period_totals(con, period)
+        last_id = con.execute(
+            """ SELECT COALESCE(MAX(id), 0) FROM payments """).fetchone()[0]
+        # The WHERE clause (always there) keeps ON CONFLICT from being
+        # parsed as a join constraint of the SELECT
+        con.execute(
+            f""" INSERT INTO payments (employee_id, role, period, amount)
+                 SELECT id, major, ?, {salary_case_sql()} FROM employees
+                 {condition}
+                 ON CONFLICT (employee_id, period) DO NOTHING """,
+            [period, *params])
+        record_paid_after(con, last_id)
+        after = _period_totals(con, period)
+
+    paid = []
+    for code, (payments, total) in sorted(after.items()):
+        old_payments, old_total = before.get(code, (0, 0))
+        if payments > old_payments:
+            paid.append((Role.from_code(code), payments - old_payments,
+                         total - old_total))
+    return paid
+
+
+def _year_range(year: Optional[int]) -> Tuple[str, List[str]]:
+    if year is None:
+        return '', []
+    # Periods are 'YYYY-MM' strings, so a year is a range of the key
+    return 'WHERE period >= ? AND period < ?', [f'{year:04d}', f'{year + 1:04d}']
+
+
+@timed('db.fetch_payments_by_period')
+def fetch_payments_by_period(year: Optional[int] = None) -> List[Tuple[str, int, int]]:
+    """
+    Get the (period, payments, total) of every paid month, of the year if
+    given, from the running totals.
+    """
+
+    condition, params = _year_range(year)
+    cur = db.connection.execute(
+        f""" SELECT period, SUM(payments), SUM(total)
+             FROM payment_totals_by_period {condition}
+             GROUP BY period ORDER BY period """, params)
+    return cur.fetchall()
+
+
+@timed('db.fetch_payments_by_role')
+def fetch_payments_by_role(year: Optional[int] = None) -> List[Tuple[Role, int, int]]:
+    """
+    Get the (role, payments, total) paid so far, in the year if given,
+    from the running totals.
+    """
+
+    if year is None:
+        cur = db.connection.execute(
+            """ SELECT role, payments, total FROM payment_totals_by_role
+                ORDER BY role """)
+    else:
+        condition, params = _year_range(year)
+        cur = db.connection.execute(
+            f""" SELECT role, SUM(payments), SUM(total)
+                 FROM payment_totals_by_period {condition}
+                 GROUP BY role ORDER BY role """, params)
+    return [(Role.from_code(code), payments, total) for code, payments, total in cur]
+
+
+@timed('db.fetch_employee_payment_totals')
+def fetch_employee_payment_totals(employee_id: int) -> List[Tuple[int, int, int]]:
+    """
+    Get the (year, payments, total) paid to the employee every year from
+    the running totals.
+    """
+
+    cur = db.connection.execute(
+        """ SELECT year, payments, total FROM payment_totals_by_employee
+            WHERE employee_id = ? ORDER BY year """, (employee_id,))
+    return cur.fetchall()
+
+
+@timed('db.fetch_employee_payments')
+def fetch_employee_payments(employee_id: int,
+                            year: Optional[int] = None) -> List[Tuple[str, int, str]]:
+    """
+    Get the (period, amount, paid_at) payments of the employee, read from
+    the (employee_id, period) key of the ledger.
+    """
+
+    params = [employee_id]
+    condition = ''
+    if year is not None:
+        condition = 'AND period >= ? AND period < ?'
+        params += [f'{year:04d}', f'{year + 1:04d}']
+
+    cur = db.connection.execute(
+        f""" SELECT period, amount, paid_at FROM payments
+             WHERE employee_id = ? {condition}
+             ORDER BY period """, params)
+    return cur.fetchall()
@@ -1,17 +1,100 @@
-import os
-from loguru import logger
+import sqlite3 as sql
+from typing import Any, List, Tuple
+from .log import logger
+from .exceptions import raise_incorrect_employee_id_error
 
+from .database import db
+from .journal import record
+from .metrics import timed
 
-@staticmethod
-def create_comment(_id: int, name: str, surname: str) -> None:
-    with open(f'organization_simulator_cli/comments/{_id}_{name}_{surname}.txt', 'w') as file:
-        logger.success(
-            'An empty comment for new employee (↓) has been successfully created!')
 
+def create_comment(_id: int) -> None:
+    with db.transaction() as con:
+        con.execute(
+            """ INSERT INTO comments (employee_id) VALUES (?) """, (_id,))
+    logger.success(
+        'An empty comment for new employee (↓) has been successfully created!')
+
+
+def create_comments_after(last_id: int) -> None:
+    """
+    Create empty comments for every employee whose ID is greater than
+    last_id with a single statement.
+    """
 
-@staticmethod
-def delete_comment(_id: int, name: str, surname: str) -> None:
-    os.remove(
-        f'organization_simulator_cli/comments/{_id}_{name}_{surname}.txt')
+    with db.transaction() as con:
+        cur = con.execute(""" INSERT INTO comments (employee_id)
+                              SELECT id FROM employees WHERE id > ? """,
+                          (last_id,))
+    logger.success(
+        f'Empty comments for {cur.rowcount} new employees have been successfully created!')
+
+
+def delete_comment(_id: int) -> None:
+    with db.transaction() as con:
+        con.execute(""" DELETE FROM comments WHERE employee_id = ? """, (_id,))
     logger.success(
         'A comment for the employee (↓) has been successfully deleted!')
+
+
+@timed('db.read_comment')
+def read_comment(_id: int) -> str:
+    cur = db.connection.execute(
+        """ SELECT body FROM comments WHERE employee_id = ? """, (_id,))
+    row = cur.fetchone()
+    return '' if row is None else row[0]
+
+
+@timed('db.set_comment')
+def set_comment(_id: int, comment: str) -> None:
+    try:
+        with db.transaction() as con:
+            old = _current_body(con, _id)
+            con.execute(""" INSERT INTO comments (employee_id, body) VALUES (?, ?)
+                            ON CONFLICT (employee_id) DO UPDATE SET body = excluded.body """,
+                        (_id, comment))
+            if old != comment:
+                record(con, 'comment', _id, [old, comment])
+    except sql.IntegrityError:
+        # The employee has been removed, possibly by another process
+        raise_incorrect_employee_id_error()
+    logger.success('Comment has been successfully changed!')
+
+
+@timed('db.clear_comment')
+def clear_comment(_id: int) -> None:
+    with db.transaction() as con:
+        old = _current_body(con, _id)
+        con.execute(
+            """ UPDATE comments SET body = '' WHERE employee_id = ? """, (_id,))
+        if old:
+            record(con, 'comment', _id, [old, ''])
+    logger.success('Comment has been successfully cleared!')
+
+
+def _current_body(con: sql.Connection, _id: int) -> str:
+    row = con.execute(
+        """ SELECT body FROM comments WHERE employee_id = ? """, (_id,)).fetchone()
+    return '' if row is None else row[0]
+
+
+@timed('db.search_comments')
+def search_comments(text: str, limit: int) -> List[Tuple[Any, ...]]:
+    """
+    Find comments containing every word of the text (as a prefix), best
+    matches first. Returns (id, name, surname, snippet) rows.
+    """
+
+    # Every word becomes a quoted prefix query, so FTS5 operators and
+    # unbalanced quotes in the input cannot break the MATCH expression
+    match = ' '.join('"{}"*'.format(word.replace('"', '""'))
+                     for word in text.split())
+    cur = db.connection.execute(
+        """ SELECT e.id, e.name, e.surname,
+                   snippet(comments_fts, 0, '[', ']', '...', 12)
+            FROM comments_fts
+            JOIN employees AS e ON e.id = comments_fts.rowid
+            WHERE comments_fts MATCH ?
+            ORDER BY rank
+            LIMIT ? """, (match, limit))
+    return cur.fetchall()
@@ -24,6 +24,50 @@ class CommandNotFoundError(Exception):
 class IncorrectLogLevelError(Exception):
     pass
 
+
+class ReportingCycleError(Exception):
+    pass
+
+
+class EmployeeNotFoundError(Exception):
+    pass
+
+
+class AmbiguousEmployeeError(Exception):
+    pass
+
+
+class NothingToUndoError(Exception):
+    pass
+
+
+class NothingToRedoError(Exception):
+    pass
+
+
+class UndoConflictError(Exception):
+    pass
+
+
+class JournalCompactedError(Exception):
+    pass
+
+
+class NoSnapshotError(Exception):
+    pass
+
+
+class CommentNotGivenError(Exception):
+    pass
+
+
+class SQLiteVersionError(Exception):
+    pass
+
+
+class UnknownRoleError(Exception):
+    pass
+
     
 def raise_wrong_number_of_arguments_error() -> NoReturn:
     raise WrongNumberOfArgumentsError(
@@ -47,4 +91,55 @@ def raise_command_not_found_error() -> NoReturn:
 
 
 def raise_incorrect_log_level_error() -> NoReturn:
-    raise IncorrectLogLevelError('Invalid log level!')
\ No newline at end of file
+    raise IncorrectLogLevelError('Invalid log level!')
+
+
+def raise_reporting_cycle_error() -> NoReturn:
+    raise ReportingCycleError(
+        'An employee cannot report to themselves or to their own report!')
+
+
+def raise_employee_not_found_error() -> NoReturn:
+    raise EmployeeNotFoundError('No employee matches this name!')
+
+
+def raise_ambiguous_employee_error() -> NoReturn:
+    raise AmbiguousEmployeeError(
+        'Several employees match this name, use the ID instead!')
+
+
+def raise_nothing_to_undo_error() -> NoReturn:
+    raise NothingToUndoError('There is nothing to undo!')
+
+
+def raise_nothing_to_redo_error() -> NoReturn:
+    raise NothingToRedoError('There is nothing to redo!')
+
+
+def raise_undo_conflict_error() -> NoReturn:
+    raise UndoConflictError(
+        'This change conflicts with a later one and cannot be reverted!')
+
+
+def raise_journal_compacted_error() -> NoReturn:
+    raise JournalCompactedError(
+        'No snapshot and journal cover this point anymore!')
+
+
+def raise_no_snapshot_error() -> NoReturn:
+    raise NoSnapshotError(
+        'There is no snapshot to replay from yet, take one with journal snapshot!')
+
+
+def raise_comment_not_given_error() -> NoReturn:
+    raise CommentNotGivenError(
+        'The comment has to follow the employee when the script is read from stdin!')
+
+
+def raise_sqlite_version_error(found: str, required: str) -> NoReturn:
+    raise SQLiteVersionError(
+        f'SQLite {found} is too old, version {required} or newer is required!')
+
+
+def raise_unknown_role_error() -> NoReturn:
+    raise UnknownRoleError('The role of this employee is unknown, it cannot be paid!')
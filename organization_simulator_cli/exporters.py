@@ -0,0 +1,176 @@
+import sys
+import csv
+import json
+import struct
+from array import array
+from itertools import accumulate
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Sequence, TextIO, Tuple
+
+EXPORT_FORMATS = ('csv', 'jsonl', 'columnar')
+INTEGER_EXPORT_COLUMNS = ('id', 'age', 'salary')
+
+# Layout of a columnar file (all integers little-endian):
+#
+#   MAGIC, u32 header length, JSON header with the column names and types
+#   row groups: GROUP_MARKER, u32 row count, then every column in turn
+#   END_MARKER, u32 total row count
+#
+# An integer column is stored as an array of the narrowest signed type
+# that fits its values. A text column is either plain (end offsets of
+# the values plus their UTF-8 bytes) or, when values repeat a lot,
+# dictionary encoded (the distinct values as a plain column plus an
+# integer column of indices into them). NULLs are written as 0 or ''.
+MAGIC = b'ORGCOL1\n'
+GROUP_MARKER = b'RGRP'
+END_MARKER = b'END\0'
+_U32 = struct.Struct('<I')
+_INTEGER_TYPECODES = ('b', 'h', 'i', 'q')
+_PLAIN, _DICTIONARY = b'S', b'D'
+
+
+def write_csv(chunks: Iterable[List[Tuple[Any, ...]]],
+              columns: Sequence[str], out: TextIO) -> int:
+    """
+    Write the chunks of rows as CSV with a header. Returns the row count.
+    """
+
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(columns)
+    rows = 0
+    for chunk in chunks:
+        writer.writerows(chunk)
+        rows += len(chunk)
+    return rows
+
+
+def write_jsonl(chunks: Iterable[List[Tuple[Any, ...]]],
+                columns: Sequence[str], out: TextIO) -> int:
+    """
+    Write the chunks of rows as one JSON object per line.
+    """
+
+    # json.dumps with options would build a new encoder for every row
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    rows = 0
+    for chunk in chunks:
+        out.write(''.join(encode(dict(zip(columns, row))) + '\n'
+                          for row in chunk))
+        rows += len(chunk)
+    return rows
+
+
+def write_columnar(chunks: Iterable[List[Tuple[Any, ...]]],
+                   columns: Sequence[str], out: BinaryIO) -> int:
+    """
+    Write the chunks of rows as row groups of a columnar file.
+    """
+
+    header = json.dumps({
+        'version': 1,
+        'columns': [{'name': column,
+                     'type': 'int' if column in INTEGER_EXPORT_COLUMNS else 'str'}
+                    for column in columns]}).encode()
+    out.write(MAGIC + _U32.pack(len(header)) + header)
+
+    rows = 0
+    for chunk in chunks:
+        out.write(GROUP_MARKER + _U32.pack(len(chunk)))
+        for index, values in enumerate(zip(*chunk)):
+            if columns[index] in INTEGER_EXPORT_COLUMNS:
+                out.write(_encode_integers([value or 0 for value in values]))
+            else:
+                out.write(_encode_texts(['' if value is None else value
+                                         for value in values]))
+        rows += len(chunk)
+
+    out.write(END_MARKER + _U32.pack(rows))
+    return rows
+
+
+def iter_columnar(file: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """
+    Read the rows of a columnar file back, one row group at a time.
+    """
+
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError('Not a columnar export file')
+    header = json.loads(file.read(_read_u32(file)))
+    names = [column['name'] for column in header['columns']]
+    types = [column['type'] for column in header['columns']]
+
+    while (marker := file.read(4)) == GROUP_MARKER:
+        # The row count of the group, every column holds that many values
+        _read_u32(file)
+        values = [_decode_integers(file) if kind == 'int' else _decode_texts(file)
+                  for kind in types]
+        for row in zip(*values):
+            yield dict(zip(names, row))
+
+    if marker != END_MARKER:
+        raise ValueError('Columnar export file is truncated')
+
+
+EXPORT_WRITERS = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+    'columnar': write_columnar,
+}
+
+
+def _encode_integers(values: List[int]) -> bytes:
+    low, high = min(values, default=0), max(values, default=0)
+    for typecode in _INTEGER_TYPECODES:
+        bits = array(typecode).itemsize * 8
+        if -2 ** (bits - 1) <= low and high < 2 ** (bits - 1):
+            break
+
+    data = array(typecode, values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    data = data.tobytes()
+    return typecode.encode() + _U32.pack(len(data)) + data
+
+
+def _decode_integers(file: BinaryIO) -> List[int]:
+    typecode = file.read(1).decode()
+    data = array(typecode, file.read(_read_u32(file)))
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tolist()
+
+
+def _encode_texts(values: List[str]) -> bytes:
+    distinct = dict.fromkeys(values)
+    if len(distinct) * 2 > len(values):
+        return _PLAIN + _encode_plain_texts(values)
+
+    indices = {value: index for index, value in enumerate(distinct)}
+    return (_DICTIONARY + _encode_plain_texts(list(distinct))
+            + _encode_integers([indices[value] for value in values]))
+
+
+def _encode_plain_texts(values: List[str]) -> bytes:
+    encoded = [value.encode() for value in values]
+    blob = b''.join(encoded)
+    return (_encode_integers(list(accumulate(map(len, encoded))))
+            + _U32.pack(len(blob)) + blob)
+
+
+def _decode_texts(file: BinaryIO) -> List[str]:
+    kind = file.read(1)
+    if kind == _PLAIN:
+        return _decode_plain_texts(file)
+
+    dictionary = _decode_plain_texts(file)
+    return [dictionary[index] for index in _decode_integers(file)]
+
+
+def _decode_plain_texts(file: BinaryIO) -> List[str]:
+    ends = _decode_integers(file)
+    blob = file.read(_read_u32(file))
+    return [blob[start:end].decode()
+            for start, end in zip([0] + ends, ends)]
+
+
+def _read_u32(file: BinaryIO) -> int:
+    return _U32.unpack(file.read(4))[0]
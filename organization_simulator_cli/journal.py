@@ -0,0 +1,565 @@
+import os
+import json
+import tempfile
+import threading
+import sqlite3 as sql
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .constants import (SNAPSHOT_DIR, SNAPSHOT_INTERVAL, SNAPSHOT_CHECK_SECONDS,
+                        SNAPSHOTS_KEPT)
+from .database import db
+from .cache import employee_cache
+from .exceptions import (raise_incorrect_arguments_error,
+                         raise_nothing_to_undo_error,
+                         raise_nothing_to_redo_error,
+                         raise_undo_conflict_error,
+                         raise_journal_compacted_error,
+                         raise_no_snapshot_error)
+from .log import logger
+from .metrics import timed
+from .migrations import migrate
+
+# The data of an entry is a compact JSON array. 'insert' and 'delete'
+# entries keep the whole employee: [name, surname, age, phone_number,
+# bank_card_number, major, comment, manager_id, [report IDs]], and a
+# removal also the [payment IDs] it detached from the employee, and
+# 'comment' entries keep [old body, new body] and 'manager' entries
+# [old manager ID, new manager ID], either of which may be null. 'payment'
+# entries keep [payment ID, role, period, amount, paid_at] and are only
+# replayed, a payment cannot be undone.
+INVERSE_ACTIONS = {'insert': 'delete', 'delete': 'insert',
+                   'comment': 'comment', 'manager': 'manager'}
+
+_encode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+
+# The latest change that is neither an undo nor undone
+_UNDO_QUERY = """ SELECT * FROM journal AS j
+                  WHERE j.kind != 'undo' AND j.action != 'payment'
+                  AND NOT EXISTS (SELECT 1 FROM journal AS u WHERE u.reverts = j.id)
+                  ORDER BY j.id DESC LIMIT 1 """
+
+# The latest undo that is not redone, unless a new change came after it
+_REDO_QUERY = """ SELECT * FROM journal AS u
+                  WHERE u.kind = 'undo'
+                  AND u.id > (SELECT COALESCE(MAX(id), 0) FROM journal
+                              WHERE kind = 'do' AND action != 'payment')
+                  AND NOT EXISTS (SELECT 1 FROM journal AS r WHERE r.reverts = u.id)
+                  ORDER BY u.id DESC LIMIT 1 """
+
+
+class JournalEntry(NamedTuple):
+    """
+    A row of the journal with its data decoded.
+    """
+
+    id: int
+    kind: str
+    action: str
+    employee_id: int
+    data: List[Any]
+    reverts: Optional[int]
+    made_at: str
+
+
+def _entry(row: Optional[Sequence[Any]]) -> Optional[JournalEntry]:
+    if row is None:
+        return None
+    return JournalEntry(*row[:4], json.loads(row[4]), *row[5:])
+
+
+def record(con: sql.Connection, action: str, employee_id: int, data: List[Any],
+           kind: str = 'do', reverts: Optional[int] = None) -> int:
+    """
+    Append a change to the journal, in the transaction making it. Returns
+    the ID of the entry.
+    """
+
+    cur = con.execute(""" INSERT INTO journal (kind, action, employee_id, data, reverts)
+                          VALUES (?, ?, ?, ?, ?) """,
+                      (kind, action, employee_id, _encode(data), reverts))
+    return cur.lastrowid
+
+
+def record_inserted_after(con: sql.Connection, last_id: int) -> None:
+    """
+    Journal every employee whose ID is greater than last_id as inserted
+    with an empty comment, with a single statement.
+    """
+
+    con.execute(""" INSERT INTO journal (kind, action, employee_id, data)
+                    SELECT 'do', 'insert', id,
+                           json_array(name, surname, age, phone_number,
+                                      bank_card_number, major, '', NULL,
+                                      json_array())
+                    FROM employees WHERE id > ? ORDER BY id """, (last_id,))
+
+
+def record_paid_after(con: sql.Connection, last_id: int) -> None:
+    """
+    Journal every payment whose ID is greater than last_id, with a single
+    statement.
+    """
+
+    con.execute(""" INSERT INTO journal (kind, action, employee_id, data)
+                    SELECT 'do', 'payment', employee_id,
+                           json_array(id, role, period, amount, paid_at)
+                    FROM payments WHERE id > ? ORDER BY id """, (last_id,))
+
+
+def employee_state(con: sql.Connection, employee_id: int) -> Optional[List[Any]]:
+    """
+    Get the data of an 'insert' or 'delete' entry for the employee as it
+    is now, or None if there is no such employee.
+    """
+
+    row = con.execute(
+        """ SELECT e.name, e.surname, e.age, e.phone_number,
+                   e.bank_card_number, e.major, COALESCE(c.body, ''),
+                   r.manager_id,
+                   (SELECT json_group_array(employee_id) FROM reporting_lines
+                    WHERE manager_id = e.id),
+                   (SELECT json_group_array(id) FROM payments
+                    WHERE employee_id = e.id)
+            FROM employees AS e
+            LEFT JOIN comments AS c ON c.employee_id = e.id
+            LEFT JOIN reporting_lines AS r ON r.employee_id = e.id
+            WHERE e.id = ? """, (employee_id,)).fetchone()
+    if row is None:
+        return None
+    return [*row[:8], json.loads(row[8]), json.loads(row[9])]
+
+
+def _insert(con: sql.Connection, journal: str, first_id: int, last_id: int) -> None:
+    entries = (first_id, last_id)
+    try:
+        con.execute(f""" INSERT INTO employees (id, name, surname, age, phone_number,
+                                                bank_card_number, major)
+                         SELECT employee_id,
+                                json_extract(data, '$[0]'), json_extract(data, '$[1]'),
+                                json_extract(data, '$[2]'), json_extract(data, '$[3]'),
+                                json_extract(data, '$[4]'), json_extract(data, '$[5]')
+                         FROM {journal} WHERE id BETWEEN ? AND ?
+                         ORDER BY id """, entries)
+    except sql.IntegrityError:
+        # The ID or the identity has been taken by a new employee since
+        raise_undo_conflict_error()
+    con.execute(f""" INSERT INTO comments (employee_id, body)
+                     SELECT employee_id, json_extract(data, '$[6]') FROM {journal}
+                     WHERE id BETWEEN ? AND ? ORDER BY id """, entries)
+
+    # The payments of an employee brought back are linked again, so they
+    # count for the employee and a month cannot be paid twice
+    cur = con.execute(f""" UPDATE payments SET employee_id = paid.employee_id
+                     FROM (SELECT j.employee_id, payment.value AS payment_id
+                           FROM {journal} AS j, json_each(j.data, '$[9]') AS payment
+                           WHERE j.id BETWEEN ? AND ?) AS paid
+                     WHERE payments.id = paid.payment_id
+                     AND payments.employee_id IS NULL """, entries)
+    detached = con.execute(f""" SELECT COUNT(*)
+                               FROM {journal} AS j, json_each(j.data, '$[9]')
+                               WHERE j.id BETWEEN ? AND ? """, entries).fetchone()[0]
+    if cur.rowcount < detached:
+        # Only a journal older than the journaling of payments lacks them
+        logger.warning(f'{detached - cur.rowcount} payments of the employees '
+                       f'brought back are missing and have not been linked again')
+
+    # The manager and the reports are brought back where they still can
+    # be: removing the employee moved the reports to its manager, or made
+    # them report to nobody
+    con.execute(f""" INSERT INTO reporting_lines (employee_id, manager_id)
+                     SELECT j.employee_id, m.id FROM {journal} AS j
+                     JOIN employees AS m ON m.id = json_extract(j.data, '$[7]')
+                     WHERE j.id BETWEEN ? AND ? ORDER BY j.id """, entries)
+    con.execute(f""" UPDATE reporting_lines SET manager_id = moved.employee_id
+                     FROM (SELECT j.employee_id,
+                                  json_extract(j.data, '$[7]') AS manager_id,
+                                  report.value AS report_id
+                           FROM {journal} AS j, json_each(j.data, '$[8]') AS report
+                           WHERE j.id BETWEEN ? AND ?
+                           AND json_extract(j.data, '$[7]') IS NOT NULL) AS moved
+                     WHERE reporting_lines.employee_id = moved.report_id
+                     AND reporting_lines.manager_id = moved.manager_id """, entries)
+    con.execute(f""" INSERT INTO reporting_lines (employee_id, manager_id)
+                     SELECT report.value, j.employee_id
+                     FROM {journal} AS j, json_each(j.data, '$[8]') AS report
+                     WHERE j.id BETWEEN ? AND ?
+                     AND json_extract(j.data, '$[7]') IS NULL
+                     AND report.value IN (SELECT id FROM employees)
+                     ON CONFLICT (employee_id) DO NOTHING """, entries)
+
+
+def _pay(con: sql.Connection, journal: str, first_id: int, last_id: int) -> None:
+    con.execute(f""" INSERT INTO payments (id, employee_id, role, period, amount,
+                                               paid_at)
+                     SELECT json_extract(data, '$[0]'), employee_id,
+                            json_extract(data, '$[1]'), json_extract(data, '$[2]'),
+                            json_extract(data, '$[3]'), json_extract(data, '$[4]')
+                     FROM {journal} WHERE id BETWEEN ? AND ?
+                     ORDER BY id """, (first_id, last_id))
+
+
+def _employees_count(con: sql.Connection, journal: str,
+                     first_id: int, last_id: int) -> int:
+    return con.execute(f""" SELECT COUNT(DISTINCT employee_id) FROM {journal}
+                            WHERE id BETWEEN ? AND ? """,
+                       (first_id, last_id)).fetchone()[0]
+
+
+def _delete(con: sql.Connection, journal: str, first_id: int, last_id: int) -> None:
+    employees = f'SELECT employee_id FROM {journal} WHERE id BETWEEN ? AND ?'
+    con.execute(f""" DELETE FROM comments WHERE employee_id IN ({employees}) """,
+                (first_id, last_id))
+    cur = con.execute(f""" DELETE FROM employees WHERE id IN ({employees}) """,
+                      (first_id, last_id))
+    if cur.rowcount != _employees_count(con, journal, first_id, last_id):
+        raise_undo_conflict_error()
+
+
+def _comment(con: sql.Connection, journal: str, first_id: int, last_id: int) -> None:
+    # The latest change of each comment wins (MAX picks the row of the body)
+    cur = con.execute(f""" UPDATE comments SET body = latest.body
+                           FROM (SELECT employee_id,
+                                        json_extract(data, '$[1]') AS body, MAX(id)
+                                 FROM {journal} WHERE id BETWEEN ? AND ?
+                                 GROUP BY employee_id) AS latest
+                           WHERE comments.employee_id = latest.employee_id """,
+                      (first_id, last_id))
+    if cur.rowcount != _employees_count(con, journal, first_id, last_id):
+        raise_undo_conflict_error()
+
+
+def _manager(con: sql.Connection, journal: str, first_id: int, last_id: int) -> None:
+    # Rare enough to be applied one by one, each checked for a cycle
+    changes = con.execute(f""" SELECT employee_id, json_extract(data, '$[1]')
+                               FROM {journal}
+                               WHERE id BETWEEN ? AND ? ORDER BY id """,
+                          (first_id, last_id)).fetchall()
+    for employee_id, manager_id in changes:
+        if manager_id is None:
+            con.execute(""" DELETE FROM reporting_lines WHERE employee_id = ? """,
+                        (employee_id,))
+            continue
+
+        cycle = con.execute(""" SELECT 1 FROM employee_closure
+                                WHERE ancestor_id = ? AND descendant_id = ? """,
+                            (employee_id, manager_id)).fetchone()
+        if cycle is not None:
+            raise_undo_conflict_error()
+        try:
+            con.execute(""" INSERT INTO reporting_lines (employee_id, manager_id)
+                            VALUES (?, ?)
+                            ON CONFLICT (employee_id)
+                            DO UPDATE SET manager_id = excluded.manager_id """,
+                        (employee_id, manager_id))
+        except sql.IntegrityError:
+            raise_undo_conflict_error()
+
+
+# Apply the journal entries first_id..last_id of a journal table, all of
+# the same action, with set-based statements
+APPLIERS: Dict[str, Callable[[sql.Connection, str, int, int], None]] = {
+    'insert': _insert,
+    'delete': _delete,
+    'comment': _comment,
+    'manager': _manager,
+    'payment': _pay,
+}
+
+
+def _revert(con: sql.Connection, entry: JournalEntry, kind: str) -> JournalEntry:
+    """
+    Journal the reverse of an entry and apply it from the journal. The data
+    of a removal or a comment or manager change is taken from the database
+    as it is now, so that reverting it once more restores exactly this
+    state.
+    """
+
+    action = INVERSE_ACTIONS[entry.action]
+    if action == 'delete':
+        data = employee_state(con, entry.employee_id)
+    elif action == 'comment':
+        row = con.execute(""" SELECT body FROM comments WHERE employee_id = ? """,
+                          (entry.employee_id,)).fetchone()
+        data = None if row is None else [row[0], entry.data[0]]
+    elif action == 'manager':
+        row = con.execute(""" SELECT manager_id FROM reporting_lines
+                              WHERE employee_id = ? """,
+                          (entry.employee_id,)).fetchone()
+        data = [None if row is None else row[0], entry.data[0]]
+    else:
+        data = entry.data
+    if data is None:
+        raise_undo_conflict_error()
+
+    entry_id = record(con, action, entry.employee_id, data, kind, entry.id)
+    APPLIERS[action](con, 'journal', entry_id, entry_id)
+    return JournalEntry(entry_id, kind, action, entry.employee_id, data,
+                        entry.id, entry.made_at)
+
+
+@timed('db.undo')
+def undo() -> JournalEntry:
+    """
+    Revert the latest change that has not been undone yet. Returns the
+    entry that has been undone.
+    """
+
+    with db.transaction() as con:
+        entry = _entry(con.execute(_UNDO_QUERY).fetchone())
+        if entry is None:
+            raise_nothing_to_undo_error()
+        _revert(con, entry, 'undo')
+
+    employee_cache.invalidate(entry.employee_id)
+    return entry
+
+
+@timed('db.redo')
+def redo() -> JournalEntry:
+    """
+    Make the latest undone change again. Returns the new entry.
+    """
+
+    with db.transaction() as con:
+        entry = _entry(con.execute(_REDO_QUERY).fetchone())
+        if entry is None:
+            raise_nothing_to_redo_error()
+        redone = _revert(con, entry, 'redo')
+
+    employee_cache.invalidate(entry.employee_id)
+    return redone
+
+
+@timed('db.fetch_journal')
+def fetch_journal(limit: int) -> List[JournalEntry]:
+    """
+    Get the last entries of the journal, oldest first.
+    """
+
+    cur = db.connection.execute(
+        """ SELECT * FROM journal ORDER BY id DESC LIMIT ? """, (limit,))
+    return [_entry(row) for row in reversed(cur.fetchall())]
+
+
+def _last_entry_id(con: sql.Connection) -> int:
+    return con.execute('SELECT COALESCE(MAX(id), 0) FROM journal').fetchone()[0]
+
+
+def snapshot_directory() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(db.path)), SNAPSHOT_DIR)
+
+
+def list_snapshots() -> List[Tuple[int, str]]:
+    """
+    Get the (last journal entry ID, path) of every snapshot of the
+    database, oldest first.
+    """
+
+    directory = snapshot_directory()
+    if not os.path.isdir(directory):
+        return []
+
+    prefix = os.path.splitext(os.path.basename(db.path))[0] + '-'
+    snapshots = []
+    for name in os.listdir(directory):
+        entry_id = name[len(prefix):-3]
+        if name.startswith(prefix) and name.endswith('.db') and entry_id.isdigit():
+            snapshots.append((int(entry_id), os.path.join(directory, name)))
+    return sorted(snapshots)
+
+
+def _temporary_path(directory: str) -> str:
+    fd, path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    os.close(fd)
+    return path
+
+
+def _remove(path: str) -> None:
+    # The file may already have been removed by another process
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@timed('io.take_snapshot')
+def take_snapshot() -> Tuple[int, str]:
+    """
+    Copy the database with the SQLite backup API into the snapshot
+    directory, named after the last journal entry it contains, and
+    compact the journal. Returns the entry ID and the path.
+    """
+
+    directory = snapshot_directory()
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.splitext(os.path.basename(db.path))[0]
+
+    temp_path = _temporary_path(directory)
+    try:
+        target = sql.connect(temp_path)
+        try:
+            # Copied in a single step, so it is one consistent state
+            # whatever other processes commit meanwhile
+            db.connection.backup(target)
+            entry_id = _last_entry_id(target)
+        finally:
+            target.close()
+        path = os.path.join(directory, f'{prefix}-{entry_id:012d}.db')
+        os.replace(temp_path, path)
+    except BaseException:
+        _remove(temp_path)
+        raise
+
+    compact()
+    return entry_id, path
+
+
+@timed('db.compact_journal')
+def compact() -> int:
+    """
+    Keep only the SNAPSHOTS_KEPT latest snapshots and drop the journal
+    entries the oldest of them already contains. Returns the number of
+    dropped entries.
+    """
+
+    snapshots = list_snapshots()
+    if len(snapshots) <= SNAPSHOTS_KEPT:
+        return 0
+
+    for _, path in snapshots[:-SNAPSHOTS_KEPT]:
+        _remove(path)
+    with db.transaction() as con:
+        cur = con.execute(""" DELETE FROM journal WHERE id <= ? """,
+                          (snapshots[-SNAPSHOTS_KEPT][0],))
+    return cur.rowcount
+
+
+class BackgroundSnapshots:
+    """
+    Thread taking a snapshot whenever SNAPSHOT_INTERVAL entries have been
+    journaled since the latest one (or there is none yet), which bounds
+    the journal to replay. It checks every SNAPSHOT_CHECK_SECONDS with its
+    own connection, so commands never wait for a snapshot.
+    """
+
+    def __init__(self, interval: int = SNAPSHOT_INTERVAL,
+                 check_seconds: float = SNAPSHOT_CHECK_SECONDS) -> None:
+        self.interval = interval
+        self.check_seconds = check_seconds
+        # Entry ID of the latest snapshot, listed once and then kept up to
+        # date with the snapshots taken here
+        self._last_id: Optional[int] = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self.__run, name='snapshots',
+                                        daemon=True)
+
+    def start(self) -> 'BackgroundSnapshots':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def check(self) -> Optional[Tuple[int, str]]:
+        """
+        Take a snapshot if it is due. Returns its entry ID and path.
+        """
+
+        if self._last_id is None:
+            snapshots = list_snapshots()
+            self._last_id = snapshots[-1][0] if snapshots else -self.interval
+
+        if _last_entry_id(db.connection) - self._last_id < self.interval:
+            return None
+        entry_id, path = take_snapshot()
+        self._last_id = entry_id
+        return entry_id, path
+
+    def __run(self) -> None:
+        while not self._stopped.wait(self.check_seconds):
+            try:
+                self.check()
+            except (sql.Error, OSError) as e:
+                logger.warning(f'Snapshot could not be taken: {e}')
+
+
+@timed('db.replay_journal')
+def replay_journal(path: str, until: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Rebuild the database up to the journal entry until (the last one if
+    None) in a new file: the latest snapshot taken before it is copied and
+    the entries after the snapshot are applied in one transaction, with
+    consecutive entries of the same action batched. Returns the entry ID
+    of the snapshot and the number of replayed entries.
+    """
+
+    if os.path.exists(path):
+        raise_incorrect_arguments_error()
+
+    con = db.connection
+    until = _last_entry_id(con) if until is None else until
+    snapshots = list_snapshots()
+    if not snapshots:
+        raise_no_snapshot_error()
+    snapshots = [snapshot for snapshot in snapshots if snapshot[0] <= until]
+    if not snapshots:
+        raise_journal_compacted_error()
+    start, snapshot = snapshots[-1]
+
+    # Written next to the final file and moved there once complete
+    temp_path = _temporary_path(os.path.dirname(os.path.abspath(path)))
+    try:
+        source = sql.connect(snapshot)
+        target = sql.connect(temp_path, isolation_level=None)
+        try:
+            source.backup(target)
+            replayed = _replay(target, start, until)
+        finally:
+            source.close()
+            target.close()
+        os.replace(temp_path, path)
+    except BaseException:
+        _remove(temp_path)
+        raise
+
+    return start, replayed
+
+
+def _replay(con: sql.Connection, start: int, until: int) -> int:
+    """
+    Apply the journal entries after start up to until from the current
+    database to the new one in a single transaction.
+    """
+
+    # The new file is thrown away if anything fails, so it does not have
+    # to survive a crash midway
+    con.execute('PRAGMA journal_mode = MEMORY')
+    con.execute('PRAGMA synchronous = OFF')
+    con.execute('PRAGMA foreign_keys = ON')
+    migrate(con)
+
+    con.execute('ATTACH DATABASE ? AS live', (db.path,))
+    con.execute('BEGIN')
+    try:
+        entries = con.execute(""" SELECT id, action FROM live.journal
+                                  WHERE id > ? AND id <= ? ORDER BY id """,
+                              (start, until))
+        replayed = 0
+        for action, run in groupby(entries, key=itemgetter(1)):
+            run = list(run)
+            APPLIERS[action](con, 'live.journal', run[0][0], run[-1][0])
+            replayed += len(run)
+
+        con.execute(""" INSERT INTO main.journal
+                        SELECT * FROM live.journal
+                        WHERE id > ? AND id <= ? """, (start, until))
+        con.execute('COMMIT')
+    except BaseException:
+        con.execute('ROLLBACK')
+        raise
+    con.execute('DETACH DATABASE live')
+    return replayed
@@ -0,0 +1,229 @@
+import os
+import sys
+import queue
+import atexit
+import zipfile
+import threading
+from datetime import datetime
+from typing import Any, List, Optional
+
+LOG_DIR = 'logs'
+LOG_FILE = os.path.join(LOG_DIR, 'app.log')
+LOG_FORMAT = '{time} | {level} | {message}'
+# How loguru writes {time}. datetime.fromisoformat only reads the +0000
+# offset since Python 3.11
+LOG_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f%z'
+
+ROTATION_SIZE = 1024 * 1024
+# Rotated logs are named after the time their first record was written
+ARCHIVE_TIME_FORMAT = '%Y-%m-%d_%H-%M-%S_%f'
+
+_STOP = object()
+_CLEAR = object()
+
+
+class BackgroundFileSink:
+    """
+    File-like loguru sink that hands formatted records to a writer thread.
+
+    The thread writes whatever records are waiting in one go with a single
+    flush, and rotates and zip-compresses the file itself, so a logging
+    call never waits for the disk.
+    """
+
+    def __init__(self, path: str, rotation_size: int = ROTATION_SIZE) -> None:
+        self.path = path
+        self.rotation_size = rotation_size
+        self._queue: queue.Queue = queue.Queue()
+        self._file = None
+        self._started_at: Optional[datetime] = None
+        # Created up front, as the logs command reads the directory before
+        # anything may have been written
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._thread = threading.Thread(target=self.__run, name='log-writer',
+                                        daemon=True)
+        self._thread.start()
+
+    def write(self, message: str) -> None:
+        self._queue.put(message)
+
+    def sync(self) -> None:
+        """
+        Wait until every record logged so far is on disk.
+        """
+
+        self._queue.join()
+
+    def clear(self) -> None:
+        """
+        Empty the log file once every record logged so far is written,
+        by the writer thread, so the next rotation counts from zero.
+        """
+
+        self._queue.put(_CLEAR)
+        self._queue.join()
+
+    def stop(self) -> None:
+        """
+        Write the remaining records and close the file. Called by loguru
+        when the handler is removed.
+        """
+
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def __run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            messages = []
+            try:
+                for message in batch:
+                    if message is _CLEAR:
+                        if messages:
+                            self.__write(messages)
+                        messages = []
+                        self.__clear()
+                    elif message is not _STOP:
+                        messages.append(message)
+                if messages:
+                    self.__write(messages)
+            except Exception as e:
+                print(f'Logging error: {e}', file=sys.stderr)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if any(message is _STOP for message in batch):
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def __write(self, messages: List[str]) -> None:
+        data = ''.join(messages)
+
+        if self._file is None:
+            self.__open()
+        elif 0 < self._file.tell() and (
+                self._file.tell() + len(data) > self.rotation_size):
+            self.__rotate()
+
+        self._file.write(data)
+        self._file.flush()
+
+    def __open(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._started_at = self.__first_record_time() or datetime.now()
+
+    def __clear(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        open(self.path, 'w').close()
+
+    def __first_record_time(self) -> Optional[datetime]:
+        with open(self.path, encoding='utf-8', errors='replace') as file:
+            line = file.readline()
+        try:
+            return datetime.strptime(line[:line.index(' | ')],
+                                     LOG_TIME_FORMAT).astimezone()
+        except ValueError:
+            return None
+
+    def __rotate(self) -> None:
+        """
+        Move the current log into an app.<start time>.log.zip archive.
+        """
+
+        self._file.close()
+
+        stem, extension = os.path.splitext(self.path)
+        started_at = self._started_at.strftime(ARCHIVE_TIME_FORMAT)
+        rotated_path = f'{stem}.{started_at}{extension}'
+        os.replace(self.path, rotated_path)
+
+        with zipfile.ZipFile(rotated_path + '.zip', 'w',
+                             compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.write(rotated_path, os.path.basename(rotated_path))
+        os.remove(rotated_path)
+
+        self.__open()
+
+
+def setup_logging() -> Any:
+    """
+    Import loguru and send the logs to the project log file.
+    """
+
+    global _sink
+    from loguru import logger
+
+    # Disable logging output to the console
+    logger.remove()
+
+    # Add a log file to the project directory, written in the background
+    _sink = BackgroundFileSink(LOG_FILE)
+    logger.add(_sink, format=LOG_FORMAT, level='DEBUG', backtrace=True)
+    atexit.register(shutdown_logging)
+    return logger
+
+
+def flush_logs() -> None:
+    """
+    Wait until every record logged so far is written to the log file.
+    """
+
+    if _sink is not None:
+        _sink.sync()
+
+
+def clear_logs() -> None:
+    """
+    Empty the log file, through the writer thread if logging is set up.
+    """
+
+    if _sink is not None:
+        _sink.clear()
+    else:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        open(LOG_FILE, 'w').close()
+
+
+def shutdown_logging() -> None:
+    """
+    Write the pending records and stop the writer thread.
+    """
+
+    global _sink
+    if _sink is not None:
+        logger.remove()
+        _sink = None
+        logger._logger = None
+
+
+class LazyLogger:
+    """
+    Stand-in for the loguru logger that sets logging up on first use, so
+    commands that never log do not pay for importing and configuring it.
+    """
+
+    def __init__(self) -> None:
+        self._logger = None
+
+    def __getattr__(self, name: str) -> Any:
+        if self._logger is None:
+            self._logger = setup_logging()
+        return getattr(self._logger, name)
+
+
+_sink: Optional[BackgroundFileSink] = None
+logger = LazyLogger()
@@ -0,0 +1,356 @@
+import io
+import os
+import re
+import json
+import shutil
+import zipfile
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: updates of the index by several processes are not serialized
+    fcntl = None
+
+from .constants import VALID_LEVELS
+from .log import LOG_FILE, LOG_TIME_FORMAT, ARCHIVE_TIME_FORMAT
+from .metrics import timed
+
+LOG_PATH = LOG_FILE
+# Directory next to the log where its index is kept
+INDEX_NAME = '.index'
+
+BLOCK_SIZE = 64 * 1024
+# Bytes from the start of the log used to tell whether it was replaced
+SIGNATURE_SIZE = 64
+
+
+def tail_lines(path: str, count: int) -> List[str]:
+    """
+    Get the last count lines of a file by reading it backwards in blocks,
+    so the cost depends on count and not on the size of the file.
+    """
+
+    if count <= 0 or not os.path.exists(path):
+        return []
+
+    with open(path, 'rb') as file:
+        position = file.seek(0, os.SEEK_END)
+        data = b''
+        # One extra newline is needed to be sure the first line is complete
+        while position > 0 and data.count(b'\n') <= count:
+            step = min(BLOCK_SIZE, position)
+            position -= step
+            file.seek(position)
+            data = file.read(step) + data
+
+    lines = data.decode('utf-8', errors='replace').splitlines()
+    return lines[-count:]
+
+
+def parse_time(line: str) -> Optional[datetime]:
+    """
+    Get the timestamp of a '{time} | {level} | {message}' record.
+    """
+
+    try:
+        return datetime.strptime(line[:line.index(' | ')], LOG_TIME_FORMAT)
+    except ValueError:
+        return None
+
+
+def parse_level(line: str | bytes) -> Optional[str]:
+    """
+    Get the level of a '{time} | {level} | {message}' record, or None if
+    the line is not a record start (e.g. a traceback line).
+    """
+
+    if isinstance(line, bytes):
+        line = line.decode('utf-8', errors='replace')
+
+    parts = line.split(' | ', 2)
+    if len(parts) == 3 and parts[1] in VALID_LEVELS:
+        return parts[1]
+    return None
+
+
+class LevelIndex:
+    """
+    Sidecar index with the byte offsets of the records of every level.
+
+    Offsets are stored as packed 64-bit integers in one file per level,
+    so the last n records of a level are found with a single seek. The
+    index is extended incrementally with the bytes appended since the
+    previous update and rebuilt when the log is cleared or rotated.
+
+    Several processes may update the index at once (two shells, for
+    example), so updates hold an exclusive lock of <index dir>.lock, kept
+    outside the directory as clearing removes it, and meta.json is
+    replaced atomically.
+    """
+
+    def __init__(self, log_path: str = LOG_PATH,
+                 index_dir: Optional[str] = None) -> None:
+        self.log_path = log_path
+        self.index_dir = index_dir or os.path.join(os.path.dirname(log_path),
+                                                   INDEX_NAME)
+        self.meta_path = os.path.join(self.index_dir, 'meta.json')
+        self.lock_path = f'{self.index_dir}.lock'
+
+    def _level_path(self, level: str) -> str:
+        return os.path.join(self.index_dir, f'{level}.idx')
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def update(self) -> None:
+        """
+        Index the complete lines appended to the log since the last update.
+        """
+
+        with self._locked():
+            self.__update()
+
+    def __update(self) -> None:
+        # Read inside the lock, so the lines another process has just
+        # indexed are not indexed again
+        meta = self.__read_meta()
+        with open(self.log_path, 'rb') as file:
+            signature = file.read(SIGNATURE_SIZE).hex()
+            size = file.seek(0, os.SEEK_END)
+
+            if (meta is None or meta['size'] > size
+                    or not signature.startswith(meta['signature'])):
+                shutil.rmtree(self.index_dir, ignore_errors=True)
+                meta = {'size': 0}
+            meta['signature'] = signature
+
+            if meta['size'] == size:
+                return
+
+            offsets = {level: array('q') for level in VALID_LEVELS}
+            position = file.seek(meta['size'])
+            for line in file:
+                # A partially written line is picked up by the next update
+                if not line.endswith(b'\n'):
+                    break
+                level = parse_level(line)
+                if level is not None:
+                    offsets[level].append(position)
+                position += len(line)
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        for level, level_offsets in offsets.items():
+            if level_offsets:
+                with open(self._level_path(level), 'ab') as file:
+                    level_offsets.tofile(file)
+
+        meta['size'] = position
+        temporary_path = f'{self.meta_path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(meta, file)
+        os.replace(temporary_path, self.meta_path)
+
+    def last_records(self, level: str,
+                     count: Optional[int] = None) -> Iterator[str]:
+        """
+        Yield the last count records of the level (all of them if count
+        is None) in chronological order.
+        """
+
+        if not os.path.exists(self.log_path):
+            return
+        self.update()
+        level_path = self._level_path(level)
+        if not os.path.exists(level_path):
+            return
+
+        item_size = array('q').itemsize
+        with open(level_path, 'rb') as file:
+            total = file.seek(0, os.SEEK_END) // item_size
+            first = 0 if count is None else max(0, total - count)
+            file.seek(first * item_size)
+            offsets = array('q')
+            offsets.frombytes(file.read((total - first) * item_size))
+
+        with open(self.log_path, 'rb') as log:
+            for offset in offsets:
+                log.seek(offset)
+                yield log.readline().decode('utf-8', errors='replace').rstrip()
+
+    def clear(self) -> None:
+        with self._locked():
+            shutil.rmtree(self.index_dir, ignore_errors=True)
+
+    def __read_meta(self) -> Optional[dict]:
+        try:
+            with open(self.meta_path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+
+class LogQuery:
+    """
+    Filter of log lines by exact level and by a [since, until] time range.
+    Without any filter every line matches, traceback lines included.
+    """
+
+    def __init__(self, level: Optional[str] = None,
+                 since: Optional[datetime] = None,
+                 until: Optional[datetime] = None) -> None:
+        self.level = level
+        self.since = since
+        self.until = until
+
+    @property
+    def has_time_range(self) -> bool:
+        return self.since is not None or self.until is not None
+
+    def matches(self, line: str) -> bool:
+        if self.level is None and not self.has_time_range:
+            return True
+        if self.level is not None and parse_level(line) != self.level:
+            return False
+        if self.has_time_range:
+            time = parse_time(line)
+            if time is None:
+                return False
+            if self.since is not None and time < self.since:
+                return False
+            if self.until is not None and time > self.until:
+                return False
+        return True
+
+    def may_overlap(self, start: Optional[datetime],
+                    end: Optional[datetime]) -> bool:
+        """
+        Check whether records written in [start, end) can match the query.
+        """
+
+        if self.since is not None and end is not None and end <= self.since:
+            return False
+        if self.until is not None and start is not None and start > self.until:
+            return False
+        return True
+
+
+def list_archives(log_path: str = LOG_PATH) -> List[Tuple[datetime, str]]:
+    """
+    Get the rotated zip archives of the log with their start times,
+    oldest first.
+    """
+
+    directory, filename = os.path.split(log_path)
+    stem, extension = os.path.splitext(filename)
+    pattern = re.compile(
+        rf'^{re.escape(stem)}\.(.+){re.escape(extension)}\.zip$')
+
+    if not os.path.isdir(directory or '.'):
+        return []
+
+    archives = []
+    for name in os.listdir(directory or '.'):
+        match = pattern.match(name)
+        if match is None:
+            continue
+        try:
+            start = datetime.strptime(match[1], ARCHIVE_TIME_FORMAT)
+        except ValueError:
+            continue
+        archives.append((start.astimezone(), os.path.join(directory, name)))
+
+    archives.sort()
+    return archives
+
+
+def iter_archive_lines(path: str) -> Iterator[str]:
+    """
+    Stream the lines of a zipped log without extracting it to disk.
+    """
+
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            with archive.open(name) as member:
+                text = io.TextIOWrapper(member, encoding='utf-8',
+                                        errors='replace')
+                for line in text:
+                    yield line.rstrip('\n')
+
+
+def iter_log_lines(path: str) -> Iterator[str]:
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8', errors='replace') as file:
+        for line in file:
+            yield line.rstrip('\n')
+
+
+def _log_segments(query: LogQuery, log_path: str
+                  ) -> List[Tuple[str, Callable[[], Iterable[str]]]]:
+    """
+    Get the (path, line reader) pairs of the archives that may hold
+    matching records plus the current log, oldest first.
+    """
+
+    archives = list_archives(log_path)
+    segments = []
+    for i, (start, path) in enumerate(archives):
+        end = archives[i + 1][0] if i + 1 < len(archives) else None
+        if query.may_overlap(start, end):
+            segments.append(
+                (path, lambda path=path: iter_archive_lines(path)))
+
+    segments.append((log_path, lambda: iter_log_lines(log_path)))
+    return segments
+
+
+@timed('io.search_logs')
+def search_logs(query: LogQuery, log_path: str = LOG_PATH) -> Iterator[str]:
+    """
+    Yield every matching line of the archives and the current log in
+    chronological order.
+    """
+
+    for _, read_lines in _log_segments(query, log_path):
+        yield from filter(query.matches, read_lines())
+
+
+@timed('io.last_logs')
+def last_logs(query: LogQuery, count: int,
+              log_path: str = LOG_PATH) -> List[str]:
+    """
+    Get the last count matching lines, reading the current log first and
+    then going through the archives newest first until enough are found.
+    """
+
+    found: deque = deque()
+    for path, read_lines in reversed(_log_segments(query, log_path)):
+        needed = count - len(found)
+        if needed <= 0:
+            break
+
+        if path == log_path and not query.has_time_range:
+            if query.level is None:
+                lines = tail_lines(log_path, needed)
+            else:
+                lines = list(LevelIndex(log_path).last_records(
+                    query.level, needed))
+        else:
+            lines = deque(filter(query.matches, read_lines()), maxlen=needed)
+
+        found.extendleft(reversed(lines))
+
+    return list(found)
@@ -0,0 +1,183 @@
+import math
+from typing import FrozenSet, Iterable, List, Sequence, Tuple
+
+from .constants import (FIND_CANDIDATES, FIND_EDIT_CANDIDATES,
+                        FIND_MIN_SIMILARITY, FIND_MIN_EDIT_SIMILARITY,
+                        AMBIGUOUS_SHOWN)
+from .db_funcs import (fetch_employee_by_id, fetch_employees_named,
+                       fetch_employees_with_names, fetch_similar_names,
+                       fetch_names_by_initials)
+from .exceptions import (raise_wrong_number_of_arguments_error,
+                         raise_incorrect_employee_id_error,
+                         raise_employee_not_found_error,
+                         raise_ambiguous_employee_error)
+from .metrics import timed
+from .roles import EmployeeRecord
+
+
+def trigrams(word: str) -> FrozenSet[str]:
+    """
+    Get the lower-cased trigrams of a word, or the word itself if it is
+    shorter than three characters.
+    """
+
+    word = word.lower()
+    return frozenset(word[i:i + 3] for i in range(len(word) - 2)) or frozenset((word,))
+
+
+def _jaccard(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    return len(first & second) / len(first | second)
+
+
+def similarity(query: Sequence[FrozenSet[str]], name: str, surname: str) -> float:
+    """
+    Score a name against the trigrams of the query words: every word is
+    compared with the name and the surname, and the best Jaccard
+    similarities are averaged. Word order does not matter.
+    """
+
+    name_trigrams, surname_trigrams = trigrams(name), trigrams(surname)
+    return sum(max(_jaccard(word, name_trigrams), _jaccard(word, surname_trigrams))
+               for word in query) / len(query)
+
+
+def edit_distance(first: str, second: str) -> int:
+    """
+    Get the number of insertions, deletions, substitutions and swaps of
+    adjacent characters turning one word into the other (the optimal
+    string alignment distance).
+    """
+
+    previous, current = None, list(range(len(second) + 1))
+    for i in range(1, len(first) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(second)
+        for j in range(1, len(second) + 1):
+            cost = first[i - 1] != second[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + cost)
+            if (i > 1 and j > 1 and first[i - 1] == second[j - 2]
+                    and first[i - 2] == second[j - 1]):
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+def edit_similarity(words: Sequence[str], name: str, surname: str) -> float:
+    """
+    Score a name against the lower-cased query words like similarity does,
+    with one minus the edit distance relative to the longer word.
+    """
+
+    def score(word: str, other: str) -> float:
+        other = other.lower()
+        return 1 - edit_distance(word, other) / max(len(word), len(other))
+
+    return sum(max(score(word, name), score(word, surname))
+               for word in words) / len(words)
+
+
+def _close_lengths(length: int) -> List[int]:
+    """
+    Get the lengths of the words that can be similar enough to a word of
+    the length by edit distance, the closest first.
+    """
+
+    shortest = math.ceil(length * FIND_MIN_EDIT_SIMILARITY)
+    longest = math.floor(length / FIND_MIN_EDIT_SIMILARITY)
+    return sorted(range(shortest, longest + 1), key=lambda other: abs(other - length))
+
+
+@timed('db.find_employees')
+def find_employees(text: str, limit: int) -> List[Tuple[EmployeeRecord, float]]:
+    """
+    Find employees by a name with typos. The trigram index returns the
+    names sharing any trigram with the text, which are reranked by
+    similarity. Returns (employee, similarity) pairs, best first.
+
+    A short name with a typo may share no trigram with the right one (jhon
+    and john), so when nothing is similar enough a bounded number of names
+    with the same initials and a close enough length are ranked by edit
+    distance instead.
+    """
+
+    words = text.lower().split()
+    if not words:
+        return []
+
+    query = [trigrams(word) for word in words]
+    grams = sorted(gram for word in query for gram in word if len(gram) == 3)
+    scored = []
+    if grams:
+        match = ' OR '.join('"{}"'.format(gram.replace('"', '""')) for gram in grams)
+        scored = [(names, similarity(query, *names))
+                  for names in fetch_similar_names(match, FIND_CANDIDATES)]
+        scored = [item for item in scored if item[1] >= FIND_MIN_SIMILARITY]
+
+    if not scored:
+        candidates = {}
+        for word in dict.fromkeys(words):
+            candidates.update(dict.fromkeys(fetch_names_by_initials(
+                word[0], _close_lengths(len(word)), FIND_EDIT_CANDIDATES)))
+        scored = [(names, edit_similarity(words, *names)) for names in candidates]
+        scored = [item for item in scored if item[1] >= FIND_MIN_EDIT_SIMILARITY]
+
+    # Stable, so equally similar names keep the order of the query
+    scored.sort(key=lambda item: -item[1])
+
+    results = []
+    for names, score in scored:
+        if len(results) >= limit:
+            break
+        results += [(employee, score) for employee in
+                    fetch_employees_with_names([names], limit - len(results))]
+    return results
+
+
+def take_employee(args: Sequence[str]) -> Tuple[EmployeeRecord, Sequence[str]]:
+    """
+    Resolve the employee given at the start of the arguments by an ID, a
+    name or surname, or a name followed by a surname. Returns the employee
+    and the remaining arguments.
+    """
+
+    if not args:
+        raise_wrong_number_of_arguments_error()
+
+    if args[0].isdigit():
+        employee = fetch_employee_by_id(int(args[0]))
+        if employee is None:
+            raise_incorrect_employee_id_error()
+        return employee, args[1:]
+
+    # A second word that can be a surname is tried as one first
+    if len(args) >= 2 and args[1].isalpha():
+        matches = fetch_employees_named(args[:2], AMBIGUOUS_SHOWN + 1)
+        if matches:
+            return _single(matches), args[2:]
+
+    matches = fetch_employees_named(args[:1], AMBIGUOUS_SHOWN + 1)
+    if matches:
+        return _single(matches), args[1:]
+
+    name = ' '.join(args[:2] if len(args) >= 2 and args[1].isalpha() else args[:1])
+    suggestions = find_employees(name, AMBIGUOUS_SHOWN)
+    if suggestions:
+        print('\nDid you mean:')
+        _print_candidates(employee for employee, _ in suggestions)
+    raise_employee_not_found_error()
+
+
+def _single(matches: List[EmployeeRecord]) -> EmployeeRecord:
+    if len(matches) == 1:
+        return matches[0]
+
+    print('\nMatching employees:')
+    _print_candidates(matches[:AMBIGUOUS_SHOWN])
+    if len(matches) > AMBIGUOUS_SHOWN:
+        print('    ...')
+    raise_ambiguous_employee_error()
+
+
+def _print_candidates(employees: Iterable[EmployeeRecord]) -> None:
+    for employee in employees:
+        print(f'    {employee.id:>6}  {employee.name} {employee.surname} '
+              f'({employee.major})')
@@ -1,14 +1,147 @@
-import readline
-from .cmd_parser import CommandParser, CmdCompleter, get_command_list, clear_screen
-from loguru import logger
+import sys
+import time
+import argparse
+from collections import Counter
+from contextlib import nullcontext
+from typing import Iterable, List, Optional
 
+from .cmd_parser import CommandParser, get_command_list, clear_screen
+from .log import logger, shutdown_logging
+from .database import db
+from .exceptions import SQLiteVersionError
+from .migrations import check_sqlite_version
+from .metrics import metrics, STATS_FILE
+from . import daemon
 
-def main() -> None:
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Organization Simulator CLI. Runs a single command given '
+                    'as arguments, an interactive shell or, with --script or '
+                    'a non-TTY stdin, a batch of commands.')
+    parser.add_argument('command', nargs=argparse.REMAINDER,
+                        help='command to run once, e.g. list --sort=name')
+    parser.add_argument('--script', metavar='FILE',
+                        help='run the commands from FILE, one per line')
+    parser.add_argument('--transaction', action='store_true',
+                        help='wrap the whole script in one database transaction')
+    parser.add_argument('--continue-on-error', action='store_true',
+                        help='keep running the script after a failed command')
+    parser.add_argument('--daemon', choices=('start', 'stop', 'status', 'run'),
+                        help='manage the background process that serves '
+                             'one-shot commands (run keeps it in the foreground)')
+    parser.add_argument('--socket', default=daemon.DEFAULT_SOCKET,
+                        help='Unix socket of the daemon (default: %(default)s)')
+    parser.add_argument('--stats', action='store_true',
+                        help='collect command latency statistics and write '
+                             f'them to {STATS_FILE} at exit')
+    parser.add_argument('--startup-profile', action='store_true',
+                        help='report the import time of every module at exit '
+                             '(handled by run.py before anything is imported)')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    The entry point: runs a script in batch mode or the interactive shell.
+    """
+
+    args = parse_arguments(argv)
+
+    # Every command needs the migrated database, so nothing can run at all
+    try:
+        check_sqlite_version()
+    except SQLiteVersionError as e:
+        sys.exit(f'ERROR: {e}')
+
+    if args.daemon is not None:
+        manage_daemon(args.daemon, args.socket)
+        return
+
+    if args.stats:
+        metrics.enabled = True
+
+    snapshots = None
+    if not args.command:
+        # Sessions and scripts may run long enough for snapshots to be due
+        from .journal import BackgroundSnapshots
+        snapshots = BackgroundSnapshots().start()
+
+    try:
+        if args.command:
+            succeeded = run_command(' '.join(args.command))
+        elif args.script is not None:
+            with open(args.script, encoding='utf-8') as file:
+                succeeded = run_script(file, args.transaction,
+                                       args.continue_on_error)
+        elif not sys.stdin.isatty():
+            succeeded = run_script(sys.stdin, args.transaction,
+                                   args.continue_on_error)
+        else:
+            run_interactive()
+            succeeded = True
+    finally:
+        if snapshots is not None:
+            snapshots.stop()
+        db.close()
+        metrics.export()
+        # Write out the records still queued for the background log writer
+        shutdown_logging()
+
+    if not succeeded:
+        sys.exit(1)
+
+
+def manage_daemon(action: str, socket_path: str) -> None:
+    """
+    Start, stop, check or run the daemon.
+    """
+
+    match action:
+        case 'start':
+            pid = daemon.start(socket_path)
+            print(f'Daemon has been started (pid {pid}) on {socket_path}')
+        case 'stop':
+            if daemon.stop(socket_path):
+                print('Daemon has been stopped')
+            else:
+                print('Daemon is not running')
+        case 'status':
+            if daemon.is_running(socket_path):
+                print(f'Daemon is running on {socket_path}')
+            else:
+                print('Daemon is not running')
+        case 'run':
+            daemon.serve(socket_path)
+
+
+def run_command(command_input: str) -> bool:
+    """
+    Execute a single command, reporting a failure to stderr. Returns True
+    if the command succeeded.
+    """
+
+    try:
+        CommandParser.parse(command_input)
+    except Exception as e:
+        logger.error(f'An error occurred: {str(e).capitalize()}')
+        print(f'ERROR: {str(e).capitalize()}', file=sys.stderr)
+        return False
+    return True
+
+
+def run_interactive() -> None:
     """
     The main function that reads the user input and processes the commands.
     """
 
-    readline.set_completer(CmdCompleter(get_command_list()).complete)
+    import readline
+    from .completion import CmdCompleter
+
+    completer = CmdCompleter(get_command_list(), lambda: db.connection)
+    readline.set_completer(completer.complete)
+    # Whole words are completed, options included (--sort=name)
+    readline.set_completer_delims(' \t\n')
     readline.parse_and_bind('tab: complete')
 
     while True:
@@ -32,5 +165,66 @@ def main() -> None:
             print('NOTE: To view the manual for a command, write: man <command>\n')
 
 
+def run_script(lines: Iterable[str],
+               single_transaction: bool = False,
+               continue_on_error: bool = False) -> bool:
+    """
+    Execute commands line by line without a prompt. Blank lines and lines
+    starting with # are skipped, exit stops the script. Returns True if
+    every command succeeded.
+    """
+
+    stats = Counter()
+    aborted_at = None
+    start = time.perf_counter()
+
+    # Inside a single transaction every command gets its own savepoint,
+    # so a failed command is rolled back without losing the others
+    def command_transaction():
+        return db.transaction() if single_transaction else nullcontext()
+
+    # Prompts of the commands would read the next line of the script
+    CommandParser.reading_stdin = lines is sys.stdin
+    try:
+        with command_transaction():
+            for number, line in enumerate(lines, start=1):
+                command_input = line.strip()
+                if not command_input or command_input.startswith('#'):
+                    continue
+                if command_input == 'exit':
+                    break
+
+                try:
+                    with command_transaction():
+                        CommandParser.parse(command_input)
+                except Exception as e:
+                    stats['failed'] += 1
+                    logger.error(f'An error occurred: {str(e).capitalize()}')
+                    print(f'ERROR (line {number}): {str(e).capitalize()}',
+                          file=sys.stderr)
+                    if not continue_on_error:
+                        aborted_at = number
+                        raise
+                else:
+                    stats['succeeded'] += 1
+    except Exception:
+        if aborted_at is None:
+            raise
+    finally:
+        CommandParser.reading_stdin = False
+
+    elapsed = time.perf_counter() - start
+    total = stats['succeeded'] + stats['failed']
+    print(f'\nExecuted {total:,} commands: {stats["succeeded"]:,} succeeded, '
+          f'{stats["failed"]:,} failed in {elapsed:.2f}s '
+          f'({total / max(elapsed, 1e-9):,.0f} commands/sec)', file=sys.stderr)
+    if aborted_at is not None:
+        rolled_back = ', all changes have been rolled back' if single_transaction else ''
+        print(f'Script aborted at line {aborted_at}{rolled_back}',
+              file=sys.stderr)
+
+    return stats['failed'] == 0
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import functools
+from collections import deque
+from collections.abc import Iterator
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Imported by the command parser at startup, so only the standard library
+# is used here.
+
+STATS_FILE = os.environ.get('ORGSIM_STATS_FILE', 'stats.json')
+# Number of latest samples per metric the percentiles are computed over
+WINDOW_SIZE = 1000
+PERCENTILES = (50, 95, 99)
+
+_NULL_TIMER = nullcontext()
+
+
+class Metric:
+    """
+    Call statistics of one timed operation.
+    """
+
+    __slots__ = ('calls', 'errors', 'rows', 'total', 'samples')
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total = 0.0
+        self.samples: deque = deque(maxlen=WINDOW_SIZE)
+
+    def add(self, elapsed: float, rows: Optional[int] = None,
+            failed: bool = False) -> None:
+        self.calls += 1
+        self.total += elapsed
+        self.samples.append(elapsed)
+        if rows is not None:
+            self.rows += rows
+        if failed:
+            self.errors += 1
+
+    def percentile(self, percentile: int) -> float:
+        """
+        Nearest-rank percentile of the latest samples, in seconds.
+        """
+
+        samples = sorted(self.samples)
+        rank = max(1, -(-percentile * len(samples) // 100))
+        return samples[rank - 1]
+
+    def summary(self) -> Dict[str, Any]:
+        result = {'calls': self.calls,
+                  'errors': self.errors,
+                  'rows': self.rows,
+                  'total_ms': round(self.total * 1000, 3),
+                  'mean_ms': round(self.total / self.calls * 1000, 3)}
+        for percentile in PERCENTILES:
+            result[f'p{percentile}_ms'] = round(
+                self.percentile(percentile) * 1000, 3)
+        return result
+
+
+class _Timer:
+    """
+    Context manager timing one block of code.
+    """
+
+    __slots__ = ('metric', 'start')
+
+    def __init__(self, metric: Metric) -> None:
+        self.metric = metric
+
+    def __enter__(self) -> '_Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, *_: Any) -> None:
+        self.metric.add(time.perf_counter() - self.start,
+                        failed=exc_type is not None)
+
+
+class Metrics:
+    """
+    In-memory registry of timings. While disabled, every hook costs a
+    single attribute check.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = os.environ.get('ORGSIM_STATS', '') not in ('', '0')
+        self.metrics: Dict[str, Metric] = {}
+
+    def get(self, name: str) -> Metric:
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = Metric()
+        return metric
+
+    def timer(self, name: str) -> Any:
+        """
+        Time a with block under the given name.
+        """
+
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self.get(name))
+
+    def timed(self, name: str) -> Callable:
+        """
+        Decorator timing every call of a function. The rows of a returned
+        list are counted. A returned iterator (a cursor or a generator) is
+        wrapped, so the time spent producing each row is counted as well.
+        """
+
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not self.enabled:
+                    return func(*args, **kwargs)
+
+                metric = self.get(name)
+                start = time.perf_counter()
+                try:
+                    result = func(*args, **kwargs)
+                except Exception:
+                    metric.add(time.perf_counter() - start, failed=True)
+                    raise
+                elapsed = time.perf_counter() - start
+
+                if isinstance(result, Iterator):
+                    return self.__timed_iter(metric, result, elapsed)
+                metric.add(elapsed, len(result)
+                           if isinstance(result, list) else None)
+                return result
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def __timed_iter(metric: Metric, rows: Iterable[Any],
+                     elapsed: float) -> Iterator:
+        """
+        Yield the rows, timing only the work done to produce them.
+        """
+
+        count = 0
+        failed = False
+        iterator = iter(rows)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    row = next(iterator)
+                except StopIteration:
+                    return
+                except Exception:
+                    failed = True
+                    raise
+                finally:
+                    elapsed += time.perf_counter() - start
+                count += 1
+                yield row
+        finally:
+            metric.add(elapsed, count, failed)
+
+    def reset(self) -> None:
+        self.metrics.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        # A metric is registered before its first call completes
+        return {name: metric.summary()
+                for name, metric in sorted(self.metrics.items())
+                if metric.calls}
+
+    def export(self, path: str = STATS_FILE) -> bool:
+        """
+        Write the collected statistics to a JSON file. Returns False if
+        nothing has been collected.
+        """
+
+        snapshot = self.snapshot()
+        if not snapshot:
+            return False
+
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'exported_at': datetime.now().isoformat(),
+                       'window_size': WINDOW_SIZE,
+                       'metrics': snapshot}, file, indent=4)
+        return True
+
+
+metrics = Metrics()
+timed = metrics.timed
@@ -0,0 +1,488 @@
+import os
+import re
+import sqlite3 as sql
+from typing import Callable, List, Tuple
+
+from .exceptions import raise_sqlite_version_error
+from .log import logger
+from .roles import ROLE_CODES
+
+# The oldest SQLite having everything the schema and the queries use: the
+# FTS5 trigram tokenizer (3.34) and ALTER TABLE DROP COLUMN (3.35)
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+
+# Where comments were kept as one {id}_{name}_{surname}.txt file per employee
+LEGACY_COMMENTS_DIR = 'organization_simulator_cli/comments'
+
+
+def _indexed_employees(con: sql.Connection) -> None:
+    """
+    Give employees an explicit INTEGER PRIMARY KEY (keeping the old rowids)
+    and index the identity tuple and the major column.
+    """
+
+    con.execute(""" CREATE TABLE IF NOT EXISTS employees (
+                        name TEXT,
+                        surname TEXT,
+                        age INTEGER,
+                        phone_number TEXT,
+                        bank_card_number TEXT,
+                        major TEXT) """)
+    con.execute(""" CREATE TABLE employees_new (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT,
+                        surname TEXT,
+                        age INTEGER,
+                        phone_number TEXT,
+                        bank_card_number TEXT,
+                        major TEXT) """)
+    con.execute(""" INSERT INTO employees_new
+                    SELECT rowid, name, surname, age, phone_number,
+                           bank_card_number, major
+                    FROM employees """)
+    con.execute(""" DROP TABLE employees """)
+    con.execute(""" ALTER TABLE employees_new RENAME TO employees """)
+
+    # The old check-then-insert could add the same employee twice, and the
+    # unique index cannot be built over such rows: they are merged into the
+    # first one, which gets their comments
+    duplicates = con.execute(""" SELECT e.id, first.id, e.name, e.surname
+                                  FROM employees AS e
+                                  JOIN (SELECT MIN(id) AS id, name, surname, age,
+                                               phone_number
+                                        FROM employees
+                                        GROUP BY name, surname, age, phone_number)
+                                  AS first USING (name, surname, age, phone_number)
+                                  WHERE e.id != first.id
+                                  ORDER BY e.id """).fetchall()
+    if duplicates:
+        _merge_comment_files(duplicates)
+        ids = [employee_id for employee_id, *_ in duplicates]
+        con.executemany('DELETE FROM employees WHERE id = ?',
+                        [(employee_id,) for employee_id in ids])
+        logger.warning(f'{len(ids)} duplicated employees have been merged into '
+                       f'the first ones with the same identity '
+                       f'(IDs {", ".join(map(str, ids))})')
+
+    con.execute(""" CREATE UNIQUE INDEX ux_employees_identity
+                    ON employees (name, surname, age, phone_number) """)
+    con.execute(""" CREATE INDEX ix_employees_major ON employees (major) """)
+
+
+def _merge_comment_files(duplicates: List[Tuple[int, int, str, str]]) -> None:
+    """
+    Append the comment file of every duplicated employee, given as
+    (id, id of the first one, name, surname), to the file of the first
+    one and remove it.
+    """
+
+    for duplicate_id, first_id, name, surname in duplicates:
+        path = os.path.join(LEGACY_COMMENTS_DIR, f'{duplicate_id}_{name}_{surname}.txt')
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding='utf-8') as file:
+            comment = file.read()
+        if comment:
+            first_path = os.path.join(LEGACY_COMMENTS_DIR,
+                                      f'{first_id}_{name}_{surname}.txt')
+            with open(first_path, 'a+', encoding='utf-8') as file:
+                file.seek(0)
+                separator = '\n' if file.read() else ''
+                file.write(separator + comment)
+        os.remove(path)
+
+
+def _comments_table(con: sql.Connection) -> None:
+    """
+    Move employee comments from per-employee text files into a table.
+    The old files are left untouched.
+    """
+
+    con.execute(""" CREATE TABLE comments (
+                        employee_id INTEGER PRIMARY KEY
+                            REFERENCES employees (id) ON DELETE CASCADE,
+                        body TEXT NOT NULL DEFAULT '') """)
+    con.execute(""" INSERT INTO comments (employee_id)
+                    SELECT id FROM employees """)
+
+    if not os.path.isdir(LEGACY_COMMENTS_DIR):
+        return
+
+    imported = 0
+    for entry in os.scandir(LEGACY_COMMENTS_DIR):
+        match = re.match(r'^(\d+)_.*\.txt$', entry.name)
+        if match is None:
+            continue
+        with open(entry.path, encoding='utf-8') as file:
+            body = file.read()
+        cur = con.execute(""" UPDATE comments SET body = ?
+                              WHERE employee_id = ? """,
+                          (body, int(match[1])))
+        imported += cur.rowcount
+
+    logger.info(f'{imported} comment files have been imported into the database')
+
+
+def _comments_search_index(con: sql.Connection) -> None:
+    """
+    Add an FTS5 index over comment bodies kept in sync by triggers.
+    """
+
+    con.execute(""" CREATE VIRTUAL TABLE comments_fts USING fts5 (
+                        body,
+                        content = 'comments',
+                        content_rowid = 'employee_id',
+                        tokenize = 'unicode61 remove_diacritics 2') """)
+    con.execute(""" CREATE TRIGGER comments_fts_insert AFTER INSERT ON comments
+                    BEGIN
+                        INSERT INTO comments_fts (rowid, body)
+                        VALUES (new.employee_id, new.body);
+                    END """)
+    con.execute(""" CREATE TRIGGER comments_fts_delete AFTER DELETE ON comments
+                    BEGIN
+                        INSERT INTO comments_fts (comments_fts, rowid, body)
+                        VALUES ('delete', old.employee_id, old.body);
+                    END """)
+    con.execute(""" CREATE TRIGGER comments_fts_update AFTER UPDATE OF body ON comments
+                    BEGIN
+                        INSERT INTO comments_fts (comments_fts, rowid, body)
+                        VALUES ('delete', old.employee_id, old.body);
+                        INSERT INTO comments_fts (rowid, body)
+                        VALUES (new.employee_id, new.body);
+                    END """)
+    con.execute(""" INSERT INTO comments_fts (comments_fts) VALUES ('rebuild') """)
+
+
+def _role_codes(con: sql.Connection) -> None:
+    """
+    Store the major column as a small integer code (see ROLE_CODES)
+    instead of the upper-cased role name.
+    """
+
+    con.execute(""" ALTER TABLE employees ADD COLUMN role_code INTEGER """)
+    con.executemany(""" UPDATE employees SET role_code = ?
+                        WHERE major = ? """,
+                    [(code, role.name) for role, code in ROLE_CODES.items()])
+    # A column cannot be dropped while an index uses it
+    con.execute(""" DROP INDEX ix_employees_major """)
+    con.execute(""" ALTER TABLE employees DROP COLUMN major """)
+    con.execute(""" ALTER TABLE employees RENAME COLUMN role_code TO major """)
+    con.execute(""" CREATE INDEX ix_employees_major ON employees (major) """)
+
+
+# Link employee X into the closure under manager M: every ancestor of M
+# (and M itself) becomes an ancestor of every node of X's subtree
+_LINK_SUBTREE = """
+    INSERT INTO employee_closure (ancestor_id, descendant_id, depth)
+    SELECT a.ancestor_id, d.descendant_id, a.depth + d.depth + 1
+    FROM (SELECT {manager} AS ancestor_id, 0 AS depth
+          UNION ALL
+          SELECT ancestor_id, depth FROM employee_closure
+          WHERE descendant_id = {manager}) AS a,
+         (SELECT {employee} AS descendant_id, 0 AS depth
+          UNION ALL
+          SELECT descendant_id, depth FROM employee_closure
+          WHERE ancestor_id = {employee}) AS d;"""
+
+# Detach X's subtree from all the former ancestors of X
+_UNLINK_SUBTREE = """
+    DELETE FROM employee_closure
+    WHERE descendant_id IN (SELECT {employee}
+                            UNION ALL
+                            SELECT descendant_id FROM employee_closure
+                            WHERE ancestor_id = {employee})
+    AND ancestor_id IN (SELECT ancestor_id FROM employee_closure
+                        WHERE descendant_id = {employee});"""
+
+
+def _reporting_hierarchy(con: sql.Connection) -> None:
+    """
+    Add the manager of every employee and a closure table of all
+    (ancestor, descendant, depth) pairs of the reporting tree. Triggers
+    keep the closure in sync, so subtree and chain lookups are plain
+    index range scans. Removing a manager moves the reports up to the
+    manager's own manager.
+    """
+
+    con.execute(""" CREATE TABLE reporting_lines (
+                        employee_id INTEGER PRIMARY KEY
+                            REFERENCES employees (id) ON DELETE CASCADE,
+                        manager_id INTEGER NOT NULL
+                            REFERENCES employees (id)) """)
+    con.execute(""" CREATE INDEX ix_reporting_lines_manager
+                    ON reporting_lines (manager_id) """)
+    con.execute(""" CREATE TABLE employee_closure (
+                        ancestor_id INTEGER NOT NULL,
+                        descendant_id INTEGER NOT NULL,
+                        depth INTEGER NOT NULL,
+                        PRIMARY KEY (ancestor_id, depth, descendant_id))
+                    WITHOUT ROWID """)
+    con.execute(""" CREATE INDEX ix_employee_closure_descendant
+                    ON employee_closure (descendant_id, depth) """)
+
+    link = _LINK_SUBTREE.format(employee='new.employee_id',
+                                manager='new.manager_id')
+    con.execute(f""" CREATE TRIGGER reporting_lines_insert
+                     AFTER INSERT ON reporting_lines
+                     BEGIN {link} END """)
+    con.execute(f""" CREATE TRIGGER reporting_lines_delete
+                     AFTER DELETE ON reporting_lines
+                     BEGIN {_UNLINK_SUBTREE.format(employee='old.employee_id')} END """)
+    con.execute(f""" CREATE TRIGGER reporting_lines_update
+                     AFTER UPDATE OF manager_id ON reporting_lines
+                     BEGIN
+                         {_UNLINK_SUBTREE.format(employee='old.employee_id')}
+                         {link}
+                     END """)
+    con.execute(""" CREATE TRIGGER employees_reassign_reports
+                    BEFORE DELETE ON employees
+                    BEGIN
+                        DELETE FROM reporting_lines
+                        WHERE manager_id = old.id
+                        AND NOT EXISTS (SELECT 1 FROM reporting_lines
+                                        WHERE employee_id = old.id);
+                        UPDATE reporting_lines
+                        SET manager_id = (SELECT manager_id FROM reporting_lines
+                                          WHERE employee_id = old.id)
+                        WHERE manager_id = old.id;
+                        DELETE FROM reporting_lines WHERE employee_id = old.id;
+                    END """)
+
+
+def _names_search_index(con: sql.Connection) -> None:
+    """
+    Add the distinct (name, surname) pairs of employees with the number
+    of employees having each, and an FTS5 trigram index over them, all
+    kept in sync by triggers. Namesakes share one entry, so a fuzzy search
+    ranks every name once however many employees have it.
+    """
+
+    con.execute(""" CREATE TABLE employee_names (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        surname TEXT NOT NULL,
+                        employees INTEGER NOT NULL,
+                        UNIQUE (name, surname)) """)
+    con.execute(""" CREATE VIRTUAL TABLE employee_names_fts USING fts5 (
+                        name,
+                        surname,
+                        content = 'employee_names',
+                        content_rowid = 'id',
+                        tokenize = 'trigram') """)
+
+    con.execute(""" CREATE TRIGGER employee_names_insert AFTER INSERT ON employees
+                    BEGIN
+                        INSERT INTO employee_names (name, surname, employees)
+                        VALUES (new.name, new.surname, 1)
+                        ON CONFLICT (name, surname)
+                        DO UPDATE SET employees = employees + 1;
+                    END """)
+    con.execute(""" CREATE TRIGGER employee_names_delete AFTER DELETE ON employees
+                    BEGIN
+                        UPDATE employee_names SET employees = employees - 1
+                        WHERE name = old.name AND surname = old.surname;
+                        DELETE FROM employee_names
+                        WHERE name = old.name AND surname = old.surname
+                        AND employees = 0;
+                    END """)
+    con.execute(""" CREATE TRIGGER employee_names_update
+                    AFTER UPDATE OF name, surname ON employees
+                    BEGIN
+                        UPDATE employee_names SET employees = employees - 1
+                        WHERE name = old.name AND surname = old.surname;
+                        DELETE FROM employee_names
+                        WHERE name = old.name AND surname = old.surname
+                        AND employees = 0;
+                        INSERT INTO employee_names (name, surname, employees)
+                        VALUES (new.name, new.surname, 1)
+                        ON CONFLICT (name, surname)
+                        DO UPDATE SET employees = employees + 1;
+                    END """)
+
+    # Only new and vanished names change the index, not the counts
+    con.execute(""" CREATE TRIGGER employee_names_fts_insert AFTER INSERT ON employee_names
+                    BEGIN
+                        INSERT INTO employee_names_fts (rowid, name, surname)
+                        VALUES (new.id, new.name, new.surname);
+                    END """)
+    con.execute(""" CREATE TRIGGER employee_names_fts_delete AFTER DELETE ON employee_names
+                    BEGIN
+                        INSERT INTO employee_names_fts (employee_names_fts, rowid,
+                                                        name, surname)
+                        VALUES ('delete', old.id, old.name, old.surname);
+                    END """)
+
+    # The names close to a short misspelled word are read as a range of
+    # the same initial and a similar length instead of a scan
+    con.execute(""" CREATE INDEX ix_employee_names_name_length
+                    ON employee_names (lower(substr(name, 1, 1)), length(name)) """)
+    con.execute(""" CREATE INDEX ix_employee_names_surname_length
+                    ON employee_names (lower(substr(surname, 1, 1)), length(surname)) """)
+
+    con.execute(""" INSERT INTO employee_names (name, surname, employees)
+                    SELECT name, surname, COUNT(*) FROM employees
+                    GROUP BY name, surname """)
+
+
+def _payments_ledger(con: sql.Connection) -> None:
+    """
+    Add an append-only ledger of salary payments, at most one per employee
+    and month, with running totals per employee and year, per role and
+    per month and role kept up to date by a trigger. Reports read the
+    totals and never scan the ledger. Payments of a removed employee stay
+    in the ledger without the employee ID, and are linked to the employee
+    again (and added back to their totals) when the removal is undone.
+    """
+
+    con.execute(""" CREATE TABLE payments (
+                        id INTEGER PRIMARY KEY,
+                        employee_id INTEGER
+                            REFERENCES employees (id) ON DELETE SET NULL,
+                        role INTEGER NOT NULL,
+                        period TEXT NOT NULL,
+                        amount INTEGER NOT NULL,
+                        paid_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE (employee_id, period)) """)
+    con.execute(""" CREATE TABLE payment_totals_by_employee (
+                        employee_id INTEGER NOT NULL
+                            REFERENCES employees (id) ON DELETE CASCADE,
+                        year INTEGER NOT NULL,
+                        payments INTEGER NOT NULL,
+                        total INTEGER NOT NULL,
+                        PRIMARY KEY (employee_id, year))
+                    WITHOUT ROWID """)
+    con.execute(""" CREATE TABLE payment_totals_by_role (
+                        role INTEGER PRIMARY KEY,
+                        payments INTEGER NOT NULL,
+                        total INTEGER NOT NULL) """)
+    con.execute(""" CREATE TABLE payment_totals_by_period (
+                        period TEXT NOT NULL,
+                        role INTEGER NOT NULL,
+                        payments INTEGER NOT NULL,
+                        total INTEGER NOT NULL,
+                        PRIMARY KEY (period, role))
+                    WITHOUT ROWID """)
+
+    con.execute(""" CREATE TRIGGER payments_totals AFTER INSERT ON payments
+                    BEGIN
+                        INSERT INTO payment_totals_by_employee
+                        VALUES (new.employee_id,
+                                CAST(substr(new.period, 1, 4) AS INTEGER),
+                                1, new.amount)
+                        ON CONFLICT (employee_id, year) DO UPDATE
+                        SET payments = payments + 1, total = total + excluded.total;
+                        INSERT INTO payment_totals_by_role
+                        VALUES (new.role, 1, new.amount)
+                        ON CONFLICT (role) DO UPDATE
+                        SET payments = payments + 1, total = total + excluded.total;
+                        INSERT INTO payment_totals_by_period
+                        VALUES (new.period, new.role, 1, new.amount)
+                        ON CONFLICT (period, role) DO UPDATE
+                        SET payments = payments + 1, total = total + excluded.total;
+                    END """)
+    con.execute(""" CREATE TRIGGER payments_relinked_totals
+                    AFTER UPDATE OF employee_id ON payments
+                    WHEN old.employee_id IS NULL AND new.employee_id IS NOT NULL
+                    BEGIN
+                        INSERT INTO payment_totals_by_employee
+                        VALUES (new.employee_id,
+                                CAST(substr(new.period, 1, 4) AS INTEGER),
+                                1, new.amount)
+                        ON CONFLICT (employee_id, year) DO UPDATE
+                        SET payments = payments + 1, total = total + excluded.total;
+                    END """)
+    # Only the removal of an employee and its undoing may touch a payment,
+    # by clearing its employee ID and setting it again. A payment never
+    # moves between two employees.
+    con.execute(""" CREATE TRIGGER payments_append_only_update
+                    BEFORE UPDATE ON payments
+                    WHEN (new.employee_id IS NOT NULL AND old.employee_id IS NOT NULL)
+                    OR new.id IS NOT old.id
+                    OR new.role IS NOT old.role
+                    OR new.period IS NOT old.period
+                    OR new.amount IS NOT old.amount
+                    OR new.paid_at IS NOT old.paid_at
+                    BEGIN
+                        SELECT RAISE(ABORT, 'payments cannot be changed');
+                    END """)
+    con.execute(""" CREATE TRIGGER payments_append_only_delete
+                    BEFORE DELETE ON payments
+                    BEGIN
+                        SELECT RAISE(ABORT, 'payments cannot be deleted');
+                    END """)
+
+
+def _operations_journal(con: sql.Connection) -> None:
+    """
+    Add an append-only journal of the changes made to employees and their
+    comments. Undoing or redoing a change appends the reverse change,
+    pointing at the entry it reverts, so entries are never rewritten.
+    """
+
+    con.execute(""" CREATE TABLE journal (
+                        id INTEGER PRIMARY KEY,
+                        kind TEXT NOT NULL,
+                        action TEXT NOT NULL,
+                        employee_id INTEGER NOT NULL,
+                        data TEXT NOT NULL,
+                        reverts INTEGER,
+                        made_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP) """)
+    con.execute(""" CREATE INDEX ix_journal_reverts ON journal (reverts)
+                    WHERE reverts IS NOT NULL """)
+    con.execute(""" CREATE INDEX ix_journal_kind ON journal (kind, id) """)
+
+
+# Schema version N is reached by applying MIGRATIONS[N - 1]. Never edit or
+# reorder the entries, only append new ones.
+MIGRATIONS: List[Callable[[sql.Connection], None]] = [
+    _indexed_employees,
+    _comments_table,
+    _comments_search_index,
+    _role_codes,
+    _reporting_hierarchy,
+    _names_search_index,
+    _payments_ledger,
+    _operations_journal,
+]
+
+
+def check_sqlite_version() -> None:
+    """
+    Raise SQLiteVersionError if the SQLite library Python is linked with
+    is older than MIN_SQLITE_VERSION.
+    """
+
+    if sql.sqlite_version_info < MIN_SQLITE_VERSION:
+        raise_sqlite_version_error(sql.sqlite_version,
+                                   '.'.join(map(str, MIN_SQLITE_VERSION)))
+
+
+def get_schema_version(con: sql.Connection) -> int:
+    return con.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(con: sql.Connection) -> None:
+    """
+    Bring the database up to the latest schema version in place.
+
+    Every migration runs in its own transaction together with the
+    user_version bump, so an interrupted upgrade is simply retried
+    on the next start.
+    """
+
+    check_sqlite_version()
+    while get_schema_version(con) < len(MIGRATIONS):
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have migrated while we waited for the lock
+            version = get_schema_version(con)
+            if version < len(MIGRATIONS):
+                MIGRATIONS[version](con)
+                con.execute(f'PRAGMA user_version = {version + 1}')
+        except BaseException:
+            con.execute('ROLLBACK')
+            raise
+        con.execute('COMMIT')
+        logger.info(
+            f'Database schema has been migrated to version {get_schema_version(con)}')
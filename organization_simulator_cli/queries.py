@@ -0,0 +1,147 @@
+from typing import Any, Iterable, List, Optional, Tuple
+
+from .constants import SORT_PARAMS
+from .roles import Role
+from .exceptions import raise_incorrect_flag_error
+
+EMPLOYEE_COLUMNS = ('id', 'name', 'surname', 'age',
+                    'phone_number', 'bank_card_number', 'major')
+INTEGER_COLUMNS = ('id', 'age')
+
+# Two-character operators go first so that '>=' is not read as '>'
+WHERE_OPERATORS = ('>=', '<=', '!=', '=', '>', '<', '~')
+
+
+class EmployeeQuery:
+    """
+    Builder of a single parameterized SELECT over the employees table.
+
+    Only whitelisted column names ever reach the SQL text, every value
+    is passed as a parameter.
+    """
+
+    def __init__(self) -> None:
+        self._conditions: List[str] = []
+        self._params: List[Any] = []
+        self._roles: List[Role] = []
+        self._order = 'id'
+        self._limit: Optional[int] = None
+        self._offset: Optional[int] = None
+
+    def with_roles(self, roles: Iterable[Role]) -> 'EmployeeQuery':
+        for role in roles:
+            if role not in self._roles:
+                self._roles.append(role)
+        return self
+
+    def where(self, expression: str) -> 'EmployeeQuery':
+        """
+        Add a condition written as <column><operator><value>, e.g. age>=30
+        or name~ad. The ~ operator is a case-insensitive substring match.
+        """
+
+        for operator in WHERE_OPERATORS:
+            column, found, value = expression.partition(operator)
+            if found:
+                break
+        else:
+            raise_incorrect_flag_error()
+
+        column = column.lower()
+        if column not in EMPLOYEE_COLUMNS or not value:
+            raise_incorrect_flag_error()
+
+        if column == 'major':
+            return self.__where_major(operator, value.upper())
+
+        if operator == '~':
+            self._conditions.append(f'{column} LIKE ?')
+            self._params.append(f'%{value}%')
+            return self
+
+        self._conditions.append(f'{column} {operator} ?')
+        self._params.append(self.__normalize_value(column, value))
+        return self
+
+    def __where_major(self, operator: str, value: str) -> 'EmployeeQuery':
+        """
+        Roles are stored as codes, so a role condition is turned into a
+        list of matching codes.
+        """
+
+        if operator == '~':
+            roles = [role for role in Role if value in role.name]
+        elif operator in ('=', '!=') and hasattr(Role, value):
+            roles = [role for role in Role
+                     if (role.name == value) == (operator == '=')]
+        else:
+            raise_incorrect_flag_error()
+
+        placeholders = ', '.join('?' * len(roles))
+        self._conditions.append(f'major IN ({placeholders})')
+        self._params.extend(role.code for role in roles)
+        return self
+
+    def order_by(self, column: str) -> 'EmployeeQuery':
+        if column not in SORT_PARAMS:
+            raise_incorrect_flag_error()
+        self._order = column
+        return self
+
+    def limit(self, limit: int) -> 'EmployeeQuery':
+        if limit < 0:
+            raise_incorrect_flag_error()
+        self._limit = limit
+        return self
+
+    def offset(self, offset: int) -> 'EmployeeQuery':
+        if offset < 0:
+            raise_incorrect_flag_error()
+        self._offset = offset
+        return self
+
+    def build(self, columns: str = '*',
+              joins: str = '') -> Tuple[str, List[Any]]:
+        """
+        Get the SQL text and its parameters. Other columns and joined
+        tables can be selected, as long as they do not shadow the
+        columns of employees.
+        """
+
+        conditions = list(self._conditions)
+        params = list(self._params)
+
+        if self._roles:
+            placeholders = ', '.join('?' * len(self._roles))
+            conditions.append(f'major IN ({placeholders})')
+            params.extend(role.code for role in self._roles)
+
+        query = f'SELECT {columns} FROM employees {joins}'.rstrip()
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+
+        query += f' ORDER BY {self._order}'
+        if self._order != 'id':
+            query += ', id'
+
+        if self._limit is not None or self._offset is not None:
+            query += ' LIMIT ? OFFSET ?'
+            params.append(-1 if self._limit is None else self._limit)
+            params.append(self._offset or 0)
+
+        return query, params
+
+    @staticmethod
+    def __normalize_value(column: str, value: str) -> Any:
+        """
+        Bring a raw value to the form it is stored in the database.
+        """
+
+        if column in INTEGER_COLUMNS:
+            try:
+                return int(value)
+            except ValueError:
+                raise_incorrect_flag_error()
+        if column in ('name', 'surname'):
+            return value.capitalize()
+        return value
@@ -0,0 +1,78 @@
+import csv
+import json
+import sys
+from typing import Any, Iterable, List, Optional, Sequence, TextIO, Tuple
+
+from .queries import EMPLOYEE_COLUMNS
+from .metrics import timed
+
+EMPLOYEE_HEADERS = ('ID', 'Name', 'Surname', 'Age',
+                    'Phone Number', 'Bank Card Number', 'Major')
+
+LIST_FORMATS = ('table', 'stream', 'tsv', 'csv', 'jsonl')
+
+
+@timed('render.print_employees_table')
+def print_employees_table(employees: List[Tuple[Any, ...]]) -> None:
+    import prettytable
+
+    table = prettytable.PrettyTable()
+    table.field_names = list(EMPLOYEE_HEADERS)
+
+    for employee in employees:
+        table.add_row([*employee])
+
+    print('\n' + table.get_string() + '\n')
+
+
+@timed('render.stream_employees_table')
+def stream_employees_table(employees: Iterable[Tuple[Any, ...]],
+                           widths: Sequence[int],
+                           out: Optional[TextIO] = None) -> None:
+    """
+    Print employees as a bordered table row by row, as they come from the
+    cursor. Column widths are known up front, so nothing is buffered.
+    """
+
+    out = out or sys.stdout
+    widths = [max(width or 0, len(header))
+              for width, header in zip(widths, EMPLOYEE_HEADERS)]
+    border = '+' + '+'.join('-' * (width + 2) for width in widths) + '+\n'
+
+    def format_row(row: Iterable[Any]) -> str:
+        cells = (f' {str(value).center(width)} '
+                 for value, width in zip(row, widths))
+        return '|' + '|'.join(cells) + '|\n'
+
+    out.write('\n' + border + format_row(EMPLOYEE_HEADERS) + border)
+    for employee in employees:
+        out.write(format_row(employee))
+    out.write(border + '\n')
+
+
+@timed('render.write_employees_delimited')
+def write_employees_delimited(employees: Iterable[Tuple[Any, ...]],
+                              delimiter: str,
+                              out: Optional[TextIO] = None) -> None:
+    """
+    Write employees as CSV/TSV with a header row.
+    """
+
+    writer = csv.writer(out or sys.stdout, delimiter=delimiter,
+                        lineterminator='\n')
+    writer.writerow(EMPLOYEE_COLUMNS)
+    writer.writerows(employees)
+
+
+@timed('render.write_employees_jsonl')
+def write_employees_jsonl(employees: Iterable[Tuple[Any, ...]],
+                          out: Optional[TextIO] = None) -> None:
+    """
+    Write employees as one JSON object per line.
+    """
+
+    out = out or sys.stdout
+    for employee in employees:
+        # default=str writes the role by its name
+        out.write(json.dumps(dict(zip(EMPLOYEE_COLUMNS, employee)),
+                             ensure_ascii=False, default=str) + '\n')
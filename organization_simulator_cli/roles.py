@@ -1,5 +1,7 @@
 import enum
+from typing import NamedTuple, Optional
 from .constants import BASE_SALARY, SalaryCoefficients
+from .exceptions import raise_unknown_role_error
 
 
 class Role(enum.Enum):
@@ -9,8 +11,68 @@ class Role(enum.Enum):
     RECRUITER = 'Recruiter'
     ACCOUNTANT = 'Accountant'
 
+    def __str__(self) -> str:
+        return self.name
+
+    @property
+    def code(self) -> int:
+        """
+        The small integer the role is stored as in the database.
+        """
+
+        return ROLE_CODES[self]
+
+    @staticmethod
+    def from_code(code: int) -> Optional['Role']:
+        return ROLES_BY_CODE.get(code)
+
+    @staticmethod
+    def from_flag(flag: str) -> Optional['Role']:
+        """
+        Get the role of a role flag without its dash (b for -b).
+        """
+
+        return ROLES_BY_FLAG.get(flag)
+
+
+# Stored in the database, so existing codes must never change
+ROLE_CODES = {
+    Role.FRONTENDER: 1,
+    Role.BACKENDER: 2,
+    Role.TEAM_LEADER: 3,
+    Role.RECRUITER: 4,
+    Role.ACCOUNTANT: 5,
+}
+ROLES_BY_CODE = {code: role for role, code in ROLE_CODES.items()}
+
+# The role flags of ROLES_FLAGS taken by the commands
+ROLES_BY_FLAG = {
+    'f': Role.FRONTENDER,
+    'b': Role.BACKENDER,
+    't': Role.TEAM_LEADER,
+    'r': Role.RECRUITER,
+    'a': Role.ACCOUNTANT,
+}
+
+
+class EmployeeRecord(NamedTuple):
+    """
+    A row of the employees table with the role decoded from its code.
+    """
+
+    id: int
+    name: str
+    surname: str
+    age: int
+    phone_number: str
+    bank_card_number: str
+    major: Optional[Role]
+
 
 class Employee:
+    __slots__ = ('name', 'surname', 'age', 'phone_number',
+                 'bank_card_number', 'major')
+
     def __init__(self, name: str,
                  surname: str,
                  age: int,
@@ -32,35 +94,62 @@ class Employee:
 
 
 class Accountant(Employee):
+    __slots__ = ()
+
     @staticmethod
-    def calculate_salary(employee: tuple) -> int:
-        coefficient = getattr(SalaryCoefficients, employee[-1])
+    def calculate_salary(employee: EmployeeRecord) -> int:
+        return Accountant.salary_for_role(employee.major)
+
+    @staticmethod
+    def salary_for_role(role: Optional[Role]) -> int:
+        # Legacy rows with a major unknown to ROLE_CODES have no role
+        if role is None:
+            return 0
+        coefficient = getattr(SalaryCoefficients, role.name)
         total_salary = BASE_SALARY * coefficient
         return int(total_salary)
 
     @staticmethod
-    def pay_salary(employee: Employee) -> None:
-        pass
+    def pay_salary(employee: EmployeeRecord, period: str) -> bool:
+        """
+        Record the salary of the employee for the period ('YYYY-MM') in the
+        payments ledger. Returns False if it has already been paid.
+        """
+
+        from .db_funcs import record_payment
+
+        if employee.major is None:
+            raise_unknown_role_error()
+        return record_payment(employee.id, employee.major, period,
+                              Accountant.calculate_salary(employee))
 
 
 class FrontendDeveloper(Employee):
+    __slots__ = ()
+
     def develop_frontend(self) -> None:
         # Разработка frontend
         pass
 
 
 class BackendDeveloper(Employee):
+    __slots__ = ()
+
     def develop_backend(self) -> None:
         # Разработка backend
         pass
 
 
 class TeamLead(Employee):
+    __slots__ = ()
+
     def manage_team(self) -> None:
         # Управление командой
         pass
 
 
 class Recruiter(Employee):
+    __slots__ = ()
+
     def hire_employee(self, new_employee: Employee) -> None:
         pass
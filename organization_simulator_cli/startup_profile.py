@@ -0,0 +1,88 @@
+import sys
+import atexit
+import time
+from importlib.abc import MetaPathFinder
+from typing import Any, List, Tuple
+
+# Only the standard library modules above are imported here, so that
+# everything imported after install() shows up in the report.
+
+
+class _TimedLoader:
+    """
+    Wrapper of a module loader that measures how long the module body
+    takes to execute, with and without the modules it imports itself.
+    """
+
+    def __init__(self, loader: Any, profiler: 'ImportProfiler') -> None:
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._loader, name)
+
+    def create_module(self, spec: Any) -> Any:
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module: Any) -> None:
+        stack = self._profiler.stack
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            cumulative = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += cumulative
+            self._profiler.records.append(
+                (module.__name__, cumulative - nested, cumulative))
+
+
+class ImportProfiler(MetaPathFinder):
+    """
+    Meta path finder that wraps the loader found by the other finders.
+    """
+
+    def __init__(self) -> None:
+        self.stack: List[float] = []
+        self.records: List[Tuple[str, float, float]] = []
+        self.start = time.perf_counter()
+
+    def find_spec(self, fullname: str, path: Any, target: Any = None) -> Any:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def report(self, limit: int = 25) -> None:
+        """
+        Print the slowest imports to stderr.
+        """
+
+        total = time.perf_counter() - self.start
+        imported = sum(self_time for _, self_time, _ in self.records)
+        print(f'\nStartup profile: {len(self.records)} modules imported in '
+              f'{imported * 1000:.1f} ms ({total * 1000:.1f} ms since start)',
+              file=sys.stderr)
+        print(f'{"self ms":>9} {"total ms":>9}  module', file=sys.stderr)
+        for name, self_time, cumulative in sorted(
+                self.records, key=lambda record: record[2], reverse=True)[:limit]:
+            print(f'{self_time * 1000:9.2f} {cumulative * 1000:9.2f}  {name}',
+                  file=sys.stderr)
+
+
+def install() -> ImportProfiler:
+    """
+    Start timing every following import and report the results at exit.
+    """
+
+    profiler = ImportProfiler()
+    sys.meta_path.insert(0, profiler)
+    atexit.register(profiler.report)
+    return profiler
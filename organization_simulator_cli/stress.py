@@ -0,0 +1,351 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+from collections import Counter
+from contextlib import redirect_stdout
+from typing import Any, List, Optional, Tuple
+
+from .benchmark import generate_company, NAMES, SURNAMES, COMMENT_WORDS
+from .cache import employee_cache
+from .database import db, set_database_path
+from .db_funcs import (insert_into_db, remove_employee_by_id,
+                       fetch_employee_by_id, fetch_employees)
+from .emp_comments import read_comment, set_comment
+from .exceptions import (IncorrectEmployeeIdError, NothingToUndoError,
+                         NothingToRedoError, UndoConflictError)
+from .journal import undo, redo, replay_journal
+from .log import logger, shutdown_logging
+from .queries import EmployeeQuery
+from .roles import Accountant, Employee, Role
+
+# Identities are drawn from a small pool, so that processes keep trying
+# to add the same employee at the same time
+IDENTITY_POOL = 500
+
+# Months the salaries are paid for
+PAID_MONTHS = 3
+
+
+def _worker(path: str, seed: int, operations: int,
+            write_ratio: float, start: Any) -> Counter:
+    """
+    Run a random mix of reads and writes in a separate process and count
+    the outcomes. A failure other than a lost race is counted as an error.
+    The operations start when every worker has waited for the start
+    barrier. Returns the counters.
+    """
+
+    set_database_path(path)
+    rng = random.Random(seed)
+    counters = Counter()
+    devnull = open(os.devnull, 'w')
+
+    # Connecting and importing loguru are left out of the timed run
+    db.connection
+    logger.debug(f'Stress worker {seed} is ready')
+    start.wait()
+
+    for _ in range(operations):
+        # Every operation stands for a command (see CommandParser.parse)
+        employee_cache.expire()
+        max_id = db.connection.execute(
+            'SELECT COALESCE(MAX(id), 1) FROM employees').fetchone()[0]
+        employee_id = rng.randint(1, max_id)
+
+        try:
+            if rng.random() >= write_ratio:
+                match rng.randrange(3):
+                    case 0:
+                        fetch_employee_by_id(employee_id)
+                    case 1:
+                        read_comment(employee_id)
+                    case 2:
+                        fetch_employees(EmployeeQuery()
+                                        .order_by('surname').limit(20))
+                counters['reads'] += 1
+                continue
+
+            match rng.randrange(5):
+                case 0:
+                    number = rng.randrange(IDENTITY_POOL)
+                    employee = Employee(NAMES[number % len(NAMES)],
+                                        SURNAMES[number // len(NAMES) % len(SURNAMES)],
+                                        20 + number % 7,
+                                        f'+1{number:010d}',
+                                        '0000-0000-0000-0000',
+                                        rng.choice(list(Role)))
+                    with redirect_stdout(devnull):
+                        added = insert_into_db(employee)
+                    counters['added' if added else 'duplicates'] += 1
+                case 1:
+                    removed = remove_employee_by_id(employee_id)
+                    counters['removed' if removed else 'missing'] += 1
+                case 2:
+                    set_comment(employee_id,
+                                ' '.join(rng.sample(COMMENT_WORDS, 4)))
+                    counters['commented'] += 1
+                case 3:
+                    employee = fetch_employee_by_id(employee_id)
+                    if employee is None:
+                        counters['missing'] += 1
+                        continue
+                    # Few periods, so that the same salary is paid twice
+                    period = f'2020-{rng.randint(1, PAID_MONTHS):02d}'
+                    paid = Accountant.pay_salary(employee, period)
+                    counters['paid' if paid else 'paid twice'] += 1
+                case 4:
+                    # The latest change may be another process's, so the
+                    # counts follow what the undone or redone entry did
+                    if rng.random() < 0.5:
+                        entry = undo()
+                        counters['undone'] += 1
+                        added = entry.action == 'delete'
+                    else:
+                        entry = redo()
+                        counters['redone'] += 1
+                        added = entry.action == 'insert'
+                    if entry.action in ('insert', 'delete'):
+                        counters['added' if added else 'removed'] += 1
+        except IncorrectEmployeeIdError:
+            counters['missing'] += 1
+        except (NothingToUndoError, NothingToRedoError, UndoConflictError):
+            counters['conflicts'] += 1
+        except Exception as e:
+            counters['errors'] += 1
+            counters[f'error: {e}'] += 1
+
+    devnull.close()
+    db.close()
+    shutdown_logging()
+    return counters
+
+
+def check_invariants(expected_employees: int) -> List[str]:
+    """
+    Check the database after a run. Returns the violated invariants.
+    """
+
+    con = db.connection
+    violations = []
+
+    def count(sql_query: str) -> int:
+        return con.execute(sql_query).fetchone()[0]
+
+    employees = count('SELECT COUNT(*) FROM employees')
+    if employees != expected_employees:
+        violations.append(f'{employees} employees instead of '
+                          f'{expected_employees} (added - removed)')
+
+    duplicates = count(""" SELECT COUNT(*) FROM (
+                               SELECT 1 FROM employees
+                               GROUP BY name, surname, age, phone_number
+                               HAVING COUNT(*) > 1) """)
+    if duplicates:
+        violations.append(f'{duplicates} duplicated employees')
+
+    without_comment = count(""" SELECT COUNT(*) FROM employees
+                                WHERE id NOT IN (SELECT employee_id FROM comments) """)
+    if without_comment:
+        violations.append(f'{without_comment} employees without a comment')
+
+    if con.execute('PRAGMA foreign_key_check').fetchall():
+        violations.append('comments of removed employees remain')
+
+    # The closure table must hold exactly the reporting lines walked
+    # recursively (both sides have unique rows, so counts and one
+    # difference are enough)
+    missing_links, expected_links = con.execute(
+        """ WITH RECURSIVE chain (ancestor_id, descendant_id, depth) AS (
+                SELECT manager_id, employee_id, 1 FROM reporting_lines
+                UNION ALL
+                SELECT r.manager_id, chain.descendant_id, chain.depth + 1
+                FROM chain JOIN reporting_lines AS r
+                ON r.employee_id = chain.ancestor_id)
+            SELECT (SELECT COUNT(*) FROM (SELECT * FROM chain
+                                          EXCEPT
+                                          SELECT * FROM employee_closure)),
+                   (SELECT COUNT(*) FROM chain) """).fetchone()
+    if missing_links or expected_links != count('SELECT COUNT(*) FROM employee_closure'):
+        violations.append('reporting hierarchy closure is out of sync')
+
+    integrity = con.execute('PRAGMA integrity_check').fetchone()[0]
+    if integrity != 'ok':
+        violations.append(f'integrity check failed: {integrity}')
+
+    stale_names = count(""" SELECT COUNT(*) FROM (
+                                SELECT name, surname, COUNT(*) FROM employees
+                                GROUP BY name, surname
+                                EXCEPT
+                                SELECT name, surname, employees FROM employee_names) """)
+    if stale_names or count('SELECT COUNT(*) FROM employee_names') != count(
+            'SELECT COUNT(*) FROM (SELECT 1 FROM employees GROUP BY name, surname)'):
+        violations.append('employee names are out of sync')
+
+    # The running totals must equal the ledger summed up (both ways, as
+    # a missing or extra total is as wrong as a different one)
+    for table, ledger in (
+            ('payment_totals_by_employee',
+             """ SELECT employee_id, CAST(substr(period, 1, 4) AS INTEGER),
+                        COUNT(*), SUM(amount)
+                 FROM payments WHERE employee_id IS NOT NULL
+                 GROUP BY 1, 2 """),
+            ('payment_totals_by_role',
+             'SELECT role, COUNT(*), SUM(amount) FROM payments GROUP BY role'),
+            ('payment_totals_by_period',
+             """ SELECT period, role, COUNT(*), SUM(amount) FROM payments
+                 GROUP BY period, role """)):
+        if count(f""" SELECT (SELECT COUNT(*) FROM (
+                                  SELECT * FROM ({ledger}) EXCEPT SELECT * FROM {table}))
+                           + (SELECT COUNT(*) FROM (
+                                  SELECT * FROM {table} EXCEPT SELECT * FROM ({ledger})))
+                      """):
+            violations.append(f'{table} is out of sync with the payments')
+
+    # A payment detached by a removal belongs to the employee the removal
+    # journaled it for, if that employee has been brought back since (the
+    # latest insert or delete of the ID is an undo or a redo)
+    paid_twice = count(""" WITH detached AS (
+                               SELECT payment.value AS payment_id, d.employee_id,
+                                      MAX(d.id) AS removed_by
+                               FROM journal AS d, json_each(d.data, '$[9]') AS payment
+                               WHERE d.action = 'delete'
+                               GROUP BY payment.value),
+                           owners AS (
+                               SELECT p.period, COALESCE(p.employee_id, (
+                                   SELECT detached.employee_id FROM detached
+                                   WHERE detached.payment_id = p.id
+                                   AND (SELECT kind FROM journal AS r
+                                        WHERE r.employee_id = detached.employee_id
+                                        AND r.action IN ('insert', 'delete')
+                                        AND r.id > detached.removed_by
+                                        ORDER BY r.id DESC LIMIT 1) IN ('undo', 'redo')
+                               )) AS employee_id
+                               FROM payments AS p)
+                           SELECT COUNT(*) FROM (
+                               SELECT 1 FROM owners WHERE employee_id IS NOT NULL
+                               GROUP BY employee_id, period HAVING COUNT(*) > 1) """)
+    if paid_twice:
+        violations.append(f'{paid_twice} salaries paid twice for the same month')
+
+    for index, description in (('comments_fts', 'comment search index'),
+                               ('employee_names_fts', 'name search index')):
+        try:
+            con.execute(f""" INSERT INTO {index} ({index})
+                             VALUES ('integrity-check') """)
+        except Exception as e:
+            violations.append(f'{description} is out of sync: {e}')
+
+    # Replaying the journal over the latest snapshot must rebuild the
+    # same employees and payments
+    replayed = os.path.abspath('replayed.db')
+    replay_journal(replayed)
+    con.execute('ATTACH DATABASE ? AS replayed', (replayed,))
+    try:
+        for table in ('employees', 'comments', 'reporting_lines', 'employee_closure',
+                      'payments', 'payment_totals_by_employee',
+                      'payment_totals_by_role', 'payment_totals_by_period'):
+            if count(f""" SELECT (SELECT COUNT(*) FROM (
+                                      SELECT * FROM main.{table}
+                                      EXCEPT SELECT * FROM replayed.{table}))
+                               + (SELECT COUNT(*) FROM (
+                                      SELECT * FROM replayed.{table}
+                                      EXCEPT SELECT * FROM main.{table})) """):
+                violations.append(f'{table} differs after replaying the journal')
+    finally:
+        con.execute('DETACH DATABASE replayed')
+        os.remove(replayed)
+
+    return violations
+
+
+def run_stress(processes: int, operations: int, write_ratio: float,
+               size: int, seed: int) -> Tuple[float, Counter, List[str]]:
+    """
+    Run the workers against a fresh database in the current directory.
+    Returns the elapsed time, the summed counters and the violations.
+    """
+
+    path = os.path.abspath(f'stress-{processes}.db')
+    set_database_path(path)
+    generate_company(size, seed)
+    # Connections must not be inherited by the worker processes
+    db.close()
+
+    # Process startup is left out: the time runs from the moment every
+    # worker is ready until the last one is done
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager, context.Pool(processes) as pool:
+        start = manager.Barrier(processes + 1)
+        results = pool.starmap_async(
+            _worker,
+            [(path, seed + number, operations, write_ratio, start)
+             for number in range(processes)])
+        start.wait()
+        started_at = time.perf_counter()
+        results = results.get()
+        elapsed = time.perf_counter() - started_at
+
+    counters = sum(results, Counter())
+    violations = check_invariants(size + counters['added'] - counters['removed'])
+    if counters['errors']:
+        violations.append(f'{counters["errors"]} operations failed')
+    db.close()
+    return elapsed, counters, violations
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Run concurrent readers and writers against a '
+                    'temporary database and check its invariants.')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='process counts to run (default: %(default)s)')
+    parser.add_argument('--operations', type=int, default=500,
+                        help='operations per process (default: %(default)s)')
+    parser.add_argument('--write-ratio', type=float, default=0.3,
+                        help='share of writes (default: %(default)s)')
+    parser.add_argument('--size', type=int, default=1000,
+                        help='initial number of employees (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_arguments(argv)
+    failed = False
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='orgsim-stress-') as directory:
+        os.chdir(directory)
+        try:
+            print(f'{"processes":>9} {"ops/sec":>10} {"reads":>7} {"added":>6} '
+                  f'{"dupes":>6} {"removed":>7} {"missing":>7}  result')
+            for processes in args.processes:
+                elapsed, counters, violations = run_stress(
+                    processes, args.operations, args.write_ratio,
+                    args.size, args.seed)
+                total = processes * args.operations
+                print(f'{processes:>9} {total / elapsed:>10,.0f} '
+                      f'{counters["reads"]:>7} {counters["added"]:>6} '
+                      f'{counters["duplicates"]:>6} {counters["removed"]:>7} '
+                      f'{counters["missing"]:>7}  '
+                      f'{"ok" if not violations else "FAILED"}')
+                for violation in violations:
+                    print(f'    {violation}')
+                for name, value in counters.items():
+                    if name.startswith('error: '):
+                        print(f'    {value} x {name[7:]}')
+                failed = failed or bool(violations)
+        finally:
+            shutdown_logging()
+            os.chdir(cwd)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
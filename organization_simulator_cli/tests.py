@@ -0,0 +1,754 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import zipfile
+import sqlite3 as sql
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from organization_simulator_cli.cache import employee_cache
+from organization_simulator_cli.database import db, set_database_path
+from organization_simulator_cli.db_funcs import (fetch_employee_by_id, fetch_employees,
+                                                 insert_into_db,
+                                                 insert_employees_in_batches,
+                                                 remove_employee_by_id, assign_manager,
+                                                 fetch_team_summary, fetch_reports,
+                                                 fetch_management_chain, pay_all,
+                                                 fetch_employee_payments,
+                                                 fetch_employee_payment_totals)
+from organization_simulator_cli import daemon
+from organization_simulator_cli.cmd_parser import Command, CommandParser, get_command_list
+from organization_simulator_cli.completion import CmdCompleter
+from organization_simulator_cli.emp_comments import (read_comment, search_comments,
+                                                   set_comment)
+from organization_simulator_cli.exporters import iter_columnar
+from organization_simulator_cli.exceptions import (IncorrectFlagError,
+                                                   ReportingCycleError, UnknownRoleError,
+                                                   raise_incorrect_arguments_error)
+from organization_simulator_cli.journal import (BackgroundSnapshots, list_snapshots,
+                                                take_snapshot, replay_journal,
+                                                undo, redo)
+from organization_simulator_cli.commands.logs import LogsCommand
+from organization_simulator_cli.log import (BackgroundFileSink, flush_logs, logger,
+                                            shutdown_logging)
+from organization_simulator_cli.log_reader import (LevelIndex, LogQuery, last_logs,
+                                                   list_archives, parse_time,
+                                                   search_logs)
+from organization_simulator_cli.lookup import edit_distance, find_employees
+from organization_simulator_cli.main import main, run_command, run_script
+from organization_simulator_cli.metrics import Metric, Metrics
+from organization_simulator_cli.migrations import (LEGACY_COMMENTS_DIR, MIGRATIONS,
+                                                   get_schema_version)
+from organization_simulator_cli.queries import EmployeeQuery
+from organization_simulator_cli.roles import Accountant, Employee, Role
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Tables rebuilt by replaying the journal
+REPLAYED_TABLES = ('employees', 'comments', 'reporting_lines',
+                   'employee_closure', 'employee_names', 'journal')
+
+# The schema of company.db before the first migration
+BASELINE_SCHEMA = """ CREATE TABLE employees (
+                          name TEXT,
+                          surname TEXT,
+                          age INTEGER,
+                          phone_number TEXT,
+                          bank_card_number TEXT,
+                          major TEXT) """
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """
+    Point the shared connection manager at a fresh database in a
+    temporary directory, which is also where the logs are written.
+    """
+
+    monkeypatch.chdir(tmp_path)
+    set_database_path(str(tmp_path / 'company.db'))
+    employee_cache.clear()
+    yield tmp_path / 'company.db'
+    db.close()
+    shutdown_logging()
+    employee_cache.clear()
+
+
+def add_employee(name: str, surname: str, number: int,
+                 role: Role = Role.BACKENDER, age: int = 30) -> None:
+    assert insert_into_db(Employee(name, surname, age, f'+1{number:010d}',
+                                   '0000-0000-0000-0000', role))
+
+
+def create_baseline(path, rows) -> None:
+    con = sql.connect(path)
+    con.execute(BASELINE_SCHEMA)
+    con.executemany('INSERT INTO employees VALUES (?, ?, ?, ?, ?, ?)', rows)
+    con.commit()
+    con.close()
+
+
+def test_migration_merges_duplicated_employees(database):
+    vadim = ('Vadim', 'Karavashkin', 18, '+79656939578',
+             '1234-2345-4343-4343', 'BACKENDER')
+    danil = ('Danil', 'Platonov', 21, '+79875932475',
+             '2361-5489-0901-3482', 'FRONTENDER')
+    create_baseline(database, [vadim, danil, vadim, vadim])
+    comments = database.parent / LEGACY_COMMENTS_DIR
+    comments.mkdir(parents=True)
+    (comments / '1_Vadim_Karavashkin.txt').write_text('First', encoding='utf-8')
+    (comments / '3_Vadim_Karavashkin.txt').write_text('Second', encoding='utf-8')
+    (comments / '4_Vadim_Karavashkin.txt').write_text('', encoding='utf-8')
+
+    con = db.connection
+    assert get_schema_version(con) == len(MIGRATIONS)
+    assert con.execute('SELECT id, name FROM employees ORDER BY id').fetchall() == [
+        (1, 'Vadim'), (2, 'Danil')]
+    assert read_comment(1) == 'First\nSecond'
+    assert read_comment(2) == ''
+    assert sorted(path.name for path in comments.iterdir()) == ['1_Vadim_Karavashkin.txt']
+
+    flush_logs()
+    log = (database.parent / 'logs' / 'app.log').read_text(encoding='utf-8')
+    assert ('2 duplicated employees have been merged into the first ones '
+            'with the same identity (IDs 3, 4)') in log
+
+
+def test_an_old_sqlite_is_refused_before_running_anything(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sql, 'sqlite_version', '3.31.1')
+    monkeypatch.setattr(sql, 'sqlite_version_info', (3, 31, 1))
+
+    with pytest.raises(SystemExit) as exit_info:
+        main(['list'])
+    assert str(exit_info.value) == ('ERROR: SQLite 3.31.1 is too old, '
+                                    'version 3.35.0 or newer is required!')
+    assert not (tmp_path / 'company.db').exists()
+
+
+def test_undoing_a_removal_links_the_payments_again(database):
+    add_employee('Ann', 'Lee', 1)
+    assert Accountant.pay_salary(fetch_employee_by_id(1), '2026-01')
+    assert remove_employee_by_id(1)
+    undo()
+
+    ann = fetch_employee_by_id(1)
+    assert not Accountant.pay_salary(ann, '2026-01')
+    assert [period for period, _, _ in fetch_employee_payments(1)] == ['2026-01']
+    assert fetch_employee_payment_totals(1) == [(2026, 1, 971)]
+
+    redo()
+    assert fetch_employee_payment_totals(1) == []
+    assert db.connection.execute(
+        'SELECT employee_id FROM payments').fetchall() == [(None,)]
+
+
+def test_background_snapshots_are_taken_every_interval(database):
+    snapshots = BackgroundSnapshots(interval=3)
+    # The first one is the baseline
+    assert snapshots.check() is not None
+    add_employee('Ann', 'Lee', 1)
+    add_employee('Bob', 'Ray', 2)
+    assert snapshots.check() is None
+    add_employee('Eve', 'Fox', 3)
+    assert snapshots.check()[0] == 3
+    assert [entry_id for entry_id, _ in list_snapshots()] == [0, 3]
+
+
+def dump(con: sql.Connection, tables=REPLAYED_TABLES) -> dict:
+    return {table: con.execute(f'SELECT * FROM {table} ORDER BY 1, 2').fetchall()
+            for table in tables}
+
+
+def test_migrating_the_baseline_database(database):
+    shutil.copy(os.path.join(REPOSITORY, 'company.db'), database)
+    shutil.copytree(os.path.join(REPOSITORY, 'organization_simulator_cli', 'comments'),
+                    database.parent / 'organization_simulator_cli' / 'comments')
+
+    con = db.connection
+    assert get_schema_version(con) == len(MIGRATIONS)
+    assert con.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    assert con.execute('PRAGMA foreign_key_check').fetchall() == []
+
+    vadim, danil = fetch_employee_by_id(1), fetch_employee_by_id(2)
+    assert (vadim.name, vadim.surname, vadim.major) == ('Vadim', 'Karavashkin',
+                                                        Role.BACKENDER)
+    assert danil.major == Role.FRONTENDER
+    with open(os.path.join(REPOSITORY, 'organization_simulator_cli', 'comments',
+                           '1_Vadim_Karavashkin.txt'), encoding='utf-8') as file:
+        assert read_comment(1) == file.read()
+    assert [employee.id for employee, _ in find_employees('karavashkn', 5)] == [1]
+
+
+def test_undo_redo_and_replay_round_trip(database, tmp_path):
+    add_employee('Ann', 'Lee', 1)
+    take_snapshot()
+    states = {}
+
+    def step(change) -> None:
+        change()
+        con = db.connection
+        states[con.execute('SELECT MAX(id) FROM journal').fetchone()[0]] = dump(con)
+
+    step(lambda: add_employee('Bob', 'Ray', 2))
+    step(lambda: add_employee('Eve', 'Fox', 3))
+    step(lambda: assign_manager(2, 1))
+    step(lambda: assign_manager(3, 2))
+    step(lambda: set_comment(2, 'mentor'))
+    before_removal = dump(db.connection, REPLAYED_TABLES[:4])
+    step(lambda: remove_employee_by_id(2))
+    # Removing Bob moved Eve up to Ann, undoing it moves her back
+    assert db.connection.execute(
+        'SELECT manager_id FROM reporting_lines WHERE employee_id = 3').fetchone() == (1,)
+    step(undo)
+    assert dump(db.connection, REPLAYED_TABLES[:4]) == before_removal
+    step(undo)
+    step(redo)
+    step(lambda: set_comment(3, 'remote'))
+
+    for until, state in states.items():
+        path = str(tmp_path / f'replayed-{until}.db')
+        assert replay_journal(path, until)[0] == 1
+        replayed = sql.connect(path)
+        assert dump(replayed) == state, f'replayed until entry {until}'
+        replayed.close()
+
+
+def test_payment_totals_match_the_ledger(database):
+    for number, role in enumerate(Role):
+        add_employee(role.name.capitalize(), 'Smith', number, role)
+    pay_all('2025-12', [])
+    pay_all('2026-01', [Role.BACKENDER, Role.ACCOUNTANT])
+    pay_all('2026-01', [])
+    assert Accountant.pay_salary(fetch_employee_by_id(1), '2026-02')
+    remove_employee_by_id(2)
+    remove_employee_by_id(3)
+    undo()
+
+    con = db.connection
+    for table, ledger in (
+            ('payment_totals_by_employee',
+             """ SELECT employee_id, CAST(substr(period, 1, 4) AS INTEGER),
+                        COUNT(*), SUM(amount)
+                 FROM payments WHERE employee_id IS NOT NULL
+                 GROUP BY 1, 2 """),
+            ('payment_totals_by_role',
+             'SELECT role, COUNT(*), SUM(amount) FROM payments GROUP BY role'),
+            ('payment_totals_by_period',
+             """ SELECT period, role, COUNT(*), SUM(amount) FROM payments
+                 GROUP BY period, role """)):
+        assert sorted(con.execute(f'SELECT * FROM {table}').fetchall()) == sorted(
+            con.execute(ledger).fetchall()), table
+
+    assert con.execute('SELECT COUNT(*) FROM payments').fetchone()[0] == 11
+    assert con.execute(""" SELECT COUNT(*) FROM payments
+                           WHERE employee_id IS NULL """).fetchone()[0] == 2
+    with pytest.raises(sql.IntegrityError):
+        with db.transaction() as con:
+            con.execute('UPDATE payments SET amount = 0')
+
+
+def test_employees_of_an_unknown_role_are_not_paid(database):
+    add_employee('Ann', 'Lee', 1)
+    add_employee('Bob', 'Ray', 2)
+    # Migrating a legacy row with an unknown major leaves it without a role
+    with db.transaction() as con:
+        con.execute('UPDATE employees SET major = NULL WHERE id = 2')
+    unknown = fetch_employee_by_id(2)
+
+    assert Accountant.calculate_salary(unknown) == 0
+    with pytest.raises(UnknownRoleError):
+        Accountant.pay_salary(unknown, '2026-01')
+    assert [(role, payments) for role, payments, _ in pay_all('2026-01', [])] == [
+        (Role.BACKENDER, 1)]
+
+
+def test_replay_keeps_the_payments_made_after_a_snapshot(database, tmp_path):
+    add_employee('Ann', 'Lee', 1)
+    add_employee('Bob', 'Ray', 2, Role.ACCOUNTANT)
+    take_snapshot()
+    assert Accountant.pay_salary(fetch_employee_by_id(1), '2026-01')
+    pay_all('2026-02', [])
+    remove_employee_by_id(2)
+    undo()
+    # A payment is never undone, the removal before it is
+    assert undo().action == 'insert'
+
+    tables = ('payments', 'payment_totals_by_employee',
+              'payment_totals_by_role', 'payment_totals_by_period')
+    path = str(tmp_path / 'replayed.db')
+    replay_journal(path)
+    replayed = sql.connect(path)
+    assert dump(replayed, tables) == dump(db.connection, tables)
+    replayed.close()
+
+
+def test_import_skips_invalid_rows_and_duplicates(database, tmp_path, capsys):
+    add_employee('Dan', 'Cole', 4, Role.RECRUITER, 40)
+    (tmp_path / 'staff.csv').write_text(
+        'name,surname,age,phone_number,bank_card_number,major\n'
+        'Ann,Lee,30,+10000000001,0000,backender\n'
+        'Bob,Ray,old,+10000000002,0000,backender\n'
+        'Eve,Fox,28,+10000000003,0000,wizard\n'
+        'Dan,Cole,40,+10000000004,0000,recruiter\n'
+        'Ann,Lee,30,+10000000001,0000,backender\n'
+        'Ben,Fox,33,+10000000005,0000,accountant\n', encoding='utf-8')
+
+    # Batches of two put the duplicate of Ann in the next batch
+    CommandParser.parse('import staff.csv --batch=2')
+    report = capsys.readouterr().out
+    assert 'Rows read: 6\n' in report and 'Inserted: 2\n' in report
+    assert 'Skipped (duplicates): 2\n' in report and 'Skipped (invalid): 2\n' in report
+    assert [(employee.id, employee.name) for employee in fetch_employees(
+        EmployeeQuery())] == [(1, 'Dan'), (2, 'Ann'), (3, 'Ben')]
+    assert read_comment(3) == ''
+
+    for batch in ('abc', '0', ''):
+        with pytest.raises(IncorrectFlagError):
+            CommandParser.parse(f'import staff.csv --batch={batch}')
+
+
+def test_employee_query_filters_orders_and_pages(database):
+    add_employee('Dan', 'Lee', 1, Role.FRONTENDER, 41)
+    add_employee('Ann', 'Ray', 2, Role.BACKENDER, 25)
+    add_employee('Ben', 'Fox', 3, Role.RECRUITER, 33)
+    add_employee('Nina', 'Cole', 4, Role.BACKENDER, 30)
+    add_employee('Eve', 'Dunn', 5, Role.TEAM_LEADER, 52)
+
+    query = (EmployeeQuery().where('age>=30').where('name~N')
+             .where('major!=backender').order_by('age'))
+    assert [employee.name for employee in fetch_employees(query)] == ['Ben', 'Dan']
+
+    query = EmployeeQuery().with_roles([Role.BACKENDER]).where('surname=ray')
+    assert [employee.id for employee in fetch_employees(query)] == [2]
+
+    query = EmployeeQuery().order_by('name').limit(2).offset(1)
+    assert [employee.name for employee in fetch_employees(query)] == ['Ben', 'Dan']
+    assert query.build() == ('SELECT * FROM employees ORDER BY name, id '
+                             'LIMIT ? OFFSET ?', [2, 1])
+
+    # Values never reach the SQL text
+    assert EmployeeQuery().where("surname=x' OR 1 --").build()[1] == ["X' or 1 --"]
+    for expression in ('salary>1', 'age>old', 'major>BACKENDER', 'age'):
+        with pytest.raises(IncorrectFlagError):
+            EmployeeQuery().where(expression)
+    with pytest.raises(IncorrectFlagError):
+        EmployeeQuery().order_by('phone_number')
+
+
+def test_columnar_export_reads_back_like_jsonl(database, tmp_path, monkeypatch):
+    from organization_simulator_cli.commands import employees
+    # Several row groups, the last one shorter
+    monkeypatch.setattr(employees, 'EXPORT_CHUNK_SIZE', 2)
+    for number in range(5):
+        add_employee(f'Ann{"a" * number}', 'Lee', number,
+                     Role.BACKENDER if number % 2 else Role.ACCOUNTANT, 20 + number)
+    set_comment(2, 'Говорит по-русски, 100% remote')
+
+    CommandParser.parse('export staff.col.gz --comments --salary --sort=age')
+    CommandParser.parse('export staff.jsonl --comments --salary --sort=age')
+
+    with open(tmp_path / 'staff.jsonl', encoding='utf-8') as file:
+        expected = [json.loads(line) for line in file]
+    with gzip.open(tmp_path / 'staff.col.gz', 'rb') as file:
+        assert list(iter_columnar(file)) == expected
+    assert len(expected) == 5 and expected[1]['comment'].startswith('Говорит')
+
+    with open(tmp_path / 'staff.jsonl', 'rb') as file:
+        with pytest.raises(ValueError):
+            next(iter_columnar(file))
+
+
+def test_reporting_lines_keep_the_closure_and_refuse_cycles(database):
+    for number in range(1, 4):
+        add_employee(f'Ann{"a" * number}', 'Lee', number)
+    assign_manager(2, 1)
+    assign_manager(3, 2)
+
+    salary = Accountant.salary_for_role(Role.BACKENDER)
+    assert fetch_team_summary(1) == (1, 2, 2 * salary, 2)
+    assert [employee.id for employee in fetch_reports(1, None)] == [2, 3]
+    assert [employee.id for employee in fetch_management_chain(3)] == [2, 1]
+
+    with pytest.raises(ReportingCycleError):
+        assign_manager(1, 3)
+    with pytest.raises(ReportingCycleError):
+        assign_manager(2, 2)
+
+    # The reports move along with their manager
+    assign_manager(2, None)
+    assert fetch_team_summary(1) == (0, 0, 0, 0)
+    assert [employee.id for employee in fetch_management_chain(3)] == [2]
+
+
+def test_list_streams_a_table_as_wide_as_its_longest_values(database, capsys):
+    add_employee('Ann', 'Lee', 1)
+    add_employee('Bob', 'Montgomery-Wallace', 2, Role.TEAM_LEADER, 41)
+
+    CommandParser.parse('list --format=stream')
+    lines = capsys.readouterr().out.strip().split('\n')
+    assert len(lines) == 6 and len({len(line) for line in lines}) == 1
+    # Every column is as wide as its longest value or header
+    assert lines[0] == '+----+------+--------------------+-----+--------------+' \
+                       '---------------------+-------------+'
+    assert lines[4] == ('| 2  | Bob  | Montgomery-wallace |  41 | +10000000002 '
+                        '| 0000-0000-0000-0000 | TEAM_LEADER |')
+
+    CommandParser.parse('list --format=tsv -b')
+    assert capsys.readouterr().out.split('\n') == [
+        'id\tname\tsurname\tage\tphone_number\tbank_card_number\tmajor',
+        '1\tAnn\tLee\t30\t+10000000001\t0000-0000-0000-0000\tBACKENDER', '']
+
+
+def test_level_index_is_extended_and_rebuilt_after_rotation(tmp_path):
+    log = tmp_path / 'app.log'
+    index = LevelIndex(str(log), str(tmp_path / '.index'))
+
+    def write(mode: str, *records: str) -> None:
+        with open(log, mode, encoding='utf-8') as file:
+            file.writelines(f'2026-01-0{i + 1}T10:00:00.000000+0000 | {record}\n'
+                            for i, record in enumerate(records))
+
+    write('w', 'INFO | one', 'ERROR | two', 'INFO | three')
+    with open(log, 'a', encoding='utf-8') as file:
+        file.write('Traceback (most recent call last):\n')
+    assert [line[-3:] for line in index.last_records('INFO')] == ['one', 'ree']
+
+    # Only the appended lines are indexed, a partial line is left for later
+    size = json.loads((tmp_path / '.index' / 'meta.json').read_text())['size']
+    assert size == log.stat().st_size
+    write('a', 'INFO | four')
+    with open(log, 'a', encoding='utf-8') as file:
+        file.write('2026-01-05T10:00:00.000000+0000 | INFO | fi')
+    assert [line[-4:] for line in index.last_records('INFO', 2)] == ['hree', 'four']
+    with open(log, 'a', encoding='utf-8') as file:
+        file.write('ve\n')
+    assert list(index.last_records('INFO', 1))[0].endswith('five')
+    assert list(index.last_records('ERROR'))[0].endswith('two')
+
+    # A rotated log starts with other bytes, so the index is rebuilt
+    write('w', 'WARNING | six', 'INFO | seven')
+    assert [line[-5:] for line in index.last_records('INFO')] == ['seven']
+    assert list(index.last_records('ERROR')) == []
+    assert not list(tmp_path.glob('.index/*.tmp'))
+
+
+def test_parse_time_reads_the_offset_of_loguru():
+    # Written as loguru does, which fromisoformat cannot read before 3.11
+    time = parse_time('2026-01-31T23:59:58.123456+0300 | INFO | Paid')
+    assert time == datetime(2026, 1, 31, 20, 59, 58, 123456, tzinfo=timezone.utc)
+    assert parse_time('Traceback (most recent call last):') is None
+
+
+def test_last_logs_read_back_through_the_zip_archives(tmp_path):
+    log_path = tmp_path / 'app.log'
+
+    def archive(started_at: str, *records: str) -> None:
+        name = f'app.{started_at}.log'
+        with zipfile.ZipFile(tmp_path / f'{name}.zip', 'w') as file:
+            file.writestr(name, ''.join(f'{record}\n' for record in records))
+
+    archive('2026-01-01_10-00-00_000000',
+            '2026-01-01T10:00:00.000000+0000 | INFO | one',
+            '2026-01-01T11:00:00.000000+0000 | ERROR | two')
+    archive('2026-01-02_10-00-00_000000',
+            '2026-01-02T10:00:00.000000+0000 | INFO | three')
+    log_path.write_text('2026-01-03T10:00:00.000000+0000 | INFO | four\n'
+                        '2026-01-03T11:00:00.000000+0000 | WARNING | five\n')
+    (tmp_path / 'app.not-a-time.log.zip').write_bytes(b'')
+
+    assert [start.day for start, _ in list_archives(str(log_path))] == [1, 2]
+
+    def messages(lines) -> list:
+        return [line.rsplit(' | ', 1)[1] for line in lines]
+
+    assert messages(last_logs(LogQuery(), 4, str(log_path))) == [
+        'two', 'three', 'four', 'five']
+    assert messages(last_logs(LogQuery('INFO'), 10, str(log_path))) == [
+        'one', 'three', 'four']
+    # The current log is indexed next to it
+    assert (tmp_path / '.index' / 'INFO.idx').exists()
+    until = datetime(2026, 1, 2, 12, tzinfo=timezone.utc)
+    assert messages(last_logs(LogQuery(until=until), 2, str(log_path))) == [
+        'two', 'three']
+    since = datetime(2026, 1, 1, 10, 30, tzinfo=timezone.utc)
+    assert messages(search_logs(LogQuery('INFO', since=since), str(log_path))) == [
+        'three', 'four']
+
+
+def test_search_comments_by_word_prefixes(database):
+    add_employee('Ann', 'Lee', 1)
+    add_employee('Bob', 'Ray', 2)
+    add_employee('Eve', 'Fox', 3)
+    set_comment(1, 'Works remotely from Lisbon')
+    set_comment(2, 'Remote contractor, prefers "async" reviews')
+    set_comment(3, 'Office manager')
+
+    assert sorted(row[0] for row in search_comments('remote', 10)) == [1, 2]
+    ((employee_id, name, surname, snippet),) = search_comments('lisb rem', 10)
+    assert (employee_id, name, surname) == (1, 'Ann', 'Lee')
+    assert '[Lisbon]' in snippet and '[remotely]' in snippet
+    assert len(search_comments('remote', 1)) == 1
+
+    # Operators and quotes of FTS5 are searched as text
+    assert [row[0] for row in search_comments('"async', 10)] == [2]
+    assert search_comments('office NOT manager', 10) == []
+
+    set_comment(1, 'On leave')
+    remove_employee_by_id(3)
+    assert [row[0] for row in search_comments('remote', 10)] == [2]
+    assert search_comments('office', 10) == []
+
+
+def test_edit_distance_counts_swaps_as_one_edit():
+    assert edit_distance('jhon', 'john') == 1
+    assert edit_distance('jon', 'john') == 1
+    assert edit_distance('', 'ann') == 3
+
+
+def test_find_short_misspelled_names(database):
+    add_employee('John', 'Smith', 1)
+    add_employee('Maria', 'Ivanova', 2)
+
+    # No trigram of jhon is in john
+    results = find_employees('jhon', 5)
+    assert [employee.name for employee, _ in results] == ['John']
+    assert find_employees('zzz', 5) == []
+
+
+def test_set_comment_does_not_read_the_next_script_line(database, monkeypatch):
+    add_employee('Ann', 'Lee', 1)
+    script = io.StringIO('set_comment 1\nset_comment Ann remote\n')
+    monkeypatch.setattr(sys, 'stdin', script)
+
+    assert not run_script(script, continue_on_error=True)
+    assert read_comment(1) == 'remote'
+
+
+def test_set_comment_reads_a_piped_comment(database, monkeypatch):
+    add_employee('Ann', 'Lee', 1)
+    monkeypatch.setattr(sys, 'stdin', io.StringIO('remote\n'))
+
+    CommandParser.parse('set_comment 1')
+    assert read_comment(1) == 'remote'
+
+
+def test_script_in_one_transaction_rolls_back_only_the_failed_line(database,
+                                                                   monkeypatch):
+    class HireAndFailCommand(Command):
+        @staticmethod
+        def execute(*args: str) -> None:
+            # Committed on its own, then undone by the savepoint of the line
+            add_employee('Ann', 'Lee', 1)
+            raise_incorrect_arguments_error()
+
+    monkeypatch.setitem(CommandParser.COMMANDS, 'hire_and_fail', HireAndFailCommand)
+    script = ['add Bob Ray 30 +10000000002 0000 backender',
+              'hire_and_fail',
+              'add Eve Fox 28 +10000000003 0000 frontender']
+
+    def names():
+        return [employee.name for employee in fetch_employees(EmployeeQuery())]
+
+    assert not run_script(script, single_transaction=True, continue_on_error=True)
+    assert names() == ['Bob', 'Eve']
+    assert db.connection.execute('SELECT COUNT(*) FROM journal').fetchone()[0] == 2
+
+    # Without --continue-on-error the first failure rolls the whole script back
+    script[0] = 'add Dan Cole 40 +10000000004 0000 recruiter'
+    assert not run_script(script, single_transaction=True)
+    assert names() == ['Bob', 'Eve']
+
+
+def test_commands_and_logging_are_loaded_lazily(tmp_path):
+    # A fresh interpreter, as the modules of this one are all imported
+    script = ('import sys\n'
+              'from organization_simulator_cli.main import main\n'
+              "main(['help'])\n"
+              "print(sorted(name for name in sys.modules if name.startswith("
+              "('organization_simulator_cli.commands.', 'loguru', 'prettytable'))))\n")
+    result = subprocess.run([sys.executable, '-c', script], cwd=tmp_path,
+                            env={**os.environ, 'PYTHONPATH': REPOSITORY},
+                            capture_output=True, text=True, check=True)
+    help_text, modules = result.stdout.rsplit('\n', 2)[:2]
+    assert modules == "['organization_simulator_cli.commands.general']"
+    assert '- game - To play a game (not available yet).' in help_text
+    assert '- stats - To show how long commands and their steps take.' in help_text
+    assert not (tmp_path / 'logs').exists()
+
+    assert CommandParser.get_command('payroll').__name__ == 'PayrollCommand'
+    assert 'organization_simulator_cli.commands.salary' in sys.modules
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='needs Unix sockets')
+def test_forwarded_commands_stream_their_output(database, monkeypatch, capsys):
+    add_employee('Ann', 'Lee', 1)
+    # More than one chunk of output
+    insert_employees_in_batches(
+        (Employee(f'Name{number}', 'Smith', 30, f'+2{number:010d}', '0000',
+                  Role.BACKENDER) for number in range(2000)), 500)
+    monkeypatch.setenv('PYTHONPATH', REPOSITORY)
+    socket_path = 'orgsim.sock'
+    daemon.start(socket_path)
+    try:
+        monkeypatch.setattr(sys, 'stdin', io.StringIO('remote\n'))
+        assert daemon.forward_to_daemon(['set_comment', '1'], socket_path) == 0
+        assert 'Enter a comment' in capsys.readouterr().out
+        assert read_comment(1) == 'remote'
+
+        replies = []
+
+        def loads(message: bytes) -> dict:
+            replies.append(json.loads(message))
+            return replies[-1]
+
+        monkeypatch.setattr(daemon, 'json', SimpleNamespace(dumps=json.dumps,
+                                                            loads=loads))
+        assert daemon.forward_to_daemon(['list', '--format=tsv'], socket_path) == 0
+        forwarded = capsys.readouterr().out
+        # Sent as it was written, not collected until the command ended
+        assert len(replies) > 1 and len(replies[0]['stdout']) >= daemon.OUTPUT_CHUNK
+        assert 'status' not in replies[0]
+
+        assert daemon.forward_to_daemon(['remove', '9999'], socket_path) == 1
+        assert capsys.readouterr().err.startswith('ERROR: ')
+    finally:
+        assert daemon.stop(socket_path)
+
+    assert run_command('list --format=tsv')
+    assert capsys.readouterr().out == forwarded
+
+
+def test_logs_of_a_fresh_checkout_are_empty(tmp_path):
+    log_path = str(tmp_path / 'logs' / 'app.log')
+
+    assert last_logs(LogQuery(), 5, log_path) == []
+    assert last_logs(LogQuery('INFO'), 5, log_path) == []
+    assert list(search_logs(LogQuery(), log_path)) == []
+
+
+def test_clearing_the_logs_of_a_fresh_checkout(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    LogsCommand.execute('clear')
+    assert (tmp_path / 'logs' / 'app.log').read_text() == ''
+
+    logger.warning('Before clearing')
+    LogsCommand.execute('clear')
+    logger.warning('After clearing')
+    capsys.readouterr()
+    LogsCommand.execute('--level=warning')
+    shown = capsys.readouterr().out
+    shutdown_logging()
+    assert 'After clearing' in shown and 'Before clearing' not in shown
+
+
+def test_clearing_the_log_restarts_the_rotation(tmp_path):
+    sink = BackgroundFileSink(str(tmp_path / 'app.log'), rotation_size=100)
+    sink.write('a' * 80 + '\n')
+    sink.clear()
+    sink.write('b' * 80 + '\n')
+    sink.stop()
+    assert os.listdir(tmp_path) == ['app.log']
+    assert (tmp_path / 'app.log').read_text() == 'b' * 80 + '\n'
+
+
+def test_metrics_percentiles_and_the_disabled_fast_path():
+    metric = Metric()
+    for milliseconds in range(100, 0, -1):
+        metric.add(milliseconds / 1000)
+    metric.add(0.5, rows=3, failed=True)
+    summary = metric.summary()
+    assert (summary['calls'], summary['errors'], summary['rows']) == (101, 1, 3)
+    # Nearest rank: the smallest sample with p% of them at or below it
+    assert (summary['p50_ms'], summary['p95_ms'], summary['p99_ms']) == (51, 96, 100)
+
+    registry = Metrics()
+    registry.enabled = False
+
+    @registry.timed('rows')
+    def rows():
+        yield from range(3)
+
+    with registry.timer('block'):
+        assert list(rows()) == [0, 1, 2]
+    assert registry.metrics == {} and not registry.export()
+
+    registry.enabled = True
+    with registry.timer('block'):
+        assert list(rows()) == [0, 1, 2]
+    with pytest.raises(ValueError):
+        with registry.timer('block'):
+            raise ValueError
+    snapshot = registry.snapshot()
+    assert (snapshot['rows']['calls'], snapshot['rows']['rows']) == (1, 3)
+    assert (snapshot['block']['calls'], snapshot['block']['errors']) == (2, 1)
+
+
+def test_cached_employees_are_dropped_after_another_connection_commits(database):
+    add_employee('Ann', 'Lee', 1)
+    add_employee('Bob', 'Ray', 2)
+    assert fetch_employee_by_id(1).name == 'Ann'
+    hits = employee_cache.hits
+    assert fetch_employee_by_id(1).name == 'Ann'
+    assert employee_cache.hits == hits + 1
+
+    other = sql.connect(database)
+    other.execute("UPDATE employees SET name = 'Anna' WHERE id = 1")
+    other.commit()
+
+    # Checked once per command, as the command parser expires the cache
+    assert fetch_employee_by_id(1).name == 'Ann'
+    employee_cache.expire()
+    assert fetch_employee_by_id(1).name == 'Anna'
+    assert fetch_employee_by_id(2).name == 'Bob'
+
+    # A row missed after the commit is cached with the new version
+    other.execute("UPDATE employees SET name = 'Bobby' WHERE id = 2")
+    other.commit()
+    employee_cache.clear()
+    assert fetch_employee_by_id(2).name == 'Bobby'
+    hits = employee_cache.hits
+    employee_cache.expire()
+    assert fetch_employee_by_id(2).name == 'Bobby'
+    assert employee_cache.hits == hits + 1
+    other.close()
+
+
+def test_completion_in_every_context(database):
+    add_employee('Ann', 'Lee', 1)
+    add_employee('Ann', 'Larsen', 2)
+    add_employee('Bob', 'Ray', 3)
+    for number in range(4, 13):
+        add_employee(f'Dan{number}', 'Cole', number)
+    completer = CmdCompleter(get_command_list(), lambda: db.connection)
+
+    def complete(line: str) -> list:
+        *words, text = line.split(' ')
+        return completer.get_matches(words, text)
+
+    assert complete('cl') == ['clear', 'clear_comment']
+    assert complete('man set') == ['set_comment']
+    assert complete('list --sort=a') == ['--sort=age']
+    assert complete('list -a') == ['-a']
+    assert complete('payroll h') == ['history']
+    assert complete('remove 1') == ['1', '10', '11', '12']
+    assert complete('remove a') == ['Ann']
+    assert complete('remove Ann L') == ['Larsen', 'Lee']
+    assert complete('remove 1 ') == []
+    assert complete('assign 1 d')[:3] == ['Dan10', 'Dan11', 'Dan12']
+    assert complete('assign Ann Lee 1') == ['1', '10', '11', '12']
+    assert complete('assign Ann Lee Bob Ray ') == []
+    assert complete('undo ') == []
+
+    # New employees are picked up, removed ones are dropped
+    add_employee('Eve', 'Fox', 13)
+    remove_employee_by_id(3)
+    assert complete('remove e') == ['Eve']
+    assert complete('remove b') == []
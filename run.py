@@ -1,5 +1,21 @@
 #!/env/bin/python3
 
+import os
+import sys
+
+if '--startup-profile' in sys.argv:
+    from organization_simulator_cli.startup_profile import install
+    install()
+
+# One-shot commands are forwarded to the daemon when it is running, before
+# the rest of the application is imported
+if (len(sys.argv) > 1 and not sys.argv[1].startswith('-')
+        and not os.environ.get('ORGSIM_NO_DAEMON')):
+    from organization_simulator_cli.daemon import forward_to_daemon
+    status = forward_to_daemon(sys.argv[1:])
+    if status is not None:
+        sys.exit(status)
+
 from organization_simulator_cli.main import main
 
 if __name__ == "__main__":